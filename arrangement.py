@@ -0,0 +1,170 @@
+# -----------------------------------------------------------------------------
+# """Arrangement: a song made of saved beats and presets, prepared ahead on a worker"""
+# -----------------------------------------------------------------------------
+from concurrent.futures import ThreadPoolExecutor
+
+from pattern_grid import PatternGrid
+from timeline import SWING_MIN, Timeline
+
+# """beat: a saved beat (key in the StorageManager); preset: a PresetManager name"""
+ENTRY_SOURCES = ("beat", "preset")
+MAX_REPEATS = 99
+
+
+class ArrangementEntry:
+    """One block of the song: which pattern to play and how many times in a row."""
+    __slots__ = ("source", "key", "name", "repeats")
+
+    def __init__(self, source, key, name=None, repeats=1):
+        """
+        :param source: One of ENTRY_SOURCES.
+        :param key: Storage key of the saved beat, or the preset name.
+        :param name: Name shown in the song list (defaults to str(key)).
+        :param repeats: How many times the pattern loops before the next entry (1..MAX_REPEATS).
+        :raises ValueError: If source is not a known source.
+        """
+        if source not in ENTRY_SOURCES:
+            raise ValueError(f"source must be one of {ENTRY_SOURCES}")
+        self.source = source
+        self.key = key
+        self.name = str(name if name is not None else key)
+        self.repeats = max(1, min(MAX_REPEATS, int(repeats)))
+
+    def __repr__(self):
+        return f"ArrangementEntry(source={self.source!r}, name={self.name!r}, repeats={self.repeats})"
+
+
+class Arrangement:
+    """
+    The song timeline: an ordered list of entries played one after the other, each looping
+    repeats times. With loop=True the song starts over after the last entry, otherwise the
+    last pattern keeps looping once the song is over.
+    """
+
+    def __init__(self, entries=(), loop=True):
+        self.entries = list(entries)
+        self.loop = bool(loop)
+
+    def add(self, source, key, name=None, repeats=1):
+        """Appends an entry and returns it."""
+        entry = ArrangementEntry(source, key, name, repeats)
+        self.entries.append(entry)
+        return entry
+
+    def remove(self, index):
+        if 0 <= index < len(self.entries):
+            del self.entries[index]
+
+    def set_repeats(self, index, repeats):
+        if 0 <= index < len(self.entries):
+            self.entries[index].repeats = max(1, min(MAX_REPEATS, int(repeats)))
+
+    def clear(self):
+        self.entries.clear()
+
+    def next_index(self, index):
+        """The entry played after index, or None at the end of a song that does not loop."""
+        if index + 1 < len(self.entries):
+            return index + 1
+        return 0 if self.loop and self.entries else None
+
+    def copy(self):
+        """Snapshot handed to the playback engine, so editing the song list never races with it."""
+        return Arrangement([ArrangementEntry(e.source, e.key, e.name, e.repeats) for e in self.entries], self.loop)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, index):
+        return self.entries[index]
+
+    def __iter__(self):
+        return iter(self.entries)
+
+
+class PreparedPattern:
+    """
+    An entry made ready to play: the pattern already decoded into a PatternGrid with the
+    sequencer's track count, a second copy for the UI snapshot, its compiled Timeline and
+    (with the pre-mixed step engine) the mixed step sounds. Swapping it in at the bar line is
+    a few assignments.
+    """
+    __slots__ = ("index", "entry", "beats", "bpm", "grid", "view", "timeline", "mix")
+
+    def __init__(self, index, entry, beats, bpm, grid, view, timeline, mix=None):
+        self.index = index
+        self.entry = entry
+        self.beats = beats
+        self.bpm = bpm
+        self.grid = grid
+        self.view = view
+        self.timeline = timeline
+        self.mix = mix
+
+
+class PatternPrefetcher:
+    """
+    Prepares arrangement entries on one background thread: reading the saved beat (or
+    preset), building its grid and timeline and pre-mixing its steps all happen while the previous
+    pattern is still playing, so the playback thread never parses, allocates or mixes at a
+    transition.
+    """
+
+    def __init__(self, resolver, instruments, step_mix=None):
+        """
+        :param resolver: Callable resolver(entry) -> (beats, bpm, grid) where grid is a
+        PatternGrid or a list of lists of 1 / -1 values, or None if the entry is gone.
+        :param instruments: Track count of the sequencer the patterns are made for.
+        :param step_mix: Optional StepMixCache whose step sounds are prepared as well.
+        """
+        self._resolver = resolver
+        self.instruments = int(instruments)
+        self.step_mix = step_mix
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="PyDrumsPrefetch")
+
+    def request(self, arrangement, index, active_list=None, swing=SWING_MIN):
+        """
+        Starts preparing entry index of arrangement in the background. Entries that cannot be
+        loaded (e.g. a deleted beat) are skipped, so the result may be a later entry.
+
+        :param active_list: Mutes to pre-mix the steps with (re-checked when the pattern is applied).
+        :param swing: Swing to compile the timeline with (the song keeps the current swing).
+        :return: A Future whose result is a PreparedPattern, or None if no entry could be loaded.
+        """
+        active_list = list(active_list) if active_list is not None else None
+        return self._executor.submit(self._prepare_from, arrangement, index, active_list, swing)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+    def _prepare_from(self, arrangement, index, active_list, swing):
+        for _ in range(len(arrangement)):
+            if index is None:
+                return None
+            prepared = self._prepare(index, arrangement[index], active_list, swing)
+            if prepared is not None:
+                return prepared
+            index = arrangement.next_index(index)
+        return None
+
+    def _prepare(self, index, entry, active_list, swing):
+        try:
+            resolved = self._resolver(entry)
+        except Exception as exc:
+            print(f"Warning: could not load song entry {entry.name!r} -> {exc}")
+            return None
+        if resolved is None:
+            print(f"Warning: song entry {entry.name!r} no longer exists; skipping it")
+            return None
+        beats, bpm, grid = resolved
+        beats = max(1, int(beats))
+        # """a pattern saved with another track count keeps the rows this kit has (extra bits are masked off)"""
+        if isinstance(grid, PatternGrid):
+            grid = PatternGrid(self.instruments, beats, grid.masks)
+        else:
+            grid = PatternGrid.from_lists(grid, self.instruments, beats)
+        mix = None
+        if self.step_mix is not None and active_list is not None:
+            mix = self.step_mix.prepare(grid, active_list, beats)
+        return PreparedPattern(index, entry, beats, max(1, int(bpm)), grid, grid.copy(),
+                               Timeline(grid, swing=swing), mix)
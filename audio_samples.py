@@ -0,0 +1,148 @@
+# -----------------------------------------------------------------------------
+# """Audio samples: decode WAV files into NumPy buffers (no pygame, no audio device)"""
+# -----------------------------------------------------------------------------
+import os
+import wave
+
+import numpy as np
+
+# """Default drum kit, in instrument order (hi hat, snare, kick, crash, clap, tom)."""
+DEFAULT_SAMPLE_PATHS = [
+    'sounds/hi hat.wav',
+    'sounds/snare.wav',
+    'sounds/kick.wav',
+    'sounds/crash.wav',
+    'sounds/clap.wav',
+    'sounds/tom.wav',
+]
+
+
+def resolve_path(path):
+    """
+    Returns path if it exists, otherwise a file in the same folder whose name matches
+    case-insensitively (e.g. 'kick.wav' -> 'kick.WAV'), or None when nothing matches.
+    """
+    if os.path.exists(path):
+        return path
+    folder, name = os.path.split(path)
+    try:
+        for candidate in os.listdir(folder or '.'):
+            if candidate.lower() == name.lower():
+                return os.path.join(folder, candidate)
+    except OSError:
+        pass
+    return None
+
+
+def decode_wav(path):
+    """
+    Decodes a PCM WAV file.
+
+    :param path: Path to the .wav file.
+    :return: A tuple (samples, sample_rate) where samples is a float32 array of shape
+    (frames, channels) scaled to [-1.0, 1.0].
+    :raises ValueError: If the sample width is not supported.
+    """
+    with wave.open(path, 'rb') as w:
+        channels = w.getnchannels()
+        width = w.getsampwidth()
+        rate = w.getframerate()
+        raw = w.readframes(w.getnframes())
+
+    if width == 1:
+        data = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif width == 2:
+        data = np.frombuffer(raw, dtype='<i2').astype(np.float32) / 32768.0
+    elif width == 3:
+        b = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        ints = b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)
+        ints = np.where(ints & 0x800000, ints - 0x1000000, ints)
+        data = ints.astype(np.float32) / 8388608.0
+    elif width == 4:
+        data = np.frombuffer(raw, dtype='<i4').astype(np.float32) / 2147483648.0
+    else:
+        raise ValueError(f"Unsupported sample width {width} in {path}")
+
+    return data.reshape(-1, channels), rate
+
+
+def convert(samples, source_rate, target_rate, target_channels):
+    """
+    Resamples (linear interpolation) and up/down-mixes a float32 (frames, channels) buffer.
+
+    :return: A new float32 array of shape (frames', target_channels).
+    """
+    if source_rate != target_rate and len(samples) > 1:
+        frames = int(round(len(samples) * target_rate / source_rate))
+        src_x = np.arange(len(samples), dtype=np.float64)
+        dst_x = np.linspace(0, len(samples) - 1, frames)
+        samples = np.stack([np.interp(dst_x, src_x, samples[:, c]) for c in range(samples.shape[1])],
+                           axis=1).astype(np.float32)
+
+    channels = samples.shape[1]
+    if channels != target_channels:
+        if channels == 1:
+            samples = np.repeat(samples, target_channels, axis=1)
+        elif target_channels == 1:
+            samples = samples.mean(axis=1, keepdims=True)
+        else:
+            samples = samples[:, :target_channels]
+    return np.ascontiguousarray(samples, dtype=np.float32)
+
+
+# """pygame mixer sample size -> NumPy dtype and full-scale value"""
+MIXER_FORMATS = {
+    -8: (np.int8, 127.0),
+    8: (np.uint8, None),
+    -16: (np.int16, 32767.0),
+    16: (np.uint16, None),
+    -32: (np.int32, 2147483647.0),
+    32: (np.float32, 1.0),
+}
+
+
+def to_mixer_array(samples, size):
+    """Converts a float32 (frames, channels) buffer into the dtype of a pygame mixer sample size."""
+    dtype, scale = MIXER_FORMATS.get(size, (np.int16, 32767.0))
+    samples = np.clip(samples, -1.0, 1.0)
+    if scale is None:
+        # """unsigned formats are offset to the middle of their range"""
+        half = (np.iinfo(dtype).max + 1) / 2.0
+        return np.ascontiguousarray(samples * (half - 1) + half, dtype=dtype)
+    return np.ascontiguousarray(samples * scale, dtype=dtype)
+
+
+def load_samples(paths, sample_rate=44100, channels=2):
+    """
+    Decodes every path and converts it to the given format.
+    Missing or unreadable files become empty (silent) buffers, mirroring SoundManager.
+
+    :param paths: A list of file paths, in instrument order.
+    :return: A list of float32 arrays of shape (frames, channels).
+    """
+    buffers = []
+    for p in paths:
+        resolved = resolve_path(p)
+        try:
+            if resolved is None:
+                print(f"Warning: Sound file not found: {p}. Using silence.")
+                buffers.append(np.zeros((0, channels), dtype=np.float32))
+                continue
+            data, rate = decode_wav(resolved)
+            buffers.append(convert(data, rate, sample_rate, channels))
+        except Exception as exc:
+            print(f"Warning: Failed to decode sound {p} -> {exc}. Using silence.")
+            buffers.append(np.zeros((0, channels), dtype=np.float32))
+    return buffers
+
+
+def write_wav(path, buffer, sample_rate=44100):
+    """
+    Writes a float32 (frames, channels) buffer to a 16-bit PCM WAV file, clipping to [-1, 1].
+    """
+    pcm = (np.clip(buffer, -1.0, 1.0) * 32767.0).astype('<i2')
+    with wave.open(path, 'wb') as w:
+        w.setnchannels(buffer.shape[1])
+        w.setsampwidth(2)
+        w.setframerate(int(sample_rate))
+        w.writeframes(pcm.tobytes())
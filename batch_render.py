@@ -0,0 +1,209 @@
+# -----------------------------------------------------------------------------
+# """Batch render: bounce the whole saved beats library to WAV files in parallel"""
+# -----------------------------------------------------------------------------
+import argparse
+import hashlib
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from audio_samples import DEFAULT_SAMPLE_PATHS
+from offline_renderer import OfflineRenderer
+from pattern_grid import PatternGrid
+from storage_manager import StorageManager
+from track_list import TrackList
+
+MANIFEST_NAME = "render_manifest.jsonl"
+
+# """Per-worker renderer: the sample set is decoded once per process, not once per beat."""
+_worker_renderer = None
+
+
+def _init_worker(sample_paths, sample_rate, gains=None):
+    global _worker_renderer
+    _worker_renderer = OfflineRenderer(sample_paths, sample_rate=sample_rate, gains=gains)
+
+
+def _render_job(job):
+    """
+    Runs in a worker process. job is the compact pattern only:
+    (index, key, filename, beats, bpm, instruments, step_masks, loops, tail, output_dir).
+    """
+    index, key, filename, beats, bpm, instruments, masks, loops, tail, output_dir = job
+    grid = PatternGrid(instruments, beats, masks)
+    path = os.path.join(output_dir, filename)
+    # """Write to a temp name first so an interrupted render never looks finished."""
+    temp_path = path + ".part"
+    stats = _worker_renderer.bounce(temp_path, grid, bpm, beats, loops=loops, tail=tail)
+    os.replace(temp_path, path)
+    stats.update({"index": index, "key": key, "file": filename})
+    return stats
+
+
+def _slug(name):
+    slug = re.sub(r'[^A-Za-z0-9_-]+', '_', name).strip('_')
+    return slug[:60] or "beat"
+
+
+def _record_key(record, loops, tail, sample_rate, kit=None):
+    """Identifies one render: the saved record plus the render settings (and the kit, see kit_signature)."""
+    text = f"{record.to_line()}|{loops}|{int(tail)}|{sample_rate}"
+    if kit:
+        text += f"|{kit}"
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def kit_signature(sample_paths, gains=None):
+    """
+    Describes the samples and per-track gains a render uses, so a different kit is not resumed
+    from old files. The built-in kit at unity gain gives "" (keys of older manifests still match).
+    """
+    gains = list(gains) if gains is not None else []
+    if list(sample_paths) == DEFAULT_SAMPLE_PATHS and all(g == 1.0 for g in gains):
+        return ""
+    return json.dumps([list(sample_paths), gains])
+
+
+def _load_manifest(path):
+    done = {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    done[entry["key"]] = entry
+                except Exception:
+                    # """A torn last line from an interrupted run is simply ignored."""
+                    continue
+    except FileNotFoundError:
+        pass
+    return done
+
+
+def collect_jobs(records, output_dir, loops=4, tail=True, sample_rate=44100,
+                 name_filter=None, min_bpm=None, max_bpm=None, indices=None, kit=""):
+    """
+    Builds the compact render jobs for the selected saved beats (BeatRecord list).
+
+    :param kit: kit_signature() of the samples and gains the jobs are rendered with.
+
+    :return: The list of jobs.
+    """
+    jobs = []
+    for index, record in enumerate(records):
+        if indices is not None and index not in indices:
+            continue
+        if name_filter and name_filter.lower() not in record.name.lower():
+            continue
+        if min_bpm is not None and record.bpm < min_bpm:
+            continue
+        if max_bpm is not None and record.bpm > max_bpm:
+            continue
+        filename = f"{index:05d}_{_slug(record.name)}.wav"
+        key = _record_key(record, loops, tail, sample_rate, kit)
+        jobs.append((index, key, filename, record.beats, record.bpm, record.instruments, list(record.masks),
+                     loops, tail, output_dir))
+    return jobs
+
+
+def run_batch(jobs, output_dir, sample_paths=None, sample_rate=44100, workers=None, resume=True, gains=None):
+    """
+    Renders the jobs across a process pool, printing progress as each beat finishes.
+    Finished renders are appended to a manifest so an interrupted batch can resume.
+
+    :param gains: Optional per-sample volume (e.g. TrackList.gains).
+
+    :return: A summary dict (rendered, resumed, failed, wall_seconds, audio_seconds).
+    """
+    if sample_paths is None:
+        sample_paths = DEFAULT_SAMPLE_PATHS
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    done = _load_manifest(manifest_path) if resume else {}
+
+    pending = [job for job in jobs
+               if not (job[1] in done and os.path.exists(os.path.join(output_dir, job[2])))]
+    resumed = len(jobs) - len(pending)
+    if resumed:
+        print(f"Resuming: {resumed} of {len(jobs)} beats already rendered.")
+
+    rendered = 0
+    failed = 0
+    audio_seconds = 0.0
+    start = time.perf_counter()
+    with open(manifest_path, 'a', encoding='utf-8') as manifest, \
+            ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                initargs=(list(sample_paths), sample_rate, gains)) as pool:
+        futures = {pool.submit(_render_job, job): job for job in pending}
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                stats = future.result()
+            except Exception as exc:
+                failed += 1
+                print(f"[{rendered + failed}/{len(pending)}] FAILED {job[2]}: {exc}")
+                continue
+            rendered += 1
+            audio_seconds += stats["audio_seconds"]
+            manifest.write(json.dumps(stats) + '\n')
+            manifest.flush()
+            print(f"[{rendered + failed}/{len(pending)}] {stats['file']}: "
+                  f"{stats['render_seconds'] * 1000:.1f} ms ({stats['realtime_factor']:.0f}x real time)")
+
+    wall = time.perf_counter() - start
+    return {
+        "rendered": rendered,
+        "resumed": resumed,
+        "failed": failed,
+        "wall_seconds": wall,
+        "audio_seconds": audio_seconds,
+    }
+
+
+# -----------------------------------------------------------------------------
+# """Command line: python batch_render.py renders/ --loops 4 --workers 8"""
+# -----------------------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render every saved PyDrums beat to WAV files.")
+    parser.add_argument("output_dir", help="Folder for the rendered WAV files and the manifest.")
+    parser.add_argument("--library", default="saved_beats.txt", help="Saved beats file.")
+    parser.add_argument("--loops", type=int, default=4, help="Loop repetitions per beat.")
+    parser.add_argument("--no-tail", action="store_true", help="Cut ringing hits at the loop end.")
+    parser.add_argument("--rate", type=int, default=44100, help="Output sample rate.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count).")
+    parser.add_argument("--filter", dest="name_filter", help="Only render beats whose name contains this text.")
+    parser.add_argument("--min-bpm", type=int, help="Only render beats at or above this BPM.")
+    parser.add_argument("--max-bpm", type=int, help="Only render beats at or below this BPM.")
+    parser.add_argument("--index", type=int, nargs="+", help="Only render these zero-based library indices.")
+    parser.add_argument("--no-resume", action="store_true", help="Re-render beats that are already done.")
+    parser.add_argument("--kit", help="Kit file (JSON list of tracks) instead of the built-in kit.")
+    parser.add_argument("--samples", nargs="+", help="Sample files in instrument order (overrides the kit's).")
+    args = parser.parse_args(argv)
+
+    try:
+        tracks = TrackList.from_file(args.kit) if args.kit else TrackList()
+    except (OSError, ValueError) as exc:
+        parser.error(f"cannot read kit {args.kit}: {exc}")
+    sample_paths = args.samples or tracks.samples
+    gains = tracks.gains
+
+    records = StorageManager(args.library).load_records()
+    jobs = collect_jobs(records, args.output_dir, args.loops, not args.no_tail, args.rate,
+                        args.name_filter, args.min_bpm, args.max_bpm,
+                        set(args.index) if args.index else None, kit_signature(sample_paths, gains))
+    print(f"Rendering {len(jobs)} beats to {args.output_dir}")
+
+    summary = run_batch(jobs, args.output_dir, sample_paths, args.rate, args.workers, not args.no_resume, gains)
+    wall = summary["wall_seconds"]
+    print(f"Done: {summary['rendered']} rendered, {summary['resumed']} resumed, {summary['failed']} failed "
+          f"in {wall:.2f}s")
+    if summary["rendered"] and wall > 0:
+        print(f"Throughput: {summary['rendered'] / wall:.1f} beats/s, "
+              f"{summary['audio_seconds'] / wall:.0f}x real time overall")
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,223 @@
+# -----------------------------------------------------------------------------
+# """BeatIndex: in-memory search index over the saved beats (name words, bpm, beats)"""
+# -----------------------------------------------------------------------------
+import bisect
+import re
+
+import numpy as np
+
+_WORD = re.compile(r"\w+")
+# """bpm:120, beats:16, bpm:100-140 (inclusive ranges)"""
+_FILTER = re.compile(r"\b(bpm|beats):(\d+)(?:-(\d+))?", re.IGNORECASE)
+# """a filter being typed ("bpm:", "beats:1-") is not a name word"""
+_FILTER_TEXT = re.compile(r"\b(?:bpm|beats):\S*", re.IGNORECASE)
+# """postings longer than this are kept as cached numpy arrays"""
+_ARRAY_POSTING = 64
+
+
+def tokenize(text):
+    """Lower-cased words of a name or query."""
+    return _WORD.findall(text.casefold())
+
+
+def parse_query(text):
+    """
+    Splits a search box string into name words and numeric filters.
+
+    "rock bpm:100-140 beats:16" -> (["rock"], (100, 140), (16, 16))
+
+    :return: (words, bpm_range, beats_range); a range is (low, high) or None.
+    """
+    ranges = {}
+    for field, low, high in _FILTER.findall(text):
+        low = int(low)
+        ranges[field.lower()] = (low, int(high) if high else low)
+    return tokenize(_FILTER_TEXT.sub(" ", text)), ranges.get("bpm"), ranges.get("beats")
+
+
+class SearchResult:
+    """
+    Matches of one query, in library order. Offers the same count()/names() listing as
+    StorageManager, so a view can page through either the library or a search.
+    """
+
+    def __init__(self, slots, keys, names):
+        self._slots = slots
+        self._keys = keys
+        self._names = names
+
+    def count(self):
+        return len(self._slots)
+
+    def names(self, offset, limit):
+        """:return: Up to limit (key, name) pairs starting at match number offset."""
+        offset = max(0, offset)
+        return [(self._keys[slot], self._names[slot]) for slot in self._slots[offset:offset + limit].tolist()]
+
+
+class BeatIndex:
+    """
+    Word-prefix index over beat names plus bpm and beats columns, for search-as-you-type.
+
+    Every entry gets a slot in insertion (library) order. Names are split into lower-cased
+    words; each word maps to the slots that contain it, and the words are kept in one sorted
+    list, so all words starting with a query word are a contiguous bisect range (the same
+    lookups as a prefix trie, without a node object per character). bpm, beats and a live
+    flag are numpy columns, so a query is a few vectorized boolean masks: a 100k entry
+    library answers in about a millisecond.
+
+    add() and remove() are incremental. Removed slots are only flagged dead and dropped
+    when more than half of the slots are dead.
+    """
+
+    def __init__(self, entries=()):
+        """
+        :param entries: Iterable of (key, name, beats, bpm) in library order.
+        """
+        self._load(entries)
+
+    def _load(self, entries):
+        """Bulk build: plain lists first, numpy columns filled once at the end."""
+        keys, names, slot_of, postings = [], [], {}, {}
+        beats_column, bpm_column = [], []
+        for slot, (key, name, beats, bpm) in enumerate(entries):
+            keys.append(key)
+            names.append(name)
+            slot_of[key] = slot
+            beats_column.append(beats)
+            bpm_column.append(bpm)
+            for word in set(tokenize(name)):
+                posting = postings.get(word)
+                if posting is None:
+                    postings[word] = [slot]
+                else:
+                    posting.append(slot)
+        size = len(keys)
+        self._reset(max(64, 2 * size))
+        self._keys, self._names, self._slot_of, self._postings = keys, names, slot_of, postings
+        self._words = sorted(postings)
+        self._size = size
+        self._beats[:size] = beats_column
+        self._bpm[:size] = bpm_column
+        self._alive[:size] = True
+
+    def _reset(self, capacity):
+        self._keys = []
+        self._names = []
+        self._slot_of = {}
+        self._postings = {}
+        self._arrays = {}
+        self._initials = {}
+        self._words = []
+        self._size = 0
+        self._dead = 0
+        self._bpm = np.zeros(capacity, dtype=np.int32)
+        self._beats = np.zeros(capacity, dtype=np.int32)
+        self._alive = np.zeros(capacity, dtype=bool)
+
+    def __len__(self):
+        return self._size - self._dead
+
+    # ---------------------------
+    # """Maintenance"""
+    # ---------------------------
+    @staticmethod
+    def _grow(mask, capacity):
+        return np.concatenate((mask, np.zeros(capacity - len(mask), dtype=bool)))
+
+    def add(self, key, name, beats, bpm):
+        """Indexes a newly saved beat (it sorts after every existing entry)."""
+        if key in self._slot_of:
+            self.remove(key)
+        slot = self._size
+        if slot == len(self._alive):
+            capacity = 2 * len(self._alive)
+            self._bpm = np.resize(self._bpm, capacity)
+            self._beats = np.resize(self._beats, capacity)
+            self._alive = self._grow(self._alive, capacity)
+            for initial, mask in self._initials.items():
+                self._initials[initial] = self._grow(mask, capacity)
+        self._size += 1
+        self._keys.append(key)
+        self._names.append(name)
+        self._slot_of[key] = slot
+        self._bpm[slot] = bpm
+        self._beats[slot] = beats
+        self._alive[slot] = True
+        for word in set(tokenize(name)):
+            posting = self._postings.get(word)
+            if posting is None:
+                self._postings[word] = [slot]
+                bisect.insort(self._words, word)
+            else:
+                posting.append(slot)
+                self._arrays.pop(word, None)
+            initial = self._initials.get(word[0])
+            if initial is not None:
+                initial[slot] = True
+
+    def remove(self, key):
+        """Drops a deleted beat from every future result."""
+        slot = self._slot_of.pop(key, None)
+        if slot is None:
+            return
+        self._alive[slot] = False
+        self._dead += 1
+        if self._dead > 1024 and self._dead * 2 > self._size:
+            self._compact()
+
+    def _compact(self):
+        live = [(self._keys[s], self._names[s], int(self._beats[s]), int(self._bpm[s]))
+                for s in np.flatnonzero(self._alive[:self._size]).tolist()]
+        self._load(live)
+
+    # ---------------------------
+    # """Queries"""
+    # ---------------------------
+    def _prefix_mask(self, prefix):
+        """Slots whose name has a word starting with prefix."""
+        if len(prefix) == 1:
+            # """one character spans the most words (e.g. every number starting with 1): cache it, kept current by add()"""
+            mask = self._initials.get(prefix)
+            if mask is None:
+                mask = self._initials[prefix] = self._collect(prefix, len(self._alive))
+            return mask[:self._size]
+        return self._collect(prefix, self._size)
+
+    def _collect(self, prefix, length):
+        mask = np.zeros(length, dtype=bool)
+        lo = bisect.bisect_left(self._words, prefix)
+        hi = bisect.bisect_left(self._words, prefix + "\U0010ffff", lo)
+        small = []
+        for word in self._words[lo:hi]:
+            posting = self._postings[word]
+            if len(posting) > _ARRAY_POSTING:
+                array = self._arrays.get(word)
+                if array is None:
+                    array = self._arrays[word] = np.array(posting, dtype=np.intp)
+                mask[array] = True
+            else:
+                small.extend(posting)
+        if small:
+            mask[small] = True
+        return mask
+
+    def search(self, words=(), bpm=None, beats=None):
+        """
+        :param words: Every word must be the start of a word in the name (case-insensitive).
+        :param bpm: Optional inclusive (low, high) bpm range.
+        :param beats: Optional inclusive (low, high) range of steps.
+        :return: A SearchResult in library order.
+        """
+        mask = self._alive[:self._size].copy()
+        for word in words:
+            mask &= self._prefix_mask(word)
+        if bpm is not None:
+            mask &= (self._bpm[:self._size] >= bpm[0]) & (self._bpm[:self._size] <= bpm[1])
+        if beats is not None:
+            mask &= (self._beats[:self._size] >= beats[0]) & (self._beats[:self._size] <= beats[1])
+        return SearchResult(np.flatnonzero(mask), self._keys, self._names)
+
+    def query(self, text):
+        """Searches with a search box string (see parse_query)."""
+        return self.search(*parse_query(text))
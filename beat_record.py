@@ -0,0 +1,305 @@
+# -----------------------------------------------------------------------------
+# """BeatRecord: one saved beat in the versioned JSON Lines library format"""
+# -----------------------------------------------------------------------------
+import hashlib
+import json
+import re
+
+import numpy as np
+
+from pattern_grid import MAX_INSTRUMENTS, PatternGrid
+
+FORMAT_NAME = "pydrums.beats"
+# """1: one self-contained line per beat; 2: patterns stored once by content hash, beats refer to them"""
+FORMAT_VERSION = 2
+
+
+class BeatFormatError(ValueError):
+    """Raised when a saved record or library header does not match the schema."""
+
+
+def _check_int(obj, key, low, high=None):
+    value = obj.get(key)
+    # """bool is an int subclass, but true/false is never a valid count"""
+    if not isinstance(value, int) or isinstance(value, bool) or value < low or (high is not None and value > high):
+        raise BeatFormatError(f"{key} must be an integer >= {low}" + (f" and <= {high}" if high is not None else ""))
+    return value
+
+
+def pattern_id(instruments, masks):
+    """
+    Content hash of a pattern: grids with the same instruments and step masks get the same
+    id whatever the beat is called or how fast it plays, so the library stores them once.
+
+    :return: 32 hex characters (128-bit BLAKE2b).
+    """
+    digest = hashlib.blake2b(np.asarray(masks, dtype='<u8').tobytes(), digest_size=16, person=b"pydrums.pattern")
+    digest.update(bytes((int(instruments),)))
+    return digest.hexdigest()
+
+
+class BeatRecord:
+    """
+    A saved beat: name, beats, bpm and the pattern as one instrument bitmask per step
+    (the same layout as PatternGrid.masks).
+
+    On disk (format version 2, after the header {"format": "pydrums.beats", "version": 2})
+    the pattern and the beat are separate compact JSON lines, so a pattern saved under
+    several names is stored once:
+    {"pattern":"<pattern_id>","beats":8,"instruments":6,"masks":[5,0,...]}
+    {"name":"rock","bpm":120,"pattern":"<pattern_id>"}
+    Version 1 files hold one self-contained line per beat (to_line / from_line).
+    Any name is safe (JSON escaping).
+    """
+    __slots__ = ("name", "beats", "bpm", "instruments", "masks")
+
+    def __init__(self, name, beats, bpm, instruments, masks):
+        """
+        :param name: Display name of the beat.
+        :param beats: Number of steps (>= 1).
+        :param bpm: Tempo (>= 1).
+        :param instruments: Number of instrument rows (1..64).
+        :param masks: Sequence of beats per-step bitmasks.
+        :raises BeatFormatError: If a field is out of range.
+        """
+        self.name = str(name)
+        self.beats = int(beats)
+        self.bpm = int(bpm)
+        self.instruments = int(instruments)
+        self.masks = tuple(int(m) for m in masks)
+        if self.beats < 1 or self.bpm < 1 or not 1 <= self.instruments <= MAX_INSTRUMENTS:
+            raise BeatFormatError("beats and bpm must be >= 1 and instruments between 1 and 64")
+        if len(self.masks) != self.beats:
+            raise BeatFormatError(f"expected {self.beats} step masks, got {len(self.masks)}")
+        full = (1 << self.instruments) - 1
+        if any(m < 0 or m > full for m in self.masks):
+            raise BeatFormatError("step mask uses instruments that do not exist")
+
+    @classmethod
+    def from_grid(cls, name, beats, bpm, grid, instruments=None):
+        """
+        Builds a record from the app state.
+
+        :param grid: A PatternGrid or a list of lists of 1 / -1 values.
+        :param instruments: Row count for a list grid (defaults to its length).
+        """
+        if not isinstance(grid, PatternGrid):
+            grid = PatternGrid.from_lists(grid, instruments, beats=beats)
+        elif grid.beats != int(beats):
+            grid = grid.copy()
+            grid.resize(beats)
+        return cls(name, beats, bpm, grid.instruments, grid.masks.tolist())
+
+    # ---------------------------
+    # """Pattern access"""
+    # ---------------------------
+    def to_grid(self):
+        """The pattern as a new PatternGrid."""
+        return PatternGrid(self.instruments, self.beats, self.masks)
+
+    def to_lists(self):
+        """The pattern as a list of lists of 1 / -1 values."""
+        return self.to_grid().to_lists()
+
+    @property
+    def pattern_id(self):
+        """Content hash of the pattern (see pattern_id())."""
+        return pattern_id(self.instruments, self.masks)
+
+    # ---------------------------
+    # """Serialization"""
+    # ---------------------------
+    def to_dict(self):
+        return {"name": self.name, "beats": self.beats, "bpm": self.bpm,
+                "instruments": self.instruments, "masks": list(self.masks)}
+
+    @classmethod
+    def from_dict(cls, obj):
+        """
+        Schema-checked constructor for a decoded JSON record.
+
+        :raises BeatFormatError: If a field is missing or has the wrong type.
+        """
+        if not isinstance(obj, dict):
+            raise BeatFormatError("record must be a JSON object")
+        name = obj.get("name")
+        if not isinstance(name, str):
+            raise BeatFormatError("name must be a string")
+        beats = _check_int(obj, "beats", 1)
+        bpm = _check_int(obj, "bpm", 1)
+        instruments = _check_int(obj, "instruments", 1, MAX_INSTRUMENTS)
+        masks = obj.get("masks")
+        # """json only produces int for integer literals, so checking the types of the set is enough"""
+        if not isinstance(masks, list) or len(masks) != beats or not set(map(type, masks)) <= {int}:
+            raise BeatFormatError(f"masks must be a list of {beats} integers")
+        if min(masks) < 0 or max(masks) >= 1 << instruments:
+            raise BeatFormatError("step mask uses instruments that do not exist")
+        # """already validated: skip the converting constructor (this is the hot path when loading)"""
+        record = cls.__new__(cls)
+        record.name = name
+        record.beats = beats
+        record.bpm = bpm
+        record.instruments = instruments
+        record.masks = tuple(masks)
+        return record
+
+    def to_line(self):
+        """One compact JSON line (without the newline)."""
+        return json.dumps(self.to_dict(), separators=(',', ':'), ensure_ascii=False)
+
+    @classmethod
+    def from_line(cls, line):
+        """
+        :raises BeatFormatError: If the line is not valid JSON or fails the schema check.
+        """
+        try:
+            obj = json.loads(line)
+        except ValueError as exc:
+            raise BeatFormatError(f"invalid JSON: {exc}") from None
+        return cls.from_dict(obj)
+
+    def pattern_line(self, pid=None):
+        """The format 2 pattern line: id, beats, instruments and masks (without the newline)."""
+        return json.dumps({"pattern": pid or self.pattern_id, "beats": self.beats, "instruments": self.instruments,
+                           "masks": list(self.masks)}, separators=(',', ':'))
+
+    def ref_line(self, pid=None):
+        """The format 2 beat line: name, bpm and the id of its pattern line."""
+        return json.dumps({"name": self.name, "bpm": self.bpm, "pattern": pid or self.pattern_id},
+                          separators=(',', ':'), ensure_ascii=False)
+
+    @classmethod
+    def from_lines(cls, ref_line, pattern_line):
+        """
+        Decodes a format 2 beat line and its pattern line.
+
+        :raises BeatFormatError: If a line is invalid, or the pattern does not match its hash.
+        """
+        try:
+            ref = json.loads(ref_line)
+            pattern = json.loads(pattern_line)
+        except ValueError as exc:
+            raise BeatFormatError(f"invalid JSON: {exc}") from None
+        if not isinstance(ref, dict) or not isinstance(pattern, dict):
+            raise BeatFormatError("record must be a JSON object")
+        obj = dict(pattern, name=ref.get("name"), bpm=ref.get("bpm"))
+        record = cls.from_dict(obj)
+        if record.pattern_id != pattern.get("pattern"):
+            raise BeatFormatError("pattern does not match its content hash")
+        return record
+
+    def __eq__(self, other):
+        if not isinstance(other, BeatRecord):
+            return NotImplemented
+        return (self.name, self.beats, self.bpm, self.instruments, self.masks) == \
+               (other.name, other.beats, other.bpm, other.instruments, other.masks)
+
+    def __repr__(self):
+        return f"BeatRecord(name={self.name!r}, beats={self.beats}, bpm={self.bpm}, instruments={self.instruments})"
+
+
+def header_line():
+    """The first line of a library file."""
+    return json.dumps({"format": FORMAT_NAME, "version": FORMAT_VERSION}, separators=(',', ':'))
+
+
+def parse_header(line):
+    """
+    :return: The format version if line is a library header, or None (e.g. a legacy text line).
+    """
+    try:
+        obj = json.loads(line)
+    except ValueError:
+        return None
+    if isinstance(obj, dict) and obj.get("format") == FORMAT_NAME:
+        version = obj.get("version")
+        return version if isinstance(version, int) else None
+    return None
+
+
+_name_decoder = json.JSONDecoder()
+_NAME_PREFIX = '{"name":'
+
+
+def record_name(line):
+    """
+    Extracts only the name from a record line without decoding the pattern (the writer
+    always puts the name first). Falls back to a full decode, then to "?" for bad lines.
+    """
+    if line.startswith(_NAME_PREFIX):
+        try:
+            name, _ = _name_decoder.raw_decode(line, len(_NAME_PREFIX))
+            if isinstance(name, str):
+                return name
+        except ValueError:
+            pass
+    try:
+        name = json.loads(line).get("name")
+        return name if isinstance(name, str) else "?"
+    except (ValueError, AttributeError):
+        return "?"
+
+
+_REF_FIELDS = re.compile(r',"bpm":(\d+),"pattern":"([0-9a-f]+)"\}$')
+_PATTERN_FIELDS = re.compile(r'\{"pattern":"([0-9a-f]+)","beats":(\d+),')
+
+
+def ref_summary(line):
+    """
+    (name, bpm, pattern_id) of a format 2 beat line, without a full decode where possible.
+    Returns None for bad lines.
+    """
+    if line.startswith(_NAME_PREFIX):
+        try:
+            name, end = _name_decoder.raw_decode(line, len(_NAME_PREFIX))
+            fields = _REF_FIELDS.match(line, end)
+            if isinstance(name, str) and fields:
+                return name, int(fields.group(1)), fields.group(2)
+        except ValueError:
+            pass
+    try:
+        obj = json.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(obj, dict):
+        return None
+    name, bpm, pid = obj.get("name"), obj.get("bpm"), obj.get("pattern")
+    if isinstance(name, str) and isinstance(bpm, int) and isinstance(pid, str):
+        return name, bpm, pid
+    return None
+
+
+_PATTERN_PREFIX = '{"pattern":"'
+_REF_SUFFIX = ',"pattern":"'
+
+
+def line_pattern(line):
+    """
+    Sorts a format 2 line without decoding it: ("pattern", id) for a pattern line,
+    ("beat", id of its pattern) for a beat line, or None if it is neither.
+    """
+    if line.startswith(_PATTERN_PREFIX) and line[44:45] == '"':
+        return "pattern", line[12:44]
+    if line.endswith('"}') and line[-46:-34] == _REF_SUFFIX:
+        return "beat", line[-34:-2]
+    try:
+        obj = json.loads(line)
+    except ValueError:
+        return None
+    if isinstance(obj, dict) and isinstance(obj.get("pattern"), str):
+        return ("beat" if "name" in obj else "pattern"), obj["pattern"]
+    return None
+
+
+def pattern_summary(line):
+    """(pattern_id, beats) of a format 2 pattern line, or None if it is not one."""
+    fields = _PATTERN_FIELDS.match(line)
+    if fields:
+        return fields.group(1), int(fields.group(2))
+    try:
+        obj = json.loads(line)
+    except ValueError:
+        return None
+    if isinstance(obj, dict) and isinstance(obj.get("pattern"), str) and isinstance(obj.get("beats"), int):
+        return obj["pattern"], obj["beats"]
+    return None
@@ -0,0 +1,341 @@
+# -----------------------------------------------------------------------------
+# """Benchmark: headless frame-time, step jitter and allocation measurements"""
+# -----------------------------------------------------------------------------
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+# """SDL dummy drivers: no window and no sound card needed (must be set before pygame starts)"""
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import numpy as np
+import pygame
+
+from arrangement import Arrangement
+from beat_record import BeatRecord
+from main import PyDrumsApp
+from storage_manager import StorageManager
+from track_list import DEFAULT_TRACKS, Track, TrackList
+
+DEFAULT_BASELINE = "benchmark_baseline.json"
+
+# """name -> settings; every scenario runs the real PyDrumsApp loop with playback on"""
+SCENARIOS = {
+    "grid_8": {"beats": 8},
+    "grid_64": {"beats": 64},
+    "grid_256": {"beats": 256},
+    "grid_4096": {"beats": 4096},
+    "tracks_64": {"beats": 16, "tracks": 64},
+    # """swing plus hundreds of nudged notes: cell toggles recompile one step of the timeline"""
+    "swing_4096": {"beats": 4096, "swing": 66, "nudges": 512},
+    # """a song of saved beats switching on every bar line (prepared on the prefetch worker)"""
+    "song_8": {"beats": 8, "song": 8},
+    "save_menu": {"beats": 8, "menu": "save"},
+    "preset_menu": {"beats": 8, "menu": "preset"},
+    "load_menu_1k": {"beats": 8, "menu": "load", "saved_beats": 1000},
+    "load_menu_100k_db": {"beats": 8, "menu": "load", "saved_beats": 100000, "library": "library.db"},
+    "load_search_100k": {"beats": 8, "menu": "load", "saved_beats": 100000, "library": "library.db",
+                         "search": "beat 12 bpm:120"},
+}
+
+# """metric -> absolute slack added to the relative tolerance, so tiny values do not flap"""
+GATED_METRICS = {
+    "frame_ms_p50": 0.5,
+    "frame_ms_p95": 1.0,
+    "jitter_ms_p95": 2.0,
+    "trigger_ms_p95": 2.0,
+    "alloc_kib_mean": 4.0,
+}
+
+
+class _PacedClock:
+    """Stands in for the app's pygame.time.Clock and remembers how long the last tick() waited."""
+
+    def __init__(self):
+        self._clock = pygame.time.Clock()
+        self.last_wait = 0.0
+
+    def tick(self, fps=0):
+        start = time.perf_counter()
+        result = self._clock.tick(fps)
+        self.last_wait = time.perf_counter() - start
+        return result
+
+    def get_fps(self):
+        return self._clock.get_fps()
+
+
+class BenchmarkApp(PyDrumsApp):
+    """PyDrumsApp that records how late every step fired (engine thread) against its target time."""
+
+    def __init__(self, **kwargs):
+        self.step_lateness = []
+        super().__init__(**kwargs)
+
+    def _trigger_step(self, step, target_time, mask=None):
+        self.step_lateness.append(self.sequencer.scheduler.now() - target_time)
+        super()._trigger_step(step, target_time, mask)
+
+
+def _synthetic_record(i, rng, instruments=6):
+    beats = rng.choice((8, 16, 32))
+    masks = [rng.getrandbits(instruments) for _ in range(beats)]
+    return BeatRecord(f'bench beat {i}', beats, rng.randrange(60, 300, 5), instruments, masks)
+
+
+def _synthetic_tracks(count):
+    """count tracks cycling through the built-in kit's samples."""
+    return TrackList(Track(f"{t.name} {i // len(DEFAULT_TRACKS) + 1}", t.sample, t.color, t.gain, t.priority)
+                     for i, t in ((i, DEFAULT_TRACKS[i % len(DEFAULT_TRACKS)]) for i in range(count)))
+
+
+def _percentiles(values, prefix):
+    if not values:
+        return {f"{prefix}_{p}": 0.0 for p in ("p50", "p95", "p99", "max")}
+    arr = np.asarray(values, dtype=np.float64)
+    p50, p95, p99 = np.percentile(arr, (50, 95, 99))
+    return {f"{prefix}_p50": float(p50), f"{prefix}_p95": float(p95),
+            f"{prefix}_p99": float(p99), f"{prefix}_max": float(arr.max())}
+
+
+def _scripted_input(app, frame, settings):
+    """
+    Posts the input a user would make: grid toggles when no menu is open, list picks and wheel
+    scrolling in the load menu (or over the track rows), and typing (then clearing) a query in
+    the load menu search box.
+    """
+    query = settings.get("search")
+    if query and frame % 5 == 3:
+        typed = (frame // 5) % (len(query) + 1)
+        if typed < len(query):
+            pygame.event.post(pygame.event.Event(pygame.TEXTINPUT, text=query[typed]))
+        else:
+            pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_ESCAPE, mod=0, unicode='', scancode=0))
+    if (settings.get("menu") == "load" or settings.get("tracks")) and frame % 15 == 7:
+        # """down through the rows, then back up"""
+        y = -1 if (frame // 150) % 2 == 0 else 1
+        pygame.event.post(pygame.event.Event(pygame.MOUSEWHEEL, x=0, y=y, flipped=False))
+    if frame % 15:
+        return
+    if settings.get("menu") == "load":
+        pos = (300, 100 + (frame // 15) % 10 * 50)
+        pygame.event.post(pygame.event.Event(pygame.MOUSEBUTTONUP, pos=pos, button=1))
+    elif not settings.get("menu"):
+        layout = app.ui_manager.layout
+        step = layout.first_step + (frame // 15 * 7) % max(1, layout.visible_steps)
+        instrument = layout.first_row + (frame // 15) % max(1, layout.visible_rows)
+        pygame.event.post(pygame.event.Event(pygame.MOUSEBUTTONDOWN, pos=layout.cell_rect(step, instrument).center,
+                                             button=1))
+
+
+def run_scenario(name, settings, seconds=2.0, fps=60, warmup_frames=30, alloc_frames=60, bpm=960, seed=1):
+    """
+    Runs one scenario through PyDrumsApp.run_frame and returns its metrics as a dict.
+
+    Frames are paced at fps like the real app (0 = unthrottled); frame times exclude the
+    wait inside Clock.tick, so they measure the work done per frame. Allocations (peak
+    traced bytes above the frame's starting point) come from a separate tracemalloc pass,
+    so tracing does not skew the timings.
+    """
+    rng = random.Random(seed)
+    # """a scratch library, so the real saved beats are never touched"""
+    scratch = tempfile.mkdtemp(prefix="pydrums_bench_")
+    library = os.path.join(scratch, settings.get("library", "saved_beats.txt"))
+    if settings.get("saved_beats"):
+        storage = StorageManager(library)
+        storage.write_records(_synthetic_record(i, rng, 6) for i in range(settings["saved_beats"]))
+        storage.close()
+    tracks = _synthetic_tracks(settings["tracks"]) if settings.get("tracks") else None
+    app = BenchmarkApp(library_path=library, tracks=tracks)
+    app.fps = fps
+    app.timer = _PacedClock()
+    beats = settings["beats"]
+    grid = [[rng.choice((1, -1, -1)) for _ in range(beats)] for _ in range(app.instruments)]
+    app.engine.load_pattern(beats, bpm, grid)
+    if settings.get("swing"):
+        app.engine.set_swing(settings["swing"])
+    for _ in range(settings.get("nudges", 0)):
+        app.engine.set_nudge(rng.randrange(app.instruments), rng.randrange(beats), rng.randint(-240, 240))
+    app.engine.pump()
+    if settings.get("saved_beats"):
+        app.index = 0
+    if settings.get("search"):
+        # """the index is built once, on the first search; measure the typing, not the build"""
+        app.storage.search("")
+    if settings.get("song"):
+        # """parts at the benchmark tempo, so the song switches patterns every few hundred ms"""
+        song = Arrangement()
+        for i in range(settings["song"]):
+            part_beats = rng.choice((4, 8, 16))
+            record = BeatRecord(f'song part {i}', part_beats, bpm, app.instruments,
+                                [rng.getrandbits(app.instruments) for _ in range(part_beats)])
+            song.add("beat", app.storage.add(record), record.name)
+        app.engine.play_arrangement(song)
+    menu = settings.get("menu")
+    app.save_menu = menu == "save"
+    app.load_menu = menu == "load"
+    app.load_preset = menu == "preset"
+
+    app.engine.start()
+    try:
+        for frame in range(warmup_frames):
+            app.run_frame()
+        app.step_lateness.clear()
+        app.telemetry.reset()
+        if app.sound_manager.pool is not None:
+            app.sound_manager.pool.reset_stats()
+
+        frame_times = []
+        frame = 0
+        clock = time.perf_counter
+        end = clock() + seconds
+        while clock() < end:
+            _scripted_input(app, frame, settings)
+            start = clock()
+            app.run_frame()
+            frame_times.append(clock() - start - app.timer.last_wait)
+            frame += 1
+        lateness = list(app.step_lateness)
+        triggers = app.telemetry.stats()
+        voices = app.sound_manager.voice_stats() or {}
+        tempo = app.sequencer.tempo_error()
+
+        allocations = []
+        tracemalloc.start()
+        try:
+            for frame in range(alloc_frames):
+                _scripted_input(app, frame, settings)
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+                app.run_frame()
+                allocations.append(tracemalloc.get_traced_memory()[1] - before)
+        finally:
+            tracemalloc.stop()
+    finally:
+        app.engine.stop()
+        app.storage.close()
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    result = {"scenario": name, "frames": len(frame_times), "steps": len(lateness),
+              "fps": len(frame_times) / sum(frame_times) if frame_times else 0.0}
+    result.update(_percentiles([t * 1000.0 for t in frame_times], "frame_ms"))
+    result.update(_percentiles([t * 1000.0 for t in lateness], "jitter_ms"))
+    result["alloc_kib_mean"] = float(np.mean(allocations)) / 1024.0 if allocations else 0.0
+    result["alloc_kib_max"] = max(allocations) / 1024.0 if allocations else 0.0
+    # """per-note lateness as SoundManager saw it (histogram percentiles, see TriggerTelemetry)"""
+    result["notes"] = triggers["count"]
+    result["trigger_ms_p95"] = triggers["p95_ms"]
+    result["trigger_ms_p99"] = triggers["p99_ms"]
+    result["tempo_error_ppm"] = tempo["error_ppm"]
+    result["voices_stolen"] = voices.get("stolen", 0)
+    result["voices_dropped"] = voices.get("dropped", 0)
+    result["pattern_switches"] = app.engine.switches
+    result["late_switches"] = app.engine.late_switches
+    return result
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compares results with a baseline dict (scenario -> metrics).
+
+    :return: (regressions, missing): human readable messages for metrics over tolerance, and for
+             scenarios or gated metrics the baseline has no value for (both empty when all is well).
+    """
+    regressions, missing = [], []
+    for result in results:
+        base = baseline.get(result["scenario"])
+        if not base:
+            missing.append(f"{result['scenario']}: not in the baseline")
+            continue
+        for metric, slack in GATED_METRICS.items():
+            if metric not in base:
+                missing.append(f"{result['scenario']}.{metric}: not in the baseline")
+                continue
+            limit = base[metric] * (1.0 + tolerance) + slack
+            if result[metric] > limit:
+                regressions.append(f"{result['scenario']}.{metric}: {result[metric]:.3f} > {limit:.3f} "
+                                   f"(baseline {base[metric]:.3f})")
+    return regressions, missing
+
+
+def _print_table(results):
+    print(f"{'scenario':<18}{'frames':>8}{'fps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+          f"{'jit p95':>9}{'jit max':>9}{'KiB/frm':>9}")
+    for r in results:
+        print(f"{r['scenario']:<18}{r['frames']:>8}{r['fps']:>9.0f}{r['frame_ms_p50']:>9.2f}{r['frame_ms_p95']:>9.2f}"
+              f"{r['frame_ms_p99']:>9.2f}{r['frame_ms_max']:>9.2f}{r['jitter_ms_p95']:>9.2f}"
+              f"{r['jitter_ms_max']:>9.2f}{r['alloc_kib_mean']:>9.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark PyDrums headless (SDL dummy video and audio).")
+    parser.add_argument("--scenario", nargs="+", choices=sorted(SCENARIOS), help="Only run these scenarios.")
+    parser.add_argument("--seconds", type=float, default=3.0, help="Timed duration per scenario.")
+    parser.add_argument("--fps", type=int, default=60, help="Frame rate cap like the app (0 = unthrottled).")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON file to compare against.")
+    parser.add_argument("--update-baseline", action="store_true", help="Store these results as the new baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed relative slowdown against the baseline (0.25 = 25%%).")
+    parser.add_argument("--json", dest="json_path", help="Also write the raw results to this file.")
+    args = parser.parse_args(argv)
+
+    # """the app loads fonts, sounds and saved beats relative to the project folder"""
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    pygame.init()
+    names = args.scenario or list(SCENARIOS)
+    results = []
+    try:
+        for name in names:
+            print(f"Running {name} ...")
+            results.append(run_scenario(name, SCENARIOS[name], seconds=args.seconds, fps=args.fps))
+    finally:
+        pygame.quit()
+    _print_table(results)
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+        baseline.update({r["scenario"]: r for r in results})
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        # """nothing to compare against is a failure, not a pass: the gate must not go quiet"""
+        print(f"No baseline at {args.baseline}; run with --update-baseline on this machine to create one.")
+        return 2
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions, missing = compare(results, baseline, args.tolerance)
+    if regressions:
+        print("PERFORMANCE REGRESSION:")
+        for message in regressions:
+            print("  " + message)
+    if missing:
+        # """an unchecked scenario or metric is not a pass either"""
+        print("BASELINE INCOMPLETE (run with --update-baseline to add them):")
+        for message in missing:
+            print("  " + message)
+    if regressions:
+        return 1
+    if missing:
+        return 2
+    print("All scenarios within tolerance of the baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,193 @@
+# -----------------------------------------------------------------------------
+# """FrameProfiler: per-phase timing of the main loop, overlay and stats export"""
+# -----------------------------------------------------------------------------
+import csv
+import json
+import threading
+import time
+from collections import deque
+
+import numpy as np
+import pygame
+
+# """Phases in the order the main loop runs them (anything not listed is appended after)."""
+PHASES = ("wait", "sync", "draw_grid", "draw_bottom_menu", "draw", "menu", "events", "audio", "overlay", "display")
+# """Work done off the frame (the playback thread); reported, but not part of the frame time."""
+BACKGROUND_PHASES = ("play_notes",)
+
+
+class FrameProfiler:
+    """
+    Times each phase of PyDrumsApp.run_frame and keeps a rolling window of frames.
+
+    The loop calls begin_frame(), then lap(phase) after each phase (the time since the
+    previous lap is charged to that phase) and end_frame(). Work done on other threads is
+    added with record(phase, seconds). When disabled the loop skips every call, so the
+    only cost left is one attribute check per phase.
+    """
+
+    def __init__(self, window=300, export_path=None, export_interval=5.0, clock=time.perf_counter):
+        """
+        :param window: Number of recent frames kept for the statistics.
+        :param export_path: If set, the rolling stats are written there every export_interval
+        seconds (.json for JSON, anything else for CSV).
+        :param export_interval: Seconds between automatic exports.
+        :param clock: Monotonic clock in seconds.
+        """
+        self.enabled = export_path is not None
+        self.export_path = export_path
+        self.export_interval = float(export_interval)
+        self._clock = clock
+        self._frames = deque(maxlen=int(window))
+        self._frame_index = 0
+        self._frame_start = 0.0
+        self._mark = 0.0
+        self._current = {}
+        self._background = {}
+        self._lock = threading.Lock()
+        self._last_export = clock()
+        self._overlay = None
+        self._overlay_time = 0.0
+
+    # ---------------------------
+    # """Recording"""
+    # ---------------------------
+    def begin_frame(self):
+        now = self._clock()
+        self._frame_start = now
+        self._mark = now
+        self._current = {}
+
+    def lap(self, phase):
+        """Charges the time since the previous lap (or begin_frame) to phase."""
+        now = self._clock()
+        self._current[phase] = self._current.get(phase, 0.0) + (now - self._mark)
+        self._mark = now
+
+    def record(self, phase, seconds):
+        """Adds work measured elsewhere (any thread) to the frame being recorded."""
+        with self._lock:
+            self._background[phase] = self._background.get(phase, 0.0) + seconds
+
+    def end_frame(self):
+        now = self._clock()
+        phases = self._current
+        with self._lock:
+            background, self._background = self._background, {}
+        total = now - self._frame_start
+        self._frame_index += 1
+        self._frames.append((self._frame_index, total, total - phases.get("wait", 0.0), phases, background))
+        if self.export_path and now - self._last_export >= self.export_interval:
+            self._last_export = now
+            self.export(self.export_path)
+
+    def reset(self):
+        self._frames.clear()
+
+    # ---------------------------
+    # """Statistics"""
+    # ---------------------------
+    def _phase_names(self):
+        seen = set()
+        for frame in self._frames:
+            seen.update(frame[3])
+            seen.update(frame[4])
+        known = [p for p in PHASES + BACKGROUND_PHASES if p in seen]
+        return known + sorted(seen.difference(known))
+
+    def summary(self):
+        """
+        Statistics of the rolling window.
+
+        :return: dict with frames, fps, work_ms_mean, work_ms_p95, worst_ms, worst_frame (its
+        per-phase ms) and phases_ms (mean ms per frame for each phase).
+        """
+        frames = list(self._frames)
+        if not frames:
+            return {"frames": 0, "fps": 0.0, "work_ms_mean": 0.0, "work_ms_p95": 0.0,
+                    "worst_ms": 0.0, "worst_frame": {}, "phases_ms": {}}
+        totals = np.fromiter((f[1] for f in frames), dtype=np.float64, count=len(frames))
+        work = np.fromiter((f[2] for f in frames), dtype=np.float64, count=len(frames))
+        worst = frames[int(np.argmax(work))]
+        phases_ms = {}
+        for name in self._phase_names():
+            phases_ms[name] = 1000.0 * sum(f[3].get(name, f[4].get(name, 0.0)) for f in frames) / len(frames)
+        return {
+            "frames": len(frames),
+            "fps": len(frames) / float(totals.sum()) if totals.sum() > 0 else 0.0,
+            "work_ms_mean": 1000.0 * float(work.mean()),
+            "work_ms_p95": 1000.0 * float(np.percentile(work, 95)),
+            "worst_ms": 1000.0 * worst[2],
+            "worst_frame": {name: 1000.0 * value for name, value in worst[3].items()},
+            "phases_ms": phases_ms,
+        }
+
+    def export(self, path):
+        """Writes the rolling window: per-frame rows as CSV, or summary plus frames as JSON (.json)."""
+        names = self._phase_names()
+        rows = []
+        for index, total, work, phases, background in list(self._frames):
+            row = {"frame": index, "total_ms": 1000.0 * total, "work_ms": 1000.0 * work}
+            for name in names:
+                row[name + "_ms"] = 1000.0 * phases.get(name, background.get(name, 0.0))
+            rows.append(row)
+        try:
+            with open(path, 'w', encoding='utf-8', newline='') as f:
+                if path.lower().endswith(".json"):
+                    json.dump({"summary": self.summary(), "frames": rows}, f, indent=2)
+                else:
+                    writer = csv.DictWriter(f, fieldnames=["frame", "total_ms", "work_ms"] + [n + "_ms" for n in names])
+                    writer.writeheader()
+                    writer.writerows(rows)
+        except OSError as exc:
+            print("Error writing frame profile:", exc)
+
+    # ---------------------------
+    # """Overlay"""
+    # ---------------------------
+    def draw_overlay(self, screen, font, pos=(None, 10), refresh=0.25):
+        """
+        Draws fps, per-phase ms and the worst frame in a box on screen.
+        The text is re-rendered at most every refresh seconds; in between the same surface
+        is blitted again. The numbers change constantly, so they bypass the shared text cache.
+
+        :return: The pygame.Rect covered by the overlay.
+        """
+        now = self._clock()
+        if self._overlay is None or now - self._overlay_time >= refresh:
+            self._overlay_time = now
+            self._overlay = self._render_overlay(font)
+        x, y = pos
+        if x is None:
+            x = screen.get_width() - self._overlay.get_width() - 10
+        return screen.blit(self._overlay, (x, y))
+
+    def _render_overlay(self, font):
+        stats = self.summary()
+        white = (255, 255, 255)
+        header = [f"{stats['fps']:.0f} fps  work {stats['work_ms_mean']:.2f} ms  p95 {stats['work_ms_p95']:.2f}",
+                  f"worst frame {stats['worst_ms']:.2f} ms"]
+        rows = [(font.render(name, True, white), font.render(f"{value:.3f} ms", True, white))
+                for name, value in stats["phases_ms"].items() if name != "wait"]
+        header = [font.render(line, True, white) for line in header]
+        name_width = max((n.get_width() for n, _ in rows), default=0)
+        value_width = max((v.get_width() for _, v in rows), default=0)
+        line_height = font.get_linesize()
+        width = max([name_width + value_width + 16] + [h.get_width() for h in header]) + 16
+        height = line_height * (len(header) + len(rows)) + 12
+        # """never shrink: a smaller box would leave the old one's edges on screen"""
+        if self._overlay is not None:
+            width = max(width, self._overlay.get_width())
+            height = max(height, self._overlay.get_height())
+        surface = pygame.Surface((width, height))
+        surface.fill((0, 0, 0))
+        pygame.draw.rect(surface, (128, 128, 128), surface.get_rect(), 2)
+        y = 6
+        for line in header:
+            surface.blit(line, (8, y))
+            y += line_height
+        for name, value in rows:
+            surface.blit(name, (8, y))
+            surface.blit(value, (width - 8 - value.get_width(), y))
+            y += line_height
+        return surface
@@ -0,0 +1,193 @@
+# -----------------------------------------------------------------------------
+# """GridLayout: arithmetic hit-testing for grid cells, track labels and controls"""
+# -----------------------------------------------------------------------------
+import pygame
+
+
+class GridLayout:
+    """
+    Knows where the grid, the track labels and the bottom controls are on screen, so a
+    click position can be mapped to (step, instrument), a track or a control ID with a
+    few integer operations instead of scanning a list of rectangles.
+
+    Grid geometry matches UIManager.draw_grid: column i starts at
+    left + (i - first_step) * step_width, row j at (j - first_row) * row_height, and only
+    the inner part of a cell (inside the margin) is clickable. Rows shrink from
+    max_row_height down to min_row_height as tracks are added; when even that does not fit
+    grid_height, only visible_rows rows starting at first_row are on screen and the rest
+    are reached by scrolling. Steps work the same way horizontally: every step is shown
+    while they are at least min_step_width wide, otherwise a window of visible_steps steps
+    starting at first_step (zoom_in / zoom_out change how many). Controls are put in a
+    coarse bucket index so a lookup only tests the one or two rectangles in the clicked bucket.
+    """
+
+    def __init__(self, left=200, grid_width=1200, grid_height=600, row_height=100, min_row_height=40,
+                 min_step_width=16, cell_margin=5, bucket_size=100):
+        """
+        :param left: x coordinate where the grid starts (the label panel is to its left).
+        :param grid_width: Width in pixels shared by all steps.
+        :param grid_height: Height in pixels shared by the visible rows.
+        :param row_height: Height of one instrument row when they all fit.
+        :param min_row_height: Rows never get smaller than this; past it the grid scrolls.
+        :param min_step_width: Narrowest step column; longer patterns are shown through a window.
+        :param cell_margin: Non-clickable border around each cell.
+        :param bucket_size: Edge length of the control index buckets.
+        """
+        self.left = int(left)
+        self.grid_width = int(grid_width)
+        self.grid_height = int(grid_height)
+        self.max_row_height = int(row_height)
+        self.min_row_height = min(int(min_row_height), self.max_row_height)
+        self.row_height = self.max_row_height
+        self.cell_margin = int(cell_margin)
+        self.bucket_size = int(bucket_size)
+        self.instruments_count = 0
+        self.visible_rows = 0
+        self.first_row = 0
+        self.beats_count = 1
+        self.min_step_width = max(2 * int(cell_margin) + 1, int(min_step_width))
+        self.step_width = self.grid_width
+        self.visible_steps = 1
+        self.first_step = 0
+        self._zoom_steps = None  # """steps on screen chosen by zooming; None = as many as fit"""
+        self._control_buckets = {}
+        self._control_rects = None
+
+    def update(self, instruments_count, beats_count):
+        """Recomputes the grid geometry for a new row or step count."""
+        self.instruments_count = int(instruments_count)
+        self.beats_count = max(1, int(beats_count))
+        most = min(self.beats_count, self.max_visible_steps())
+        self.visible_steps = most if self._zoom_steps is None else max(1, min(self._zoom_steps, most))
+        self.step_width = self.grid_width // self.visible_steps
+        self.scroll_steps_to(self.first_step)
+        fit = self.grid_height // max(1, self.instruments_count)
+        self.row_height = max(self.min_row_height, min(self.max_row_height, fit))
+        self.visible_rows = min(self.instruments_count, self.grid_height // self.row_height)
+        self.scroll_to(self.first_row)
+
+    def scroll_to(self, first_row):
+        """
+        Makes first_row the top visible row (clamped so the last page stays full).
+
+        :return: True if the visible rows changed.
+        """
+        first_row = max(0, min(int(first_row), self.instruments_count - self.visible_rows))
+        changed = first_row != self.first_row
+        self.first_row = first_row
+        return changed
+
+    def max_visible_steps(self):
+        """Most steps that fit on screen at min_step_width."""
+        return max(1, self.grid_width // self.min_step_width)
+
+    def scroll_steps_to(self, first_step):
+        """
+        Makes first_step the leftmost visible step (clamped so the last page stays full).
+
+        :return: True if the visible steps changed.
+        """
+        first_step = max(0, min(int(first_step), self.beats_count - self.visible_steps))
+        changed = first_step != self.first_step
+        self.first_step = first_step
+        return changed
+
+    def zoom(self, factor):
+        """
+        Shows factor times as many steps (0.5 zooms in, 2 zooms out), keeping the left edge.
+        The step count runs from 4 (or fewer for short patterns) to as many as fit.
+
+        :return: True if the zoom changed.
+        """
+        most = min(self.beats_count, self.max_visible_steps())
+        steps = max(min(4, most), min(most, int(round(self.visible_steps * factor))))
+        if steps == self.visible_steps:
+            return False
+        # """zoomed all the way out = follow the pattern length again"""
+        self._zoom_steps = None if steps == most else steps
+        self.update(self.instruments_count, self.beats_count)
+        return True
+
+    def step_visible(self, step):
+        return self.first_step <= step < self.first_step + self.visible_steps
+
+    def visible_steps_range(self):
+        """The step indexes currently on screen."""
+        return range(self.first_step, self.first_step + self.visible_steps)
+
+    def column_left(self, step):
+        """x coordinate of a step column (only meaningful for visible steps)."""
+        return self.left + (step - self.first_step) * self.step_width
+
+    def visible_range(self):
+        """The instrument indexes currently on screen."""
+        return range(self.first_row, self.first_row + self.visible_rows)
+
+    def row_top(self, instrument):
+        """y coordinate of an instrument row (only meaningful for visible rows)."""
+        return (instrument - self.first_row) * self.row_height
+
+    # ---------------------------
+    # """Grid"""
+    # ---------------------------
+    def cell_rect(self, step, instrument):
+        """The clickable (inner) rectangle of a cell."""
+        m = self.cell_margin
+        return pygame.Rect(self.column_left(step) + m, self.row_top(instrument) + m,
+                           self.step_width - 2 * m, self.row_height - 2 * m)
+
+    def cell_at(self, pos):
+        """
+        Maps a position to the grid cell under it.
+
+        :return: (step, instrument) or None when pos is outside every cell's clickable area.
+        """
+        x, y = pos
+        x -= self.left
+        if x < 0 or y < 0 or self.step_width <= 0:
+            return None
+        column, local_x = divmod(x, self.step_width)
+        row, local_y = divmod(y, self.row_height)
+        if column >= self.visible_steps or row >= self.visible_rows:
+            return None
+        m = self.cell_margin
+        if not (m <= local_x < self.step_width - m and m <= local_y < self.row_height - m):
+            return None
+        return self.first_step + column, self.first_row + row
+
+    def instrument_at(self, pos):
+        """Maps a position on the label panel to an instrument index, or None."""
+        x, y = pos
+        if not (0 <= x < self.left and y >= 0):
+            return None
+        row = y // self.row_height
+        return self.first_row + row if row < self.visible_rows else None
+
+    # ---------------------------
+    # """Controls"""
+    # ---------------------------
+    def set_controls(self, controls):
+        """
+        Indexes the control rectangles (name -> pygame.Rect) returned by draw_bottom_menu.
+        The index is only rebuilt when the rectangles actually change.
+        """
+        rects = {name: tuple(rect) for name, rect in controls.items()}
+        if rects == self._control_rects:
+            return
+        self._control_rects = rects
+        size = self.bucket_size
+        buckets = {}
+        for name, rect in controls.items():
+            rect = pygame.Rect(rect)
+            for bx in range(rect.left // size, (rect.right - 1) // size + 1):
+                for by in range(rect.top // size, (rect.bottom - 1) // size + 1):
+                    buckets.setdefault((bx, by), []).append((name, rect))
+        self._control_buckets = buckets
+
+    def control_at(self, pos):
+        """Returns the name of the control under pos, or None."""
+        x, y = pos
+        for name, rect in self._control_buckets.get((x // self.bucket_size, y // self.bucket_size), ()):
+            if rect.collidepoint(pos):
+                return name
+        return None
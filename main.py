@@ -3,10 +3,27 @@ from sound_manager import SoundManager #this class loads and plays the drum soun
 from preset_manager import PresetManager #this class deals with the "Preset" feature
 from storage_manager import StorageManager #Whenever you store your beat, it's in this class
 from sequencer import Sequencer #the machine; the core of this program
-from menus import SaveMenu, LoadMenu, PresetMenu #the superclass that handles the save, load, and preset menus in the UI
+from menus import SaveMenu, LoadMenu, PresetMenu, SongMenu #the superclass that handles the save, load, preset and song menus in the UI
+from step_mixer import StepMixCache #optional engine: one pre-mixed voice per step
+from sample_loader import SampleLoader #decodes the samples in parallel, cached on disk in the mixer's format
+from playback_engine import PlaybackEngine #runs the sequencer and note triggering on its own thread
+from frame_profiler import FrameProfiler #per-phase frame timing, overlay (F3) and stats export
+from trigger_telemetry import TriggerTelemetry #intended vs actual note trigger times
+from track_list import TrackList #the instrument tracks: name, sample, color and gain of every row
+from arrangement import Arrangement, PatternPrefetcher #the song: saved beats and presets chained with repeat counts
+from timeline import PPQ, SWING_MIN, SWING_MAX #tick resolution and swing range of the timing edits
 
 import pygame
 import copy #duplicate lists without affecting the original
+import sys
+import time
+
+
+# """longest pattern the beats buttons go up to"""
+MAX_BEATS = 4096
+# """[ and ] change the swing by this many percent; one Alt + wheel notch nudges by this many ticks"""
+SWING_STEP = 2
+NUDGE_TICKS = PPQ // 32
 
 
 class PyDrumsApp:
@@ -15,8 +32,22 @@ class PyDrumsApp:
     UIManager (drawing), SoundManager (audio playback), and all persistent data (Storage and Presets).
     """
 
-    def __init__(self):
-        """Initializes the core components, state variables, and managers."""
+    def __init__(self, premix_steps=False, threaded_audio=True, profile_path=None, jitter_path=None,
+                 library_path='saved_beats.txt', tracks=None):
+        """
+        Initializes the core components, state variables, and managers.
+
+        :param premix_steps: Trigger each step as one pre-mixed voice (StepMixCache)
+        instead of one mixer voice per instrument.
+        :param threaded_audio: Run the sequencer on its own thread (PlaybackEngine); when False
+        the engine is pumped from the UI loop instead.
+        :param profile_path: If set, profile every frame and write the rolling stats there
+        (.json or .csv). Press F3 for the on-screen overlay, F4 to export right away.
+        :param jitter_path: Where the note trigger telemetry is dumped on exit and with F5
+        (.json or .csv, default trigger_jitter.json).
+        :param library_path: Saved beats library (JSON Lines file, or SQLite for .db/.sqlite).
+        :param tracks: TrackList of the instrument rows (defaults to the built-in six piece kit).
+        """
         
         # """this prevents the app from crashing if the font is not found"""
         try:
@@ -26,8 +57,11 @@ class PyDrumsApp:
             self.label_font = pygame.font.SysFont(None, 32)
             self.medium_font = pygame.font.SysFont(None, 24)
 
+        # """one row per track; everything below sizes itself from this list"""
+        self.tracks = tracks if tracks is not None else TrackList()
+
         # """responsible for the timing"""
-        self.sequencer = Sequencer(instruments_count=6, initial_beats=8, initial_bpm=240)
+        self.sequencer = Sequencer(instruments_count=len(self.tracks), initial_beats=8, initial_bpm=240)
         
         
         self.beats = self.sequencer.beats
@@ -35,23 +69,28 @@ class PyDrumsApp:
         self.instruments = self.sequencer.instruments
         
         # """Other app-level state variables""" 
-        self.beat_changed = True
         self.timer = pygame.time.Clock()
         self.fps = 60
         self.playing = True
+        # """timing edits: swing, and the last step offset / note nudge (shown under the controls)"""
+        self.swing = SWING_MIN
+        self.timing = ({}, {})
+        self.timing_text = ''
+        self._timing_edit = None
 
         # """menus state""" 
         self.save_menu = False
         self.load_menu = False
         self.load_preset = False
+        self.song_menu = False
 
-        # """saved beats (list of lines)"""
-        self.saved_beats = StorageManager().load_all_lines()
+        # """saved beats library; the StorageManager is the only reader/writer (menus page through it)"""
+        self.storage = StorageManager(library_path)
 
         # """save/load UI state"""
         self.beat_name = ''
         self.typing = False
-        self.index = 100
+        self.index = -1 # """selected position in the saved beats library (-1 = none)"""
 
         # """rect placeholder to avoid NameError"""
         self.exit_button = pygame.Rect(0, 0, 0, 0)
@@ -67,15 +106,34 @@ class PyDrumsApp:
         pygame.display.set_caption('PyDrums - Digital Beatmaker Workstation')
 
         # """Managers"""
-        sound_paths = [
-            'sounds/hi hat.wav',
-            'sounds/snare.wav',
-            'sounds/kick.wav',
-            'sounds/crash.wav',
-            'sounds/clap.wav',
-            'sounds/tom.wav',
-        ]
-        self.sound_manager = SoundManager(sound_paths)
+        # """file names are matched case-insensitively (the kit ships as e.g. kick.WAV)"""
+        sound_paths = self.tracks.samples
+        # """every note is recorded against the scheduler's clock: intended vs actual trigger time"""
+        self.telemetry = TriggerTelemetry(self.instruments, names=self.tracks.names,
+                                          clock=self.sequencer.scheduler.now)
+        self.jitter_path = jitter_path
+        self.sample_loader = SampleLoader()
+        # """16 pooled voices; when they run out, low priority tracks (the hi hat) are stolen first"""
+        self.sound_manager = SoundManager(sound_paths, telemetry=self.telemetry, loader=self.sample_loader,
+                                          priorities=self.tracks.priorities, gains=self.tracks.gains,
+                                          choke_groups=self.tracks.choke_groups)
+        # """optional pre-mixed step engine"""
+        self.step_mix = None
+        if premix_steps:
+            try:
+                self.step_mix = StepMixCache.from_paths(sound_paths, loader=self.sample_loader,
+                                                        gains=self.tracks.gains)
+                self.step_mix.rebuild(self.sequencer.grid, self.sequencer.active_list, self.sequencer.beats)
+            except Exception as exc:
+                print("Warning: pre-mixed steps disabled:", exc)
+                self.step_mix = None
+        # """song mode: the next entry is read, decoded (and pre-mixed) on a worker while the current one plays"""
+        self.arrangement = Arrangement()
+        self.prefetcher = PatternPrefetcher(self._resolve_song_entry, self.instruments, self.step_mix)
+        # """the engine owns the sequencer from here on: the UI talks to it through messages"""
+        self.engine = PlaybackEngine(self.sequencer, self._trigger_step, self.step_mix, threaded=threaded_audio,
+                                     prefetcher=self.prefetcher)
+        self._engine_playing = self.playing
         # """responsible for the presets"""
         self.preset_manager = PresetManager({
             "Rock Beat": {
@@ -116,58 +174,118 @@ class PyDrumsApp:
             }
         })
 
-        self.ui_manager = UIManager(self.screen, self.label_font, self.medium_font)
+        self.ui_manager = UIManager(self.screen, self.label_font, self.medium_font, self.tracks)
+
+        # """frame profiler: off (one attribute check per phase) unless exporting or the overlay is shown"""
+        self.profiler = FrameProfiler(export_path=profile_path)
+        self.ui_manager.profiler = self.profiler
+        self.show_profiler = False
 
         # """Menus (polymorphic)"""
         self._save_menu = SaveMenu(self.screen, self.label_font, self.medium_font)
         self._load_menu = LoadMenu(self.screen, self.label_font, self.medium_font)
         self._preset_menu = PresetMenu(self.screen, self.label_font, self.medium_font, self.preset_manager)
+        self._song_menu = SongMenu(self.screen, self.label_font, self.medium_font, self.preset_manager)
+
+    @property
+    def menu_open(self):
+        """True while a menu covers the grid."""
+        return self.save_menu or self.load_menu or self.load_preset or self.song_menu
 
     # ---------------------------
-    # """Utilities to sync alias attributes with sequencer authoritative state"""
+    # """Utilities to sync alias attributes with the engine's authoritative state"""
     # ---------------------------
     def _sync_from_sequencer(self):
-        """Make sure attribute aliases reflect sequencer state."""
-        self.beats = self.sequencer.beats
-        self.bpm = self.sequencer.bpm
+        """Make sure attribute aliases reflect the latest snapshot published by the engine."""
+        snapshot = self.engine.snapshot
+        self.beats = snapshot.beats
+        self.bpm = snapshot.bpm
         self.instruments = self.sequencer.instruments
-        self.clicked = self.sequencer.grid
-        self.active_list = self.sequencer.active_list
-        self.active_beat = self.sequencer.active_beat
-        self.active_length = self.sequencer.active_length
+        if snapshot.grid is not getattr(self, 'clicked', None):
+            # """a new or edited pattern: the next nudge starts from the published timing"""
+            self._timing_edit = None
+        self.clicked = snapshot.grid
+        self.active_list = snapshot.active_list
+        self.active_beat = snapshot.active_beat
+        self.active_length = 0
+        self.swing = snapshot.swing
+        self.timing = snapshot.timing
 
     def _sync_to_sequencer(self):
-        """If we mutated alias attributes directly, push them to the sequencer (not used often)."""
+        """If we mutated alias attributes directly, push them to the engine as one load message."""
         try:
-            self.sequencer.beats = int(self.beats)
-            self.sequencer.bpm = int(self.bpm)
-            self.sequencer.grid = self.clicked
-            self.sequencer.active_list = self.active_list
-            self.sequencer.active_beat = int(self.active_beat)
-            self.sequencer.active_length = int(self.active_length)
+            self.engine.load_pattern(int(self.beats), int(self.bpm), self.clicked)
+            self.engine.set_active_list(list(self.active_list))
         except Exception:
             pass
 
+    def _push_menu_changes(self):
+        """Menus replace clicked/beats/bpm on the app; forward a load to the engine if they did."""
+        snapshot = self.engine.snapshot
+        if self.clicked is not snapshot.grid or self.beats != snapshot.beats or self.bpm != snapshot.bpm:
+            self.engine.load_pattern(int(self.beats), int(self.bpm), self.clicked)
+
+    def _resolve_song_entry(self, entry):
+        """
+        Reads a song entry for the PatternPrefetcher (on its worker thread).
+
+        :return: (beats, bpm, grid), or None if the saved beat or preset is gone.
+        """
+        if entry.source == "preset":
+            return self.preset_manager.load_preset_by_name(entry.key)
+        record = self.storage.get(entry.key)
+        if record is None:
+            return None
+        return record.beats, record.bpm, record.to_grid()
+
+    def _trigger_step(self, step, target_time, mask=None):
+        """Called by the PlaybackEngine (on its thread) when the notes of mask on a step are due."""
+        if not self.profiler.enabled:
+            self.play_notes(step, target_time, mask)
+            return
+        start = time.perf_counter()
+        self.play_notes(step, target_time, mask)
+        self.profiler.record("play_notes", time.perf_counter() - start)
+
+    def toggle_profiler_overlay(self):
+        """Shows or hides the profiler overlay (profiling stays on while exporting)."""
+        self.show_profiler = not self.show_profiler
+        self.profiler.enabled = self.show_profiler or self.profiler.export_path is not None
+        if self.show_profiler:
+            self.profiler.reset()
+        # """repaint what the overlay covered"""
+        self.ui_manager.invalidate()
+
     # ---------------------------
     # """Play"""
     # ---------------------------
-    def play_notes(self):
-        """Plays the sounds for the current active_beat according to clicked and active_list."""
-        for i in range(len(self.clicked)):
+    def play_notes(self, step=None, intended_time=None, mask=None):
+        """
+        Plays the sounds for a step (default: the current active_beat) according to the grid and mutes.
+
+        :param intended_time: When the step should sound (scheduler clock); recorded in the trigger telemetry.
+        :param mask: Only these instruments (a timeline event; nudged notes of the step come as their own event).
+        """
+        if step is None:
+            step = self.active_beat
+        seq = self.sequencer
+        instruments = seq.instruments_on_step(step) if mask is None else seq.instruments_in(mask)
+        if self.step_mix is not None:
+            # """one pre-mixed voice per step, no loop over instruments; a step split by nudges
+            # plays a mix of just its part"""
+            if mask is None or mask & seq.active_mask == self.step_mix.step_mask(step):
+                self.step_mix.play_step(step)
+            else:
+                self.step_mix.play_mask(mask)
+            if intended_time is not None:
+                self.telemetry.record_many(instruments, intended_time)
+            return
+        # """one bitmask lookup gives the unmuted instruments on this step; track i plays sound i,
+        # so the cost follows the number of hits, not the number of tracks"""
+        play = self.sound_manager.play_instrument_index
+        for i in instruments:
             try:
-                if self.clicked[i][self.active_beat] == 1 and self.active_list[i] == 1:
-                    if i == 0:
-                        self.sound_manager.play_instrument_index(0)  # hi_hat
-                    elif i == 1:
-                        self.sound_manager.play_instrument_index(1)  # snare
-                    elif i == 2:
-                        self.sound_manager.play_instrument_index(2)  # kick
-                    elif i == 3:
-                        self.sound_manager.play_instrument_index(3)  # crash
-                    elif i == 4:
-                        self.sound_manager.play_instrument_index(4)  # clap
-                    elif i == 5:
-                        self.sound_manager.play_instrument_index(5)  # tom
+                play(i, intended_time)
             except Exception:
                 # Defensive: ignore audio errors
                 pass
@@ -176,175 +294,289 @@ class PyDrumsApp:
     # """Main loop"""
     # ---------------------------
     def run(self):
-        run_flag = True
-        while run_flag:
-            # """tick clock"""
-            self.timer.tick(self.fps)
-
-            # """fill background"""
-            self.screen.fill(red)
-
-            # """sync attribute aliases before drawing"""
-            self._sync_from_sequencer()
-
-            # """Draw grid and receive interactive boxes"""
-            boxes = self.ui_manager.draw_grid(self.clicked, self.active_beat, self.active_list, self.instruments, self.beats)
-
-            # """draw bottom menu and get control rects"""
-            controls = self.ui_manager.draw_bottom_menu(self.beats, self.bpm, self.playing)
+        self.engine.start()
+        while self.run_frame():
+            pass
+        self.shutdown()
 
-            # """If beat changed flag: play notes then clear flag"""
-            if self.beat_changed:
-                self.play_notes()
-                self.beat_changed = False
+    def run_frame(self):
+        """
+        Runs one iteration of the main loop: tick, draw, handle events, push the frame.
 
-            # """draw menus if active (the actual drawing of modal menus is handled when requested)"""
+        :return: False once the window was closed, True otherwise.
+        """
+        run_flag = True
+        prof = self.profiler if self.profiler.enabled else None
+        if prof:
+            prof.begin_frame()
+        # """tick clock"""
+        self.timer.tick(self.fps)
+        if prof:
+            prof.lap("wait")
+
+        # """sync attribute aliases before drawing"""
+        self._sync_from_sequencer()
+        if prof:
+            prof.lap("sync")
+
+        # """draw menus if active (they cover the whole screen), otherwise repaint only what changed"""
+        dirty_rects = None
+        if self.save_menu:
+            self._save_menu.draw(self.beat_name, self.typing, self)
+        elif self.load_menu:
+            self._load_menu.draw(self.index, self.storage)
+        elif self.load_preset:
+            self._preset_menu.draw()
+        elif self.song_menu:
+            self._song_menu.draw(self.arrangement, self.engine.snapshot.song)
+        else:
+            dirty_rects = self.ui_manager.render_frame(self.clicked, self.active_beat, self.active_list,
+                                                       self.instruments, self.beats, self.bpm, self.playing,
+                                                       self.swing, self.timing_text)
+        if dirty_rects is None:
+            # """the grid is hidden behind a menu: repaint it fully once the menu closes"""
+            self.ui_manager.invalidate()
+        if prof:
+            prof.lap("menu" if dirty_rects is None else "draw")
+
+        # """Event processing"""
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                run_flag = False
+                break
+            self.handle_event(event)
+        if prof:
+            prof.lap("events")
+
+        # """beat timing runs in the engine; tell it when we (or a menu) paused or resumed"""
+        if self.playing != self._engine_playing:
+            self.engine.set_playing(self.playing)
+            self._engine_playing = self.playing
+        if not self.engine.threaded:
+            self.engine.pump()
+        if prof:
+            prof.lap("audio")
+            if self.show_profiler:
+                rect = prof.draw_overlay(self.screen, self.medium_font)
+                if dirty_rects is not None:
+                    dirty_rects.append(rect)
+                prof.lap("overlay")
+        # """push to the display: the whole frame under a menu, only the dirty rects otherwise"""
+        if dirty_rects is None:
+            pygame.display.flip()
+        elif dirty_rects:
+            pygame.display.update(dirty_rects)
+        if prof:
+            prof.lap("display")
+            prof.end_frame()
+        return run_flag
+
+    def handle_event(self, event):
+        """Applies one pygame event (clicks, text input) to the app state."""
+        # """layout of the grid and controls as currently shown (arithmetic hit-testing)"""
+        layout = self.ui_manager.layout
+
+        # """clicking on grid cells (only when no menu open)"""
+        if event.type == pygame.MOUSEBUTTONDOWN and not self.menu_open:
+            cell = layout.cell_at(event.pos)
+            if cell is not None:
+                # """cell = (step_i, instr_j)"""
+                step_i, instr_j = cell
+                # """toggle same as original (clicked[instr][step] *= -1), applied by the engine"""
+                self.engine.toggle_cell(instr_j, step_i)
+
+        # """primary mouse up handling (main UI controls) when no menu open"""
+        if event.type == pygame.MOUSEBUTTONUP and not self.menu_open:
+            pos = event.pos
+            control = layout.control_at(pos)
+
+            # """play/pause toggle area"""
+            if control == "play_pause" and self.playing:
+                self.playing = False
+            elif control == "play_pause" and not self.playing:
+                self.playing = True
+                self.active_beat = 0
+                self.active_length = 0
+
+                # """push to the engine: rewind and restart the clock"""
+                self.engine.restart()
+                self._engine_playing = True
+
+            # """beats change + adjusting clicked grid length"""
+            # """(Shift: 16 at a time, for long patterns)"""
+            elif control == "beats_add_rect":
+                self.beats = min(MAX_BEATS, self.beats + self._beats_step())
+                # """push to the engine (the sequencer pads the grid)"""
+                self.engine.set_beats(self.beats)
+            elif control == "beats_sub_rect":
+                if self.beats > 1:
+                    self.beats = max(1, self.beats - self._beats_step())
+                    self.engine.set_beats(self.beats)
+
+            # """bpm adjustments"""
+            elif control == "bpm_add_rect":
+                self.bpm += 5
+                self.engine.set_bpm(self.bpm)
+            elif control == "bpm_sub_rect":
+                self.bpm = max(1, self.bpm - 5)
+                self.engine.set_bpm(self.bpm)
+            # """clear board"""
+            elif control == "clear":
+                self.engine.clear()
+            # """Save/Load/Preset buttons"""
+            elif control == "save_button":
+                self.save_menu = True
+            elif control == "load_button":
+                self.load_menu = True
+                self.playing = False
+            elif control == "preset_button":
+                self.load_preset = True
+                self.playing = False
+            # """the song menu keeps playing, so the song can be heard while it is edited"""
+            elif control == "song_button":
+                self.song_menu = True
+
+            # """instrument labels: toggle active_list entries"""
+            instr_i = layout.instrument_at(pos)
+            if instr_i is not None:
+                self.engine.toggle_mute(instr_i)
+        # """menu-specific mouse up for exit and menu controls"""
+        elif event.type == pygame.MOUSEBUTTONUP:
+            pos = event.pos
+            # """universal exit handling"""
+            if hasattr(self, "exit_button") and self.exit_button and isinstance(self.exit_button, pygame.Rect):
+                if self.exit_button.collidepoint(pos):
+                    self.save_menu = False
+                    self.load_menu = False
+                    self.load_preset = False
+                    self.song_menu = False
+                    self.playing = True
+                    self.typing = False
+                    self.beat_name = ''
+            # """entry rect interactions (save/load selection)"""
+            if hasattr(self, "entry_rect") and self.entry_rect and isinstance(self.entry_rect, pygame.Rect):
+                if self.entry_rect.collidepoint(pos):
+                    if self.save_menu:
+                        self.typing = not self.typing
+                    if self.load_menu:
+                        # """index calculation"""
+                        self.index = (pos[1] - 100) // 50
+            # """delegate to specific menu handlers (polymorphism)"""
             if self.save_menu:
-                self._save_menu.draw(self.beat_name, self.typing, self)
+                self._save_menu.handle_click(pos, self)
             elif self.load_menu:
-                self._load_menu.draw(self.index, self.saved_beats)
+                handled = self._load_menu.handle_click(pos, self)
+                if handled:
+                    # """ensure the engine reflects a loaded beat (grid, beats and bpm)"""
+                    self._push_menu_changes()
             elif self.load_preset:
-                self._preset_menu.draw()
-
-            # """Event processing"""
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    run_flag = False
-                    break
-
-                # """clicking on grid boxes (only when no menu open)"""
-                if event.type == pygame.MOUSEBUTTONDOWN and not (self.save_menu or self.load_menu or self.load_preset):
-                    for rect, coords in boxes:
-                        if rect.collidepoint(event.pos):
-                            # """coords = (step_i, instr_j) as returned by UI"""
-                            step_i, instr_j = coords
-                            # """toggle same as original: clicked[instr][step] *= -1"""
-                            try:
-                                self.clicked[instr_j][step_i] *= -1
-                                # """update sequencer authoritative grid"""
-                                self.sequencer.grid = self.clicked
-                            except Exception:
-                                pass
-
-                # """primary mouse up handling (main UI controls) when no menu open"""
-                if event.type == pygame.MOUSEBUTTONUP and not (self.save_menu or self.load_menu or self.load_preset):
-                    pos = event.pos
-
-                    # """play/pause toggle area"""
-                    play_pause_rect = controls["play_pause"]
-                    if play_pause_rect.collidepoint(pos) and self.playing:
-                        self.playing = False
-                    elif play_pause_rect.collidepoint(pos) and not self.playing:
-                        self.playing = True
-                        self.active_beat = 0
-                        self.active_length = 0
-
-                        # """push to sequencer"""
-                        self.sequencer.active_beat = 0
-                        self.sequencer.active_length = 0
-
-                    # """beats change + adjusting clicked grid length"""
-                    if controls["beats_add_rect"].collidepoint(pos):
-                        self.beats += 1
-                        for row in self.clicked:
-                            row.append(-1)
-                        # """push to sequencer"""
-                        self.sequencer.set_beats(self.beats)
-                    elif controls["beats_sub_rect"].collidepoint(pos):
-                        if self.beats > 1:
-                            self.beats -= 1
-                            for row in self.clicked:
-                                if len(row) > 0:
-                                    row.pop(-1)
-                            self.sequencer.set_beats(self.beats)
-
-                    # """bpm adjustments"""
-                    if controls["bpm_add_rect"].collidepoint(pos):
-                        self.bpm += 5
-                        self.sequencer.set_bpm(self.bpm)
-                    elif controls["bpm_sub_rect"].collidepoint(pos):
-                        self.bpm = max(1, self.bpm - 5)
-                        self.sequencer.set_bpm(self.bpm)
-                    # """clear board"""
-                    if controls["clear"].collidepoint(pos):
-                        self.clicked = [[-1 for _ in range(self.beats)] for _ in range(self.instruments)]
-                        self.sequencer.grid = self.clicked
-                    # """instrument rectangles: toggle active_list entries"""
-                    instrument_rects = [pygame.Rect((0, i * 100), (200, 100)) for i in range(self.instruments)]
-                    for i_rect_i in range(len(instrument_rects)):
-                        if instrument_rects[i_rect_i].collidepoint(pos):
-                            self.active_list[i_rect_i] *= -1
-                            self.sequencer.active_list = self.active_list
-                    # """Save/Load/Preset buttons"""
-                    if controls["save_button"].collidepoint(pos):
-                        self.save_menu = True
-                    if controls["load_button"].collidepoint(pos):
-                        self.load_menu = True
-                        self.playing = False
-                    if controls["preset_button"].collidepoint(pos):
-                        self.load_preset = True
-                        self.playing = False
-                # """menu-specific mouse up for exit and menu controls"""
-                elif event.type == pygame.MOUSEBUTTONUP:
-                    pos = event.pos
-                    # """universal exit handling"""
-                    if hasattr(self, "exit_button") and self.exit_button and isinstance(self.exit_button, pygame.Rect):
-                        if self.exit_button.collidepoint(pos):
-                            self.save_menu = False
-                            self.load_menu = False
-                            self.load_preset = False
-                            self.playing = True
-                            self.typing = False
-                            self.beat_name = ''
-                    # """entry rect interactions (save/load selection)"""
-                    if hasattr(self, "entry_rect") and self.entry_rect and isinstance(self.entry_rect, pygame.Rect):
-                        if self.entry_rect.collidepoint(pos):
-                            if self.save_menu:
-                                self.typing = not self.typing
-                            if self.load_menu:
-                                # """index calculation"""
-                                self.index = (pos[1] - 100) // 50
-                    # """delegate to specific menu handlers (polymorphism)"""
-                    if self.save_menu:
-                        handled = self._save_menu.handle_click(pos, self)
-                        if handled:
-                            # """ensure sequencer reflects changes"""
-                            self.sequencer.grid = self.clicked
-                    elif self.load_menu:
-                        handled = self._load_menu.handle_click(pos, self)
-                        if handled:
-                            self.sequencer.grid = self.clicked
-                            self.sequencer.set_beats(self.beats)
-                    elif self.load_preset:
-                        handled = self._preset_menu.handle_click(pos, self)
-                        if handled:
-                            self.sequencer.grid = self.clicked
-                            self.sequencer.set_beats(self.beats)
-                # """text input"""
-                if event.type == pygame.TEXTINPUT and self.typing:
-                    self.beat_name += event.text
-                if event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_BACKSPACE and len(self.beat_name) > 0 and self.typing:
-                        self.beat_name = self.beat_name[:-1]
-            # """beat timing - runs the tempo logics"""
-            if self.playing:
-                advanced = self.sequencer.timing_advance()
-                if advanced:
-                    # """sync aliases then play notes"""
-                    self._sync_from_sequencer()
-                    self.play_notes()
-                    self.beat_changed = False
-                    # """update attribute aliases"""
-                    self.active_beat = self.sequencer.active_beat
-            # """flip display"""
-            pygame.display.flip()
-        # """on exit: write saved_beats back to file"""
-        try:
-            with open('saved_beats.txt', 'w', encoding='utf-8') as file:
-                for i in range(len(self.saved_beats)):
-                    file.write(str(self.saved_beats[i]) + '\n')
-        except Exception as exc:
-            print("Error writing saved beats on exit:", exc)
+                handled = self._preset_menu.handle_click(pos, self)
+                if handled:
+                    self._push_menu_changes()
+            elif self.song_menu:
+                self._song_menu.handle_click(pos, self)
+        # """profiler: F3 toggles the overlay, F4 exports the rolling stats"""
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+            self.toggle_profiler_overlay()
+        elif event.type == pygame.KEYDOWN and event.key == pygame.K_F4 and self.profiler.enabled:
+            self.profiler.export(self.profiler.export_path or 'frame_profile.csv')
+        # """F5 dumps the note trigger telemetry"""
+        elif event.type == pygame.KEYDOWN and event.key == pygame.K_F5:
+            self.dump_trigger_telemetry()
+        # """mouse wheel scrolls the saved beats list, or the grid: rows, steps with Shift (or a
+        # sideways wheel), zoom with Ctrl"""
+        if event.type == pygame.MOUSEWHEEL and self.load_menu:
+            self._load_menu.scroll(-3 * event.y, self.storage)
+        elif event.type == pygame.MOUSEWHEEL and self.song_menu:
+            self._song_menu.scroll(-3 * event.y, self.arrangement)
+        elif event.type == pygame.MOUSEWHEEL and not self.menu_open:
+            mods = pygame.key.get_mods()
+            cell = layout.cell_at(pygame.mouse.get_pos()) if mods & pygame.KMOD_ALT else None
+            if cell is not None:
+                # """Alt + wheel nudges the note under the mouse, Alt + Shift + wheel the whole step"""
+                self.nudge_timing(cell[0], None if mods & pygame.KMOD_SHIFT else cell[1], event.y)
+            elif mods & pygame.KMOD_CTRL:
+                self.ui_manager.zoom(0.5 if event.y > 0 else 2)
+            elif mods & pygame.KMOD_SHIFT or event.x:
+                steps = max(1, self.ui_manager.layout.visible_steps // 4)
+                self.ui_manager.scroll_steps(steps * (event.x or -event.y))
+            else:
+                self.ui_manager.scroll_rows(-event.y)
+        # """+/- zoom the grid in and out (more or fewer steps on screen)"""
+        if event.type == pygame.KEYDOWN and not self.menu_open:
+            if event.key in (pygame.K_EQUALS, pygame.K_PLUS, pygame.K_KP_PLUS):
+                self.ui_manager.zoom(0.5)
+            elif event.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+                self.ui_manager.zoom(2)
+            # """[ and ] take swing off and add it"""
+            elif event.key in (pygame.K_LEFTBRACKET, pygame.K_RIGHTBRACKET):
+                step = SWING_STEP if event.key == pygame.K_RIGHTBRACKET else -SWING_STEP
+                self.swing = max(SWING_MIN, min(SWING_MAX, self.swing + step))
+                self.engine.set_swing(self.swing)
+        # """keyboard navigation of the saved beats list (arrows, Page Up/Down, Home/End, Enter loads)"""
+        if event.type == pygame.KEYDOWN and self.load_menu and not self.typing:
+            if self._load_menu.handle_key(event.key, self) and not self.load_menu:
+                # """a beat was loaded: hand it to the engine"""
+                self._push_menu_changes()
+        # """text input"""
+        if event.type == pygame.TEXTINPUT and self.typing:
+            self.beat_name += event.text
+        elif event.type == pygame.TEXTINPUT and self.load_menu:
+            # """the load menu's search box filters as you type"""
+            self._load_menu.type_text(event.text, self)
+        if event.type == pygame.KEYDOWN:
+            if event.key == pygame.K_BACKSPACE and len(self.beat_name) > 0 and self.typing:
+                self.beat_name = self.beat_name[:-1]
+
+    def nudge_timing(self, step, instrument, notches):
+        """
+        Moves a note (or with instrument=None every note of the step) by notches * NUDGE_TICKS,
+        at most half a step either way.
+        """
+        offsets, nudges = self.timing
+        target = (step, instrument)
+        if self._timing_edit is not None and self._timing_edit[0] == target:
+            # """several wheel notches may arrive before the engine publishes the first one"""
+            ticks = self._timing_edit[1]
+        elif instrument is None:
+            ticks = offsets.get(step, 0)
+        else:
+            ticks = nudges.get(step, {}).get(instrument, 0)
+        ticks = max(-(PPQ // 2), min(PPQ // 2, ticks + notches * NUDGE_TICKS))
+        self._timing_edit = (target, ticks)
+        if instrument is None:
+            self.engine.set_step_offset(step, ticks)
+            self.timing_text = f'Step {step + 1}: {ticks:+d}/{PPQ}'
+        else:
+            self.engine.set_nudge(instrument, step, ticks)
+            self.timing_text = f'{self.tracks[instrument].name} {step + 1}: {ticks:+d}/{PPQ}'
+
+    @staticmethod
+    def _beats_step():
+        return 16 if pygame.key.get_mods() & pygame.KMOD_SHIFT else 1
+
+    def dump_trigger_telemetry(self):
+        """Writes the trigger telemetry and prints the lateness percentiles per instrument."""
+        path = self.jitter_path or 'trigger_jitter.json'
+        self.telemetry.dump(path)
+        for name, stats in self.telemetry.summary().items():
+            print(f"{name:>10}: {stats['count']:6d} notes  p50 {stats['p50_ms']:.2f} ms  "
+                  f"p95 {stats['p95_ms']:.2f} ms  p99 {stats['p99_ms']:.2f} ms  max {stats['max_ms']:.2f} ms")
+        voices = self.sound_manager.voice_stats()
+        if voices:
+            print(f"{'voices':>10}: {voices['played']:6d} played  {voices['stolen']} stolen  "
+                  f"{voices['dropped']} dropped  {voices['choked']} choked  (pool of {voices['voices']})")
+        print("Trigger telemetry written to", path)
+
+    def shutdown(self):
+        """Stops playback, closes the saved beats library and pygame."""
+        self.engine.stop()
+        if self.profiler.export_path:
+            self.profiler.export(self.profiler.export_path)
+        if self.jitter_path:
+            self.dump_trigger_telemetry()
+        # """on exit: write whatever the background saver has not written yet, then release the library"""
+        self.storage.close()
         pygame.quit()
 
 
@@ -355,7 +587,30 @@ if __name__ == "__main__":
     # """Provide helpful console message for missing assets"""
     print("Starting PyDrums - Digital Beat Workstation.")
     pygame.init() # Initialise pygame before creating app
-    app = PyDrumsApp()
+    # """--profile [file]: record per-phase frame timings (default file: frame_profile.csv)"""
+    profile_path = None
+    if '--profile' in sys.argv:
+        i = sys.argv.index('--profile')
+        has_path = i + 1 < len(sys.argv) and not sys.argv[i + 1].startswith('--')
+        profile_path = sys.argv[i + 1] if has_path else 'frame_profile.csv'
+    # """--library file: saved beats library (.txt JSON Lines, .db SQLite)"""
+    library_path = 'saved_beats.txt'
+    if '--library' in sys.argv and sys.argv.index('--library') + 1 < len(sys.argv):
+        library_path = sys.argv[sys.argv.index('--library') + 1]
+    # """--jitter-dump file: write the note trigger telemetry on exit"""
+    jitter_path = None
+    if '--jitter-dump' in sys.argv and sys.argv.index('--jitter-dump') + 1 < len(sys.argv):
+        jitter_path = sys.argv[sys.argv.index('--jitter-dump') + 1]
+    # """--kit file: JSON list of tracks (name, sample, color, gain) instead of the built-in kit"""
+    tracks = None
+    if '--kit' in sys.argv and sys.argv.index('--kit') + 1 < len(sys.argv):
+        tracks = TrackList.from_file(sys.argv[sys.argv.index('--kit') + 1])
+    app = PyDrumsApp(premix_steps='--premix' in sys.argv,
+                     threaded_audio='--no-audio-thread' not in sys.argv,
+                     profile_path=profile_path,
+                     jitter_path=jitter_path,
+                     library_path=library_path,
+                     tracks=tracks)
 
     # """enable text input events when typing is toggled through GUI"""
     pygame.key.start_text_input()
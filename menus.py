@@ -1,9 +1,12 @@
 # -----------------------------------------------------------------------------
-# """Menus (BaseMenu with polymorphism -> SaveMenu, LoadMenu, PresetMenu)"""
+# """Menus (BaseMenu with polymorphism -> SaveMenu, LoadMenu, PresetMenu, SongMenu)"""
 # -----------------------------------------------------------------------------
 import pygame
 from pygame import mixer
 import copy
+from collections import OrderedDict
+from beat_record import BeatFormatError, BeatRecord
+from text_cache import render_text
 
 # -------------------------
 # """Color and Size Variables"""
@@ -57,6 +60,8 @@ class SaveMenu(BaseMenu):
         self._entry_rect = pygame.Rect(400, 200, 600, 200)
         self._exit_rect = pygame.Rect(WIDTH - 200, HEIGHT - 100, 180, 90)
         self._save_rect = pygame.Rect(WIDTH // 2 - 100, int(HEIGHT * 0.75), 200, 100)
+        # """pattern id the user was warned about; saving it again is then deliberate"""
+        self._confirmed_pattern = None
 
     # -------------------------------------
     # """Draw Menu"""
@@ -65,18 +70,18 @@ class SaveMenu(BaseMenu):
         """Draws the save menu, including the text input box, Save button, and error message."""
         pygame.draw.rect(self.screen, black, [0, 0, WIDTH, HEIGHT])
 
-        menu_text = self.label_font.render(
-            'SAVE MENU: Give a name of your wonderful beat!', True, white
+        menu_text = render_text(
+            self.label_font, 'SAVE MENU: Give a name of your wonderful beat!', True, white
         )
         self.screen.blit(menu_text, (400, 40))
 
         # """Exit button"""
-        exit_text = self.label_font.render('Close', True, white)
+        exit_text = render_text(self.label_font, 'Close', True, white)
         pygame.draw.rect(self.screen, gray, self._exit_rect, 0, 5)
         self.screen.blit(exit_text, (self._exit_rect.x + 40, self._exit_rect.y + 30))
 
         # """Save button"""
-        saving_text = self.label_font.render('Save Beat', True, white)
+        saving_text = render_text(self.label_font, 'Save Beat', True, white)
         pygame.draw.rect(self.screen, gray, self._save_rect, 0, 5)
         self.screen.blit(saving_text, (self._save_rect.x + 30, self._save_rect.y + 30))
 
@@ -85,12 +90,12 @@ class SaveMenu(BaseMenu):
             pygame.draw.rect(self.screen, dark_gray, self._entry_rect, 0, 5)
         pygame.draw.rect(self.screen, gray, self._entry_rect, 5, 5)
 
-        entry_text = self.label_font.render(f'{beat_name}', True, white)
+        entry_text = render_text(self.label_font, f'{beat_name}', True, white)
         self.screen.blit(entry_text, (self._entry_rect.x + 30, self._entry_rect.y + 50))
 
         # """ERROR MESSAGE"""
         if hasattr(app, "save_error") and app.save_error:
-            error_text = self.medium_font.render(app.save_error, True, red)
+            error_text = render_text(self.medium_font, app.save_error, True, red)
             self.screen.blit(error_text, (self._entry_rect.x, self._entry_rect.y + 170))
 
     # -------------------------------------
@@ -106,6 +111,7 @@ class SaveMenu(BaseMenu):
             app.beat_name = ''
             app.playing = True
             app.save_error = ""  # clear errors on close
+            self._confirmed_pattern = None
             return True
 
         # """Typing toggle (activates/deactivates text input)"""
@@ -121,21 +127,23 @@ class SaveMenu(BaseMenu):
                 app.save_error = "Name must be more than 3 characters!"
                 return True
 
+            # """Build the record; an identical grid only costs a name in the library, but warn once."""
+            record = BeatRecord.from_grid(app.beat_name, app.beats, app.bpm, app.clicked, app.instruments)
+            existing = self._existing_pattern(record, app)
+            if existing and self._confirmed_pattern != record.pattern_id:
+                app.save_error = f"{existing} - click Save again to save anyway"
+                self._confirmed_pattern = record.pattern_id
+                return True
+
             # """Clear old errors on successful validation."""
             app.save_error = ""
+            self._confirmed_pattern = None
 
-            # """Format the beat string and append it to the in-memory list."""
-            app.saved_beats.append(
-                f'name: {app.beat_name}, beats: {app.beats}, bpm: {app.bpm}, selected: {app.clicked}'
-            )
-
-            # """Write the updated list back to the file."""
-            try:
-                with open('saved_beats.txt', 'w', encoding='utf-8') as file:
-                    for item in app.saved_beats:
-                        file.write(str(item) + '\n')
-            except Exception as exc:
-                print("Error saving beats:", exc)
+            # """Add it to the library (written to disk in the background); keep the menu open on failure."""
+            if app.storage.add(record) is None:
+                app.save_error = ("Could not save - library is read-only" if app.storage.read_only
+                                  else "Could not save - see the console")
+                return True
 
             # """Close menu & reset state."""
             app.save_menu = False
@@ -146,147 +154,291 @@ class SaveMenu(BaseMenu):
 
         return False
 
+    @staticmethod
+    def _existing_pattern(record, app):
+        """Describes a saved beat or preset with exactly this grid, or returns None."""
+        found = app.storage.find_pattern(record.pattern_id)
+        if found is not None:
+            return f"Already saved as '{found[1]}'"
+        for name in app.preset_manager.get_preset_names():
+            beats, bpm, pattern = app.preset_manager.load_preset_by_name(name)
+            try:
+                preset = BeatRecord.from_grid(name, beats, bpm, pattern, app.instruments)
+            except (BeatFormatError, ValueError):
+                continue
+            if preset.pattern_id == record.pattern_id:
+                return f"Same grid as the '{name}' preset"
+        return None
+
 class LoadMenu(BaseMenu):
     """
     Handles the UI and logic for loading and deleting saved beat patterns.
+    The list is virtualized: only the rows in the viewport are fetched from the
+    StorageManager (names only; a beat is fully decoded when it is loaded), and each row
+    is rendered once into a memoized surface. Frame cost is a handful of blits however
+    many beats are saved. Scroll with the mouse wheel, the Up/Down buttons or the keyboard
+    (arrows, Page Up/Down, Home/End; Enter loads the selection).
+    Typing filters the list as you type (StorageManager.search: name words, bpm:N, beats:N);
+    Backspace edits and Escape clears the search. app.index is the selected position in the
+    list shown (the whole library, or the matches).
     """
+    ROWS = 11
+    ROW_HEIGHT = 50
+    _MAX_ROW_SURFACES = 64
+
     def __init__(self, screen, label_font, medium_font):
         super().__init__(screen, label_font, medium_font)
         # """Define UI Rectangles for the menu components."""
         self._exit_rect = pygame.Rect(WIDTH - 200, HEIGHT - 100, 180, 90)
         self._load_btn_rect = pygame.Rect(WIDTH // 2 - 100, int(HEIGHT * 0.87), 200, 100)
         self._delete_btn_rect = pygame.Rect(WIDTH // 2 - 400, int(HEIGHT * 0.87), 200, 100)
+        self._song_btn_rect = pygame.Rect(WIDTH // 2 + 200, int(HEIGHT * 0.87), 220, 100)
         self._entry_rect = pygame.Rect(190, 90, 1000, 600)
-        
+        self._prev_rect = pygame.Rect(1210, 90, 170, 90)
+        self._next_rect = pygame.Rect(1210, 600, 170, 90)
+        self._search_rect = pygame.Rect(700, 25, 490, 55)
+        self.offset = 0
+        self.query = ''
+        self._search = None
+        self._search_key = None
+        self._rows = []
+        self._count = 0
+        self._view_key = None
+        self._song_message = ''
+        # """(position, storage key, name) -> rendered row; bounded, least recently used first"""
+        self._row_surfaces = OrderedDict()
+
+    # -------------------------------------
+    # """Viewport"""
+    # -------------------------------------
+    def _source(self, storage):
+        """The list shown: the whole library, or the matches of the search box."""
+        if not self.query.strip():
+            return storage
+        key = (id(storage), storage.version, self.query)
+        if key != self._search_key:
+            self._search = storage.search(self.query)
+            self._search_key = key
+        return self._search
+
+    def _refresh(self, storage):
+        """Re-reads the visible rows only when the scroll position, the search or the library changed."""
+        key = (id(storage), storage.version, self.query, self.offset)
+        if key != self._view_key:
+            source = self._source(storage)
+            self._count = source.count()
+            self.offset = max(0, min(self.offset, self._count - self.ROWS))
+            self._rows = source.names(self.offset, self.ROWS)
+            self._view_key = (id(storage), storage.version, self.query, self.offset)
+
+    def scroll(self, rows, storage):
+        """Moves the list by rows (negative = up), clamped to the library."""
+        self._refresh(storage)
+        self.offset = max(0, min(self.offset + rows, self._count - self.ROWS))
+
+    def _select(self, index, app):
+        """Selects a list position and scrolls just enough to keep it visible."""
+        self._refresh(app.storage)
+        if self._count == 0:
+            return
+        index = max(0, min(index, self._count - 1))
+        app.index = index
+        if index < self.offset:
+            self.offset = index
+        elif index >= self.offset + self.ROWS:
+            self.offset = index - self.ROWS + 1
+
+    def _key_at(self, index, storage):
+        """Storage key of the beat at a list position (None if out of range)."""
+        self._refresh(storage)
+        if self.offset <= index < self.offset + len(self._rows):
+            return self._rows[index - self.offset][0]
+        rows = self._source(storage).names(index, 1)
+        return rows[0][0] if rows else None
+
+    def set_query(self, query, app):
+        """Filters the list; the first match is selected, so Enter loads it."""
+        self.query = query
+        self.offset = 0
+        self._refresh(app.storage)
+        app.index = 0 if self.query.strip() and self._count else -1
+
+    def type_text(self, text, app):
+        """Text typed while the menu is open goes to the search box."""
+        self.set_query(self.query + text, app)
+
+    def _row_surface(self, position, key, name):
+        memo_key = (position, key, name)
+        surface = self._row_surfaces.get(memo_key)
+        if surface is not None:
+            self._row_surfaces.move_to_end(memo_key)
+            return surface
+        surface = pygame.Surface((self._entry_rect.width - 20, self.ROW_HEIGHT), pygame.SRCALPHA)
+        # """row text is unique per beat: render it directly instead of filling the shared text cache"""
+        surface.blit(self.medium_font.render(f'{position + 1}', True, white), (0, 0))
+        surface.blit(self.medium_font.render(name, True, white), (70, 0))
+        self._row_surfaces[memo_key] = surface
+        if len(self._row_surfaces) > self._MAX_ROW_SURFACES:
+            self._row_surfaces.popitem(last=False)
+        return surface
 
-    def draw(self, app_index, saved_beats):
-        """Draws the load menu, listing saved beats and highlighting the selected one."""
+    # -------------------------------------
+    # """Draw Menu"""
+    # -------------------------------------
+    def draw(self, app_index, storage):
+        """Draws the load menu, listing the visible saved beats and highlighting the selected one."""
+        self._refresh(storage)
         pygame.draw.rect(self.screen, black, [0, 0, WIDTH, HEIGHT])
-        self.screen.blit(self.label_font.render('LOAD MENU: Select a beat to load in', True, white), (400, 40))
+        self.screen.blit(render_text(self.label_font, 'LOAD MENU: Select a beat to load in', True, white), (20, 40))
+
+        # """Search box (always active: typing filters the list)"""
+        pygame.draw.rect(self.screen, dark_gray, self._search_rect, 0, 5)
+        pygame.draw.rect(self.screen, gray, self._search_rect, 3, 5)
+        if self.query:
+            search_text = render_text(self.medium_font, self.query, True, white)
+        else:
+            search_text = render_text(self.medium_font, 'Type to search (name, bpm:120, beats:16)', True, light_gray)
+        self.screen.blit(search_text, (self._search_rect.x + 15, self._search_rect.y + 15),
+                         (0, 0, self._search_rect.width - 30, self._search_rect.height))
         
         # """Close button"""
         pygame.draw.rect(self.screen, gray, self._exit_rect, 0, 5)
-        self.screen.blit(self.label_font.render('Close', True, white), (self._exit_rect.x + 40, self._exit_rect.y + 30))
+        self.screen.blit(render_text(self.label_font, 'Close', True, white), (self._exit_rect.x + 40, self._exit_rect.y + 30))
         
         # """Load button"""
         pygame.draw.rect(self.screen, gray, self._load_btn_rect, 0, 5)
-        self.screen.blit(self.label_font.render('Load Beat', True, white), (self._load_btn_rect.x + 30, self._load_btn_rect.y + 30))
+        self.screen.blit(render_text(self.label_font, 'Load Beat', True, white), (self._load_btn_rect.x + 30, self._load_btn_rect.y + 30))
         
         # """Delete button"""
         pygame.draw.rect(self.screen, gray, self._delete_btn_rect, 0, 5)
-        self.screen.blit(self.label_font.render('Delete Beat', True, white), (self._delete_btn_rect.x + 15, self._delete_btn_rect.y + 30))
-        
+        self.screen.blit(render_text(self.label_font, 'Delete Beat', True, white), (self._delete_btn_rect.x + 15, self._delete_btn_rect.y + 30))
+
+        # """Add to Song button (the beat is read when the song gets to it)"""
+        pygame.draw.rect(self.screen, gray, self._song_btn_rect, 0, 5)
+        self.screen.blit(render_text(self.label_font, 'Add to Song', True, white), (self._song_btn_rect.x + 25, self._song_btn_rect.y + 30))
+        if self._song_message:
+            self.screen.blit(render_text(self.medium_font, self._song_message, True, gold), (20, self._song_btn_rect.y + 40))
+
+        # """Scroll buttons and position"""
+        pygame.draw.rect(self.screen, gray, self._prev_rect, 0, 5)
+        self.screen.blit(render_text(self.label_font, 'Up', True, white), (self._prev_rect.x + 60, self._prev_rect.y + 30))
+        pygame.draw.rect(self.screen, gray, self._next_rect, 0, 5)
+        self.screen.blit(render_text(self.label_font, 'Down', True, white), (self._next_rect.x + 45, self._next_rect.y + 30))
+        if self._count:
+            position = f'{self.offset + 1}-{self.offset + len(self._rows)} of {self._count}'
+            self.screen.blit(render_text(self.medium_font, position, True, white), (self._prev_rect.x, 380))
+        elif self.query.strip():
+            self.screen.blit(render_text(self.medium_font, 'No matches', True, white), (self._prev_rect.x, 380))
+
         # """Highlight selected beat"""
-        if 0 <= app_index < len(saved_beats):
-            pygame.draw.rect(self.screen, light_gray, (190, 100 + app_index * 50, 1000, 50))
-            
-        # """Draw the list of saved beats."""
-        for i, raw in enumerate(saved_beats):
-            if i < 20:  # """Limit to first 10 entries as per original logic."""
-                try:
-                    # """Attempt to parse the beat name from the structured string."""
-                    name_index_start = raw.index('name: ') + 6
-                    name_index_end = raw.index(', beats:')
-                    name_text = raw[name_index_start:name_index_end]
-                except Exception:
-                    name_text = raw
-                    
-                self.screen.blit(self.medium_font.render(f'{i + 1}', True, white), (200, 100 + i * 50))
-                self.screen.blit(self.medium_font.render(name_text, True, white), (240, 100 + i * 50))
+        row = app_index - self.offset
+        if 0 <= row < len(self._rows):
+            pygame.draw.rect(self.screen, light_gray, (190, 100 + row * self.ROW_HEIGHT, 1000, self.ROW_HEIGHT))
+
+        # """Draw only the rows in the viewport, from memoized surfaces."""
+        self.screen.blits([(self._row_surface(self.offset + i, key, name), (200, 100 + i * self.ROW_HEIGHT))
+                           for i, (key, name) in enumerate(self._rows)], False)
                 
         # """Draw the border around the list area."""
         pygame.draw.rect(self.screen, gray, self._entry_rect, 5, 5)
 
+    # -------------------------------------
+    # """Handle Input"""
+    # -------------------------------------
     def handle_click(self, pos, app):
-        """Handles mouse clicks for the Load Menu (Close, Select Entry, Delete, Load)."""
+        """Handles mouse clicks for the Load Menu (Close, Scroll, Select Entry, Delete, Load)."""
         if self._exit_rect.collidepoint(pos):
             app.load_menu = False
             app.playing = True
             app.typing = False
             return True
-            
+
+        if self._prev_rect.collidepoint(pos):
+            self.scroll(-self.ROWS, app.storage)
+            return True
+
+        if self._next_rect.collidepoint(pos):
+            self.scroll(self.ROWS, app.storage)
+            return True
+
         if self._entry_rect.collidepoint(pos):
-            # """Calculate the index based on click y-position."""
+            # """Calculate the row based on click y-position, then its position in the library."""
             y = pos[1] - 100
-            idx = y // 50
+            idx = y // self.ROW_HEIGHT
             # """Store the selected index if valid."""
-            if isinstance(idx, int) and 0 <= idx < len(app.saved_beats):
-                app.index = idx
+            self._refresh(app.storage)
+            if isinstance(idx, int) and 0 <= idx < len(self._rows):
+                app.index = self.offset + idx
             return True
             
         if self._delete_btn_rect.collidepoint(pos):
-            # """Delete the currently selected beat."""
-            if 0 <= app.index < len(app.saved_beats):
-                app.saved_beats.pop(app.index)
+            # """Delete the currently selected beat (written to disk in the background)."""
+            key = self._key_at(app.index, app.storage) if app.index >= 0 else None
+            if key is not None:
+                app.storage.delete(key)
             return True
             
         if self._load_btn_rect.collidepoint(pos):
-            if 0 <= app.index < len(app.saved_beats):
-                # """Attempt to parse and apply the selected beat data."""
-                loaded_tuple = self._parse_saved_line(app.saved_beats[app.index])
-                if loaded_tuple:
-                    new_beats, new_bpm, new_grid = loaded_tuple
-                    # """Apply data safely, preserving old values if parsing fails."""
-                    app.beats = new_beats or app.beats
-                    app.bpm = new_bpm or app.bpm
-                    if new_grid:
-                        app.clicked = new_grid
-                        
-                app.index = 100
-                app.save_menu = False
-                app.load_menu = False
-                app.playing = True
-                app.typing = False
+            self._load_selected(app)
+            return True
+
+        if self._song_btn_rect.collidepoint(pos):
+            # """Append the selected beat to the song (by key: the prefetcher decodes it in time)."""
+            key = self._key_at(app.index, app.storage) if app.index >= 0 else None
+            record = app.storage.get(key) if key is not None else None
+            if record is not None:
+                app.arrangement.add("beat", key, record.name)
+                self._song_message = f'Song: {len(app.arrangement)} entries'
             return True
             
         return False
 
-    def _parse_saved_line(self, raw_line):
+    def handle_key(self, key, app):
         """
-        Tries to extract beats (int), bpm (int), and the clicked grid (list of lists)
-        from the saved string format.
+        Keyboard navigation: arrows move the selection, Page Up/Down and Home/End jump,
+        Enter loads the selected beat, Backspace and Escape edit the search box.
+
+        :return: True if the key was used.
         """
-        try:
-            # """Find and parse integer values (beats and bpm)."""
-            name_index_end = raw_line.index(', beats:')
-            beats_index_end = raw_line.index(', bpm:')
-            bpm_index_end = raw_line.index(', selected:')
-            loaded_beats = int(raw_line[name_index_end + 8:beats_index_end])
-            loaded_bpm = int(raw_line[beats_index_end + 6:bpm_index_end])
-            
-            # """Extract and parse the 2D list string for the grid."""
-            loaded_clicks_string = raw_line[bpm_index_end + 14: -1]
-            rows = []
-            s = loaded_clicks_string.strip()
-            
-            # """Strip outer brackets if present."""
-            if s.startswith('[') and s.endswith(']'):
-                s = s[1:-1]
-                
-            # """Split the string into individual instrument rows."""
-            if '], [' in s:
-                row_strs = s.split('], [')
-            else:
-                row_strs = s.split('],')
-                
-            for r in row_strs:
-                r = r.strip().lstrip('[').rstrip(']').strip()
-                if not r:
-                    continue
-                # """Split row into individual step values and convert to int (1 or -1)."""
-                items = [it.strip() for it in r.split(',')]
-                row = []
-                for it in items:
-                    if it in ('1', '-1'):
-                        row.append(int(it))
-                if row:
-                    rows.append(row)
-                    
-            return loaded_beats, loaded_bpm, rows
-            
-        except Exception:
-            # """Return None if parsing fails due to bad file format."""
-            return None
+        current = app.index if app.index >= 0 else self.offset - 1
+        if key == pygame.K_DOWN:
+            self._select(current + 1, app)
+        elif key == pygame.K_UP:
+            self._select(current - 1, app)
+        elif key == pygame.K_PAGEDOWN:
+            self._select(current + self.ROWS, app)
+        elif key == pygame.K_PAGEUP:
+            self._select(current - self.ROWS, app)
+        elif key == pygame.K_HOME:
+            self._select(0, app)
+        elif key == pygame.K_END:
+            self._refresh(app.storage)
+            self._select(self._count - 1, app)
+        elif key in (pygame.K_RETURN, pygame.K_KP_ENTER):
+            self._load_selected(app)
+        elif key == pygame.K_BACKSPACE and self.query:
+            self.set_query(self.query[:-1], app)
+        elif key == pygame.K_ESCAPE and self.query:
+            self.set_query('', app)
+        else:
+            return False
+        return True
+
+    def _load_selected(self, app):
+        """Decodes the selected beat (the only full parse) and applies it to the app."""
+        key = self._key_at(app.index, app.storage) if app.index >= 0 else None
+        record = app.storage.get(key) if key is not None else None
+        if record is not None:
+            # """Apply the selected beat (records are schema-checked when decoded)."""
+            app.beats = record.beats
+            app.bpm = record.bpm
+            app.clicked = record.to_grid()
+
+            app.index = -1
+            app.save_menu = False
+            app.load_menu = False
+            app.playing = True
+            app.typing = False
 
 class PresetMenu(BaseMenu):
     """
@@ -302,11 +454,11 @@ class PresetMenu(BaseMenu):
     def draw(self):
         """Draws the preset menu, listing available presets as clickable buttons."""
         pygame.draw.rect(self.screen, black, [0, 0, WIDTH, HEIGHT])
-        self.screen.blit(self.label_font.render('PRESETS: Select a preset to launch', True, white), (400, 40))
+        self.screen.blit(render_text(self.label_font, 'PRESETS: Select a preset to launch', True, white), (400, 40))
         
         # """Close button"""
         pygame.draw.rect(self.screen, gray, self._exit_rect, 0, 5)
-        self.screen.blit(self.label_font.render('Close', True, white), (self._exit_rect.x + 40, self._exit_rect.y + 30))
+        self.screen.blit(render_text(self.label_font, 'Close', True, white), (self._exit_rect.x + 40, self._exit_rect.y + 30))
         
         # """Draw buttons for each preset."""
         self._preset_buttons = []
@@ -314,7 +466,7 @@ class PresetMenu(BaseMenu):
         for name in self._preset_manager.get_preset_names():
             btn_rect = pygame.Rect(350, y, 700, 60)
             pygame.draw.rect(self.screen, gray, btn_rect, 0, 5)
-            self.screen.blit(self.medium_font.render(name, True, white), (370, y + 15))
+            self.screen.blit(render_text(self.medium_font, name, True, white), (370, y + 15))
             self._preset_buttons.append((btn_rect, name))
             y += 90
 
@@ -360,4 +512,140 @@ class PresetMenu(BaseMenu):
                 app.playing = True
                 return True
                 
-        return False
\ No newline at end of file
+        return False
+class SongMenu(BaseMenu):
+    """
+    Edits and plays the song (Arrangement): saved beats (added from the Load menu with
+    'Add to Song') and presets (the buttons on the right) play top to bottom, each looping
+    its repeat count. +/- change the repeats, X removes an entry. While the song plays,
+    the entry and pass being heard are highlighted. Edits apply the next time Play Song is pressed.
+    """
+    ROWS = 11
+    ROW_HEIGHT = 50
+
+    def __init__(self, screen, label_font, medium_font, preset_manager):
+        super().__init__(screen, label_font, medium_font)
+        # """Define UI Rectangles for the menu components."""
+        self._exit_rect = pygame.Rect(WIDTH - 200, HEIGHT - 100, 180, 90)
+        self._play_rect = pygame.Rect(WIDTH // 2 - 500, int(HEIGHT * 0.87), 200, 100)
+        self._stop_rect = pygame.Rect(WIDTH // 2 - 250, int(HEIGHT * 0.87), 200, 100)
+        self._loop_rect = pygame.Rect(WIDTH // 2, int(HEIGHT * 0.87), 200, 100)
+        self._clear_rect = pygame.Rect(WIDTH // 2 + 250, int(HEIGHT * 0.87), 200, 100)
+        self._entry_rect = pygame.Rect(190, 90, 1000, 600)
+        self._preset_manager = preset_manager
+        self._preset_buttons = []  # """Stores a list of (rect, preset_name) tuples."""
+        self.offset = 0
+
+    def scroll(self, rows, arrangement):
+        """Moves the list by rows (negative = up), clamped to the song."""
+        self.offset = max(0, min(self.offset + rows, len(arrangement) - self.ROWS))
+
+    def _row_buttons(self, row):
+        """(minus, plus, remove) rectangles of a visible row."""
+        y = self._entry_rect.y + 10 + row * self.ROW_HEIGHT
+        return (pygame.Rect(1010, y, 40, 40), pygame.Rect(1060, y, 40, 40), pygame.Rect(1120, y, 40, 40))
+
+    # -------------------------------------
+    # """Draw Menu"""
+    # -------------------------------------
+    def draw(self, arrangement, song):
+        """
+        Draws the song list, the preset buttons and the transport.
+
+        :param song: PlaybackSnapshot.song: (entry index, pass, repeats) while the song plays, else None.
+        """
+        pygame.draw.rect(self.screen, black, [0, 0, WIDTH, HEIGHT])
+        self.screen.blit(render_text(self.label_font, 'SONG: patterns play top to bottom', True, white), (20, 40))
+        self.offset = max(0, min(self.offset, len(arrangement) - self.ROWS))
+
+        # """Entries in the viewport; the one playing is highlighted with its pass."""
+        for row, index in enumerate(range(self.offset, min(len(arrangement), self.offset + self.ROWS))):
+            entry = arrangement[index]
+            y = self._entry_rect.y + 10 + row * self.ROW_HEIGHT
+            color = white
+            if song is not None and song[0] == index:
+                pygame.draw.rect(self.screen, dark_gray, (self._entry_rect.x, y - 5, self._entry_rect.width, self.ROW_HEIGHT))
+                color = gold
+            label = f'{index + 1}   {entry.name}' + ('  (preset)' if entry.source == "preset" else '')
+            self.screen.blit(render_text(self.medium_font, label, True, color), (200, y + 5), (0, 0, 640, 40))
+            if song is not None and song[0] == index:
+                repeats = f'{song[1] + 1}/{entry.repeats}'
+            else:
+                repeats = f'x {entry.repeats}'
+            self.screen.blit(render_text(self.medium_font, repeats, True, color), (880, y + 5))
+            minus_rect, plus_rect, remove_rect = self._row_buttons(row)
+            for rect, text in ((minus_rect, '-'), (plus_rect, '+'), (remove_rect, 'X')):
+                pygame.draw.rect(self.screen, gray, rect, 0, 5)
+                self.screen.blit(render_text(self.medium_font, text, True, white), (rect.x + 13, rect.y + 8))
+        if not len(arrangement):
+            hint = 'Empty: add saved beats with "Add to Song" in the Load menu, or presets on the right'
+            self.screen.blit(render_text(self.medium_font, hint, True, light_gray), (200, 110))
+        pygame.draw.rect(self.screen, gray, self._entry_rect, 5, 5)
+
+        # """Preset buttons (append the preset to the song)."""
+        self._preset_buttons = []
+        y = self._entry_rect.y
+        for name in self._preset_manager.get_preset_names():
+            btn_rect = pygame.Rect(1210, y, 180, 50)
+            pygame.draw.rect(self.screen, gray, btn_rect, 0, 5)
+            self.screen.blit(render_text(self.medium_font, f'+ {name}', True, white), (1220, y + 12), (0, 0, 165, 30))
+            self._preset_buttons.append((btn_rect, name))
+            y += 60
+
+        # """Transport, loop toggle, clear and close buttons"""
+        for rect, text in ((self._play_rect, 'Play Song'), (self._stop_rect, 'Stop Song'),
+                           (self._loop_rect, 'Loop: On' if arrangement.loop else 'Loop: Off'),
+                           (self._clear_rect, 'Clear'), (self._exit_rect, 'Close')):
+            pygame.draw.rect(self.screen, gray, rect, 0, 5)
+            self.screen.blit(render_text(self.label_font, text, True, white), (rect.x + 25, rect.y + 30))
+
+    # -------------------------------------
+    # """Handle Input"""
+    # -------------------------------------
+    def handle_click(self, pos, app):
+        """Handles mouse clicks for the Song Menu (entries, presets, transport, Close)."""
+        arrangement = app.arrangement
+        if self._exit_rect.collidepoint(pos):
+            app.song_menu = False
+            return True
+
+        if self._play_rect.collidepoint(pos):
+            if len(arrangement):
+                app.engine.play_arrangement(arrangement)
+                app.playing = True
+                app.song_menu = False
+            return True
+
+        if self._stop_rect.collidepoint(pos):
+            app.engine.stop_arrangement()
+            return True
+
+        if self._loop_rect.collidepoint(pos):
+            arrangement.loop = not arrangement.loop
+            return True
+
+        if self._clear_rect.collidepoint(pos):
+            arrangement.clear()
+            self.offset = 0
+            return True
+
+        for btn_rect, name in self._preset_buttons:
+            if btn_rect.collidepoint(pos):
+                arrangement.add("preset", name)
+                self.scroll(len(arrangement), arrangement)
+                return True
+
+        for row in range(min(self.ROWS, len(arrangement) - self.offset)):
+            index = self.offset + row
+            minus_rect, plus_rect, remove_rect = self._row_buttons(row)
+            if minus_rect.collidepoint(pos):
+                arrangement.set_repeats(index, arrangement[index].repeats - 1)
+                return True
+            if plus_rect.collidepoint(pos):
+                arrangement.set_repeats(index, arrangement[index].repeats + 1)
+                return True
+            if remove_rect.collidepoint(pos):
+                arrangement.remove(index)
+                self.scroll(0, arrangement)
+                return True
+        return False
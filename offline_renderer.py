@@ -0,0 +1,178 @@
+# -----------------------------------------------------------------------------
+# """OfflineRenderer: bounce a pattern to a WAV file without a display or audio device"""
+# -----------------------------------------------------------------------------
+import argparse
+import time
+
+import numpy as np
+
+from audio_samples import DEFAULT_SAMPLE_PATHS, load_samples, write_wav
+from pattern_grid import PatternGrid
+
+
+class OfflineRenderer:
+    """
+    Mixes the drum samples into a sample-accurate NumPy buffer following a sequencer grid.
+    Step n of the render starts at round(n * sample_rate * 60 / bpm), computed from the
+    start of the render, so long bounces never drift. Nothing here touches pygame.
+    """
+
+    def __init__(self, sample_paths=None, sample_rate=44100, channels=2, gain=1.0, gains=None):
+        """
+        Decodes the sample set once so it can be reused for many renders.
+
+        :param sample_paths: List of WAV paths in instrument order (defaults to the built-in kit).
+        :param sample_rate: Output sample rate in Hz.
+        :param channels: Output channel count (1 or 2).
+        :param gain: Linear gain applied to the mix before clipping.
+        :param gains: Optional per-sample volume (e.g. TrackList.gains), applied once to the decoded buffers.
+        """
+        if sample_paths is None:
+            sample_paths = DEFAULT_SAMPLE_PATHS
+        if not isinstance(sample_paths, (list, tuple)):
+            raise TypeError("sample_paths must be a list or tuple of file paths.")
+        self.sample_rate = int(sample_rate)
+        self.channels = int(channels)
+        self.gain = float(gain)
+        self._samples = load_samples(list(sample_paths), self.sample_rate, self.channels)
+        if gains is not None:
+            self._samples = [b * g if g != 1.0 else b for b, g in zip(self._samples, gains)] \
+                + self._samples[len(gains):]
+
+    @classmethod
+    def from_buffers(cls, buffers, sample_rate=44100, gain=1.0):
+        """Builds a renderer around already-decoded float32 (frames, channels) buffers."""
+        renderer = cls.__new__(cls)
+        renderer.sample_rate = int(sample_rate)
+        renderer.channels = buffers[0].shape[1] if buffers else 2
+        renderer.gain = float(gain)
+        renderer._samples = list(buffers)
+        return renderer
+
+    @property
+    def samples(self):
+        return self._samples
+
+    def step_offsets(self, bpm, beats, loops=1):
+        """Sample offset of every step of every loop (length loops * beats)."""
+        step_samples = self.sample_rate * 60.0 / max(1, int(bpm))
+        n = np.arange(int(loops) * int(beats), dtype=np.float64)
+        return np.rint(n * step_samples).astype(np.int64)
+
+    def render(self, grid, bpm, beats, active_list=None, loops=1, tail=True):
+        """
+        Renders the pattern into a float32 buffer of shape (frames, channels).
+
+        :param grid: A PatternGrid or an instruments x beats list of lists (1 = on, -1 = off).
+        :param bpm: Tempo in steps per minute.
+        :param beats: Number of steps in one loop.
+        :param active_list: Per-instrument mute state (1 = active, -1 = muted); None = all active.
+        :param loops: How many times the loop is repeated.
+        :param tail: Keep the decay of hits that ring past the end of the last loop.
+        """
+        beats = max(1, int(beats))
+        loops = max(1, int(loops))
+        offsets = self.step_offsets(bpm, beats, loops)
+        loop_end = int(round(loops * beats * self.sample_rate * 60.0 / max(1, int(bpm))))
+
+        if not isinstance(grid, PatternGrid):
+            grid = PatternGrid.from_lists(grid, beats=beats)
+
+        # """Collect the hit offsets of each instrument (all loops) before allocating the buffer."""
+        hits = []
+        longest = 0
+        for i in range(min(grid.instruments, len(self._samples))):
+            if active_list is not None and i < len(active_list) and active_list[i] != 1:
+                continue
+            sample = self._samples[i]
+            if len(sample) == 0:
+                continue
+            steps = np.flatnonzero(grid.row_array(i)[:beats])
+            if steps.size == 0:
+                continue
+            positions = offsets[(steps[None, :] + np.arange(loops)[:, None] * beats).ravel()]
+            hits.append((sample, positions))
+            longest = max(longest, len(sample))
+
+        frames = loop_end + (longest if tail else 0)
+        out = np.zeros((max(frames, 1), self.channels), dtype=np.float32)
+        for sample, positions in hits:
+            length = len(sample)
+            for pos in positions.tolist():
+                end = min(pos + length, frames)
+                if end > pos:
+                    out[pos:end] += sample[:end - pos]
+        if not tail:
+            out = out[:loop_end]
+        if self.gain != 1.0:
+            out *= self.gain
+        return out
+
+    def render_sequencer(self, sequencer, loops=1, tail=True):
+        """Renders the current state of a Sequencer (grid, bpm, beats, active_list)."""
+        return self.render(sequencer.grid, sequencer.bpm, sequencer.beats,
+                           sequencer.active_list, loops, tail)
+
+    def bounce(self, path, grid, bpm, beats, active_list=None, loops=1, tail=True):
+        """
+        Renders the pattern and writes it to a 16-bit WAV file.
+
+        :return: A dict with audio_seconds, render_seconds and realtime_factor.
+        """
+        start = time.perf_counter()
+        buffer = self.render(grid, bpm, beats, active_list, loops, tail)
+        write_wav(path, buffer, self.sample_rate)
+        elapsed = time.perf_counter() - start
+        audio_seconds = len(buffer) / float(self.sample_rate)
+        return {
+            "audio_seconds": audio_seconds,
+            "render_seconds": elapsed,
+            "realtime_factor": audio_seconds / elapsed if elapsed > 0 else float('inf'),
+        }
+
+
+# -----------------------------------------------------------------------------
+# """Command line: python offline_renderer.py out.wav --name "generic rock beat" --loops 4"""
+# -----------------------------------------------------------------------------
+def main(argv=None):
+    from storage_manager import StorageManager
+    from track_list import TrackList
+
+    parser = argparse.ArgumentParser(description="Bounce a saved PyDrums beat to a WAV file.")
+    parser.add_argument("output", help="Path of the WAV file to write.")
+    parser.add_argument("--name", help="Name of the saved beat (default: the first saved beat).")
+    parser.add_argument("--index", type=int, help="Zero-based index of the saved beat.")
+    parser.add_argument("--loops", type=int, default=4, help="Number of loop repetitions.")
+    parser.add_argument("--no-tail", action="store_true", help="Cut ringing hits at the loop end.")
+    parser.add_argument("--rate", type=int, default=44100, help="Output sample rate.")
+    parser.add_argument("--kit", help="Kit file (JSON list of tracks) instead of the built-in kit.")
+    parser.add_argument("--samples", nargs="+", help="Sample files in instrument order (overrides the kit's).")
+    parser.add_argument("--library", default="saved_beats.txt", help="Saved beats file.")
+    args = parser.parse_args(argv)
+
+    try:
+        tracks = TrackList.from_file(args.kit) if args.kit else TrackList()
+    except (OSError, ValueError) as exc:
+        parser.error(f"cannot read kit {args.kit}: {exc}")
+
+    records = StorageManager(args.library).load_records()
+    if args.name is not None:
+        matches = [record for record in records if record.name == args.name]
+        if not matches:
+            parser.error(f"no saved beat named {args.name!r}")
+        record = matches[0]
+    else:
+        index = args.index or 0
+        if not 0 <= index < len(records):
+            parser.error(f"no saved beat at index {index}")
+        record = records[index]
+    beats, bpm, grid = record.beats, record.bpm, record.to_grid()
+
+    renderer = OfflineRenderer(args.samples or tracks.samples, sample_rate=args.rate, gains=tracks.gains)
+    stats = renderer.bounce(args.output, grid, bpm, beats, loops=args.loops, tail=not args.no_tail)
+    print(f"Wrote {args.output}: {stats['audio_seconds']:.2f}s of audio in "
+          f"{stats['render_seconds'] * 1000:.1f} ms ({stats['realtime_factor']:.0f}x real time)")
+
+
+if __name__ == "__main__":
+    main()
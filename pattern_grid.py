@@ -0,0 +1,218 @@
+# -----------------------------------------------------------------------------
+# """PatternGrid: bit-packed instruments x steps grid (one integer bitmask per step)"""
+# -----------------------------------------------------------------------------
+from functools import lru_cache
+
+import numpy as np
+
+MAX_INSTRUMENTS = 64
+
+
+@lru_cache(maxsize=4096)
+def mask_bits(mask):
+    """Returns the instrument indices set in a bitmask as a tuple (memoized)."""
+    bits = []
+    i = 0
+    while mask:
+        if mask & 1:
+            bits.append(i)
+        mask >>= 1
+        i += 1
+    return tuple(bits)
+
+
+class _GridRow:
+    """
+    A live view of one instrument row that behaves like the old list of 1 / -1 values,
+    so code such as grid[instr][step] *= -1 keeps working.
+    """
+    __slots__ = ("_grid", "_index")
+
+    def __init__(self, grid, index):
+        self._grid = grid
+        self._index = index
+
+    def __len__(self):
+        return self._grid.beats
+
+    def __getitem__(self, step):
+        if isinstance(step, slice):
+            return [1 if v else -1 for v in self._grid.row_array(self._index)[step].tolist()]
+        return 1 if self._grid.get(self._index, step) else -1
+
+    def __setitem__(self, step, value):
+        self._grid.set(self._index, step, value == 1)
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return repr(self[:])
+
+
+class PatternGrid:
+    """
+    Stores the pattern as a NumPy uint64 array with one bitmask per step, where bit i is
+    instrument i. "Which instruments fire on step k" is a single array read, and resize,
+    clear, shift and rotate are vectorized operations on the mask array. A pattern costs
+    8 bytes per step for up to 64 instruments.
+
+    Indexing (grid[instr][step], len(grid), iterating rows) mimics the previous list of
+    lists of 1 / -1 values so menus, saving and drawing keep working unchanged.
+    """
+
+    def __init__(self, instruments, beats, masks=None):
+        """
+        :param instruments: Number of instrument rows (1..64).
+        :param beats: Number of steps (>= 1).
+        :param masks: Optional sequence of per-step bitmasks to start from.
+        :raises ValueError: If instruments is outside 1..64.
+        """
+        instruments = int(instruments)
+        if not 1 <= instruments <= MAX_INSTRUMENTS:
+            raise ValueError(f"instruments must be between 1 and {MAX_INSTRUMENTS}")
+        self.instruments = instruments
+        beats = max(1, int(beats))
+        self._masks = np.zeros(beats, dtype=np.uint64)
+        if masks is not None:
+            # """an array (e.g. copy()) is converted in one go instead of through a list of scalars"""
+            values = np.asarray(masks if isinstance(masks, np.ndarray) else list(masks), dtype=np.uint64)[:beats]
+            self._masks[:len(values)] = values & np.uint64(self.full_mask)
+
+    @classmethod
+    def from_lists(cls, rows, instruments=None, beats=None):
+        """
+        Builds a grid from a list of lists of 1 / -1 values.
+
+        :param rows: The instrument rows.
+        :param instruments: Number of rows to keep (missing rows are empty); defaults to len(rows).
+        :param beats: Number of steps (rows are padded or cut); defaults to the longest row.
+        """
+        rows = list(rows)
+        if instruments is None:
+            instruments = max(1, len(rows))
+        if beats is None:
+            beats = max([len(r) for r in rows] + [1])
+        grid = cls(instruments, beats)
+        masks = grid._masks
+        for i, row in enumerate(rows[:instruments]):
+            on = np.asarray(list(row)[:beats]) == 1
+            masks[:len(on)] |= on.astype(np.uint64) << np.uint64(i)
+        return grid
+
+    def to_lists(self):
+        """Returns the pattern as a list of lists of 1 / -1 values (for saving and menus)."""
+        on = self.as_bool_array()
+        return np.where(on, 1, -1).tolist()
+
+    def copy(self):
+        return PatternGrid(self.instruments, self.beats, self._masks)
+
+    # ---------------------------
+    # """Queries"""
+    # ---------------------------
+    @property
+    def beats(self):
+        return len(self._masks)
+
+    @property
+    def masks(self):
+        """The per-step bitmask array (treat as read-only)."""
+        return self._masks
+
+    @property
+    def full_mask(self):
+        return (1 << self.instruments) - 1
+
+    @property
+    def nbytes(self):
+        return self._masks.nbytes
+
+    def step_mask(self, step):
+        """Bitmask of the instruments that are on at step (O(1))."""
+        return int(self._masks[step])
+
+    def instruments_on(self, step, active_mask=None):
+        """Tuple of instrument indices that fire on step, optionally filtered by an active mask."""
+        mask = int(self._masks[step])
+        if active_mask is not None:
+            mask &= active_mask
+        return mask_bits(mask)
+
+    def get(self, instrument, step):
+        return bool((int(self._masks[step]) >> instrument) & 1)
+
+    def row_array(self, instrument):
+        """Boolean array of one instrument row."""
+        return ((self._masks >> np.uint64(instrument)) & np.uint64(1)).astype(bool)
+
+    def as_bool_array(self):
+        """Boolean array of shape (instruments, beats)."""
+        shifts = np.arange(self.instruments, dtype=np.uint64)[:, None]
+        return ((self._masks[None, :] >> shifts) & np.uint64(1)).astype(bool)
+
+    # ---------------------------
+    # """Mutation"""
+    # ---------------------------
+    def set(self, instrument, step, on):
+        if not 0 <= instrument < self.instruments:
+            raise IndexError("instrument index out of range")
+        bit = np.uint64(1 << instrument)
+        if on:
+            self._masks[step] |= bit
+        else:
+            self._masks[step] &= ~bit
+
+    def toggle(self, instrument, step):
+        if not 0 <= instrument < self.instruments:
+            raise IndexError("instrument index out of range")
+        self._masks[step] ^= np.uint64(1 << instrument)
+
+    def resize(self, beats):
+        """Keeps existing steps, pads new ones with silence or cuts the end."""
+        beats = max(1, int(beats))
+        current = len(self._masks)
+        if beats > current:
+            self._masks = np.concatenate([self._masks, np.zeros(beats - current, dtype=np.uint64)])
+        elif beats < current:
+            self._masks = self._masks[:beats].copy()
+
+    def clear(self):
+        self._masks.fill(0)
+
+    def rotate(self, steps):
+        """Rotates the whole pattern right by steps (negative = left); steps wrap around."""
+        self._masks = np.roll(self._masks, int(steps))
+
+    def shift(self, steps):
+        """Shifts the pattern right by steps (negative = left); steps shifted out are lost."""
+        steps = int(steps)
+        if steps == 0:
+            return
+        shifted = np.zeros_like(self._masks)
+        if abs(steps) < len(self._masks):
+            if steps > 0:
+                shifted[steps:] = self._masks[:-steps]
+            else:
+                shifted[:steps] = self._masks[-steps:]
+        self._masks = shifted
+
+    # ---------------------------
+    # """List-of-lists compatibility"""
+    # ---------------------------
+    def __len__(self):
+        return self.instruments
+
+    def __getitem__(self, instrument):
+        if not -self.instruments <= instrument < self.instruments:
+            raise IndexError("instrument index out of range")
+        return _GridRow(self, instrument % self.instruments)
+
+    def __iter__(self):
+        return (_GridRow(self, i) for i in range(self.instruments))
+
+    def __repr__(self):
+        return repr(self.to_lists())
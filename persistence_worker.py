@@ -0,0 +1,171 @@
+# -----------------------------------------------------------------------------
+# """PersistenceWorker: debounced background saving and atomic file writes"""
+# -----------------------------------------------------------------------------
+import os
+import threading
+import time
+
+# """always: fsync every write (and the folder after a rename); rename: only before an atomic
+# rename, so a crash can lose the last saves but never the library; never: leave it to the OS"""
+FSYNC_POLICIES = ("always", "rename", "never")
+# """lines per write() call; the worker yields the GIL between chunks, so the playback thread never waits on it"""
+_CHUNK_LINES = 1000
+
+
+def _write_lines(f, lines):
+    for start in range(0, len(lines), _CHUNK_LINES):
+        f.write('\n'.join(lines[start:start + _CHUNK_LINES]) + '\n')
+        time.sleep(0)
+
+
+def _fsync_folder(path):
+    # """makes the rename itself durable; folders cannot be opened like this on Windows"""
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def atomic_write_lines(path, lines, fsync="always"):
+    """
+    Replaces path with lines (one per line) without ever leaving a half written file:
+    the data goes to path + ".tmp" first, which is then renamed over path (os.replace is
+    atomic), so after a crash the file holds either the old or the new contents.
+
+    :param fsync: One of FSYNC_POLICIES.
+    :raises OSError: If the file cannot be written (path is left untouched).
+    """
+    temp = path + ".tmp"
+    try:
+        with open(temp, 'w', encoding='utf-8') as f:
+            _write_lines(f, lines)
+            if fsync != "never":
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(temp, path)
+    except OSError:
+        try:
+            os.remove(temp)
+        except OSError:
+            pass
+        raise
+    if fsync == "always":
+        _fsync_folder(path)
+
+
+def append_lines(path, lines, fsync="always"):
+    """
+    Appends lines in one write. A crash can only cut off the last line, which the reader
+    skips; everything before it is untouched.
+
+    :raises OSError: If the file cannot be written.
+    """
+    with open(path, 'a', encoding='utf-8') as f:
+        _write_lines(f, lines)
+        if fsync == "always":
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class PersistenceWorker:
+    """
+    Calls flush() on a background thread once changes settle, so saving never blocks
+    the UI thread.
+
+    mark_dirty() only records that something changed. The worker waits until no change
+    has come in for debounce seconds (but never longer than max_delay after the first
+    unsaved change) and then calls flush() once for the whole batch. The thread is started
+    by the first change; stop() saves whatever is still pending.
+    """
+
+    def __init__(self, flush, debounce=0.25, max_delay=2.0, clock=time.monotonic, name="PyDrumsPersistence"):
+        """
+        :param flush: Callable that writes every pending change (runs on the worker thread).
+        :param debounce: Quiet time in seconds before a batch is written.
+        :param max_delay: Longest time in seconds a change may wait while changes keep coming.
+        :param clock: Monotonic clock in seconds.
+        """
+        self._flush = flush
+        self.debounce = float(debounce)
+        self.max_delay = float(max_delay)
+        self._clock = clock
+        self._name = name
+        self._cond = threading.Condition()
+        self._first_change = None
+        self._last_change = None
+        self._force = False
+        self._busy = False
+        self._running = False
+        self._thread = None
+        self.flushes = 0
+
+    @property
+    def pending(self):
+        """True while changes are waiting to be written (or being written)."""
+        return self._first_change is not None or self._busy
+
+    def mark_dirty(self):
+        """Schedules a flush (cheap; safe to call from any thread)."""
+        with self._cond:
+            now = self._clock()
+            if self._first_change is None:
+                self._first_change = now
+            self._last_change = now
+            if self._thread is None:
+                self._running = True
+                self._thread = threading.Thread(target=self._run, name=self._name, daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """
+        Writes pending changes now and waits for them to be on disk.
+
+        :return: True if nothing is pending any more.
+        """
+        with self._cond:
+            if self._thread is None:
+                return not self.pending
+            self._force = True
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: not self.pending, timeout)
+
+    def stop(self, timeout=None):
+        """Writes pending changes and ends the thread."""
+        with self._cond:
+            thread, self._thread = self._thread, None
+            self._running = False
+            self._cond.notify_all()
+        if thread is not None:
+            thread.join(timeout)
+
+    def _run(self):
+        with self._cond:
+            while True:
+                if self._first_change is None:
+                    self._force = False
+                    if not self._running:
+                        return
+                    self._cond.wait()
+                    continue
+                if self._running and not self._force:
+                    due = min(self._last_change + self.debounce, self._first_change + self.max_delay)
+                    wait = due - self._clock()
+                    if wait > 0:
+                        self._cond.wait(wait)
+                        continue
+                self._first_change = self._last_change = None
+                self._busy = True
+                self._cond.release()
+                try:
+                    self._flush()
+                except Exception as exc:
+                    print("Warning: background save failed:", exc)
+                finally:
+                    self._cond.acquire()
+                    self._busy = False
+                    self.flushes += 1
+                    self._cond.notify_all()
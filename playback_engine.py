@@ -0,0 +1,408 @@
+# -----------------------------------------------------------------------------
+# """PlaybackEngine: runs the Sequencer and note triggering on its own thread"""
+# -----------------------------------------------------------------------------
+import queue
+import threading
+import time
+
+from pattern_grid import PatternGrid
+
+
+class PlaybackSnapshot:
+    """
+    Immutable view of the sequencer state published by the engine for the UI.
+    The grid is a private PatternGrid copy, so drawing never races with edits.
+    """
+    __slots__ = ("version", "grid", "beats", "bpm", "active_list", "active_beat", "playing", "song",
+                 "swing", "timing")
+
+    def __init__(self, version, grid, beats, bpm, active_list, active_beat, playing, song=None,
+                 swing=50, timing=({}, {})):
+        """
+        :param song: (entry index, pass, repeats) while an arrangement plays, else None.
+        :param swing: Swing in percent (see Timeline).
+        :param timing: (step offsets, note nudges) copies, see Timeline.timing().
+        """
+        self.version = version
+        self.grid = grid
+        self.beats = beats
+        self.bpm = bpm
+        self.active_list = active_list
+        self.active_beat = active_beat
+        self.playing = playing
+        self.song = song
+        self.swing = swing
+        self.timing = timing
+
+
+class PlaybackEngine:
+    """
+    Owns the Sequencer and fires notes from a dedicated thread, so slow frames, menu
+    drawing or file I/O on the UI thread never delay a step.
+
+    The UI never touches the Sequencer directly: edits (cell toggles, bpm, beats, mutes,
+    loads, transport) are posted as messages on a SimpleQueue, and the engine publishes
+    a fresh PlaybackSnapshot after applying them or moving the playhead. Reading
+    engine.snapshot is a single attribute load, so neither side takes a lock.
+
+    With threaded=False nothing is started and the owner calls pump() itself (headless
+    tools, benchmarks, or platforms where audio threads are unwanted).
+
+    Notes are fired per timeline event (see Timeline): a step whose notes were nudged apart
+    is triggered once per distinct time, each time with the mask of the notes due then.
+
+    Song mode: play_arrangement() hands over an Arrangement. Every entry is prepared by the
+    PatternPrefetcher while the one before it plays; when the due step 0 of the last repeat
+    pops, the prepared pattern is swapped in and its loop starts at that step's grid time
+    (the old step 0 is not played). If a pattern is not ready by then, the current one loops once
+    more instead of stalling (counted in late_switches).
+    """
+
+    def __init__(self, sequencer, trigger, step_mix=None, threaded=True,
+                 idle_wait=0.002, spin_window=0.0005, prefetcher=None):
+        """
+        :param sequencer: The Sequencer to drive (owned by the engine from now on).
+        :param trigger: Callable trigger(step, target_time, mask) that plays the notes of mask
+        (instruments, before mutes) for step.
+        :param step_mix: Optional StepMixCache kept in sync with grid edits.
+        :param threaded: Run on a background thread (True) or only via pump() (False).
+        :param idle_wait: Longest sleep between command checks, in seconds.
+        :param spin_window: Final stretch before a step that is busy-waited instead of slept,
+        for sub-millisecond trigger accuracy.
+        :param prefetcher: PatternPrefetcher that prepares song entries (needed for song mode).
+        """
+        self.sequencer = sequencer
+        self._trigger = trigger
+        self.step_mix = step_mix
+        self.threaded = bool(threaded)
+        self.idle_wait = float(idle_wait)
+        self.spin_window = float(spin_window)
+        self._commands = queue.SimpleQueue()
+        self._playing = True
+        self._version = 0
+        self._grid_copy = sequencer.grid.copy()
+        self._timing = sequencer.timeline.timing()
+        self._thread = None
+        self._running = False
+        # """song mode (engine thread only)"""
+        self.prefetcher = prefetcher
+        self._song = None
+        self._song_index = 0
+        self._song_pass = 0
+        self._song_start = None
+        self._next = None
+        self._prefetch_wanted = False
+        self.switches = 0
+        self.late_switches = 0
+        self.snapshot = None
+        self._publish()
+
+    # ---------------------------
+    # """Thread lifecycle"""
+    # ---------------------------
+    def start(self):
+        """Starts the engine thread (no-op when threaded=False or already running)."""
+        if not self.threaded or self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="PyDrumsPlayback", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=1.0):
+        """Stops the engine thread and silences the scheduler."""
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.sequencer.stop()
+        if self.prefetcher is not None:
+            self.prefetcher.shutdown()
+
+    def _run(self):
+        clock = self.sequencer.scheduler.now
+        while self._running:
+            self.pump()
+            wait = self.sequencer.scheduler.time_until_next()
+            if wait is None or wait > self.idle_wait:
+                time.sleep(self.idle_wait)
+            elif wait > self.spin_window:
+                time.sleep(wait - self.spin_window)
+            else:
+                # """busy-wait the last fraction of a millisecond before the step"""
+                deadline = clock() + wait
+                while clock() < deadline:
+                    pass
+
+    # ---------------------------
+    # """Work loop (called by the thread, or by the owner when not threaded)"""
+    # ---------------------------
+    def pump(self, now=None):
+        """Applies queued commands, fires every due step and republishes the snapshot if needed."""
+        changed = self._drain_commands()
+        seq = self.sequencer
+        if self._song_start is not None and self._song_start.done():
+            self._start_song(self._song_start.result(), now)
+            changed = True
+        if self._playing:
+            due = seq.pop_due_steps(now)
+            while due:
+                switched = False
+                for scheduled in due:
+                    if scheduled.marker and scheduled.step == 0 and self._song is not None \
+                            and self._song_bar_line(scheduled.grid_time):
+                        switched = changed = True
+                        break
+                    try:
+                        self._trigger(scheduled.step, scheduled.target_time, scheduled.mask)
+                    except Exception as exc:
+                        print("Warning: step trigger failed:", exc)
+                # """after a switch the rest of due was timed for the old pattern: ask again"""
+                due = seq.pop_due_steps(now) if switched else None
+            if seq.active_beat != self.snapshot.active_beat:
+                changed = True
+        else:
+            seq.stop()
+        if self._prefetch_wanted:
+            # """only now that the bar line has sounded, so the worker does not compete with it"""
+            self._request_next()
+        if changed:
+            self._publish()
+
+    def _drain_commands(self):
+        changed = False
+        while True:
+            try:
+                name, args = self._commands.get_nowait()
+            except queue.Empty:
+                return changed
+            try:
+                getattr(self, "_cmd_" + name)(*args)
+            except Exception as exc:
+                print(f"Warning: playback command {name} failed -> {exc}")
+            changed = True
+
+    def _publish(self):
+        seq = self.sequencer
+        self._version += 1
+        song = None
+        if self._song is not None and self._song_start is None:
+            song = (self._song_index, max(0, self._song_pass), self._song[self._song_index].repeats)
+        self.snapshot = PlaybackSnapshot(self._version, self._grid_copy, seq.beats, seq.bpm,
+                                         list(seq.active_list), seq.active_beat, self._playing, song,
+                                         seq.timeline.swing, self._timing)
+
+    def _grid_changed(self, rebuild_mix=True):
+        seq = self.sequencer
+        self._grid_copy = seq.grid.copy()
+        self._timing = seq.timeline.timing()
+        if rebuild_mix and self.step_mix is not None:
+            self.step_mix.rebuild(seq.grid, seq.active_list, seq.beats)
+
+    # ---------------------------
+    # """Messages from the UI (safe to call from any thread)"""
+    # ---------------------------
+    def _post(self, name, *args):
+        self._commands.put((name, args))
+
+    def toggle_cell(self, instrument_index, step):
+        self._post("toggle_cell", instrument_index, step)
+
+    def toggle_mute(self, instrument_index):
+        self._post("toggle_mute", instrument_index)
+
+    def set_active_list(self, active_list):
+        self._post("set_active_list", list(active_list))
+
+    def set_bpm(self, bpm):
+        self._post("set_bpm", bpm)
+
+    def set_beats(self, beats):
+        self._post("set_beats", beats)
+
+    def clear(self):
+        self._post("clear")
+
+    def set_swing(self, swing):
+        self._post("set_swing", swing)
+
+    def set_step_offset(self, step, ticks):
+        self._post("set_step_offset", step, ticks)
+
+    def set_nudge(self, instrument_index, step, ticks):
+        self._post("set_nudge", instrument_index, step, ticks)
+
+    def load_pattern(self, beats, bpm, grid):
+        """Replaces beats, bpm and grid (list of lists or PatternGrid) in one message."""
+        if isinstance(grid, PatternGrid):
+            grid = grid.copy()
+        self._post("load_pattern", beats, bpm, grid)
+
+    def set_playing(self, playing):
+        self._post("set_playing", bool(playing))
+
+    def restart(self):
+        """Rewinds to the first step (or the start of the song) and plays."""
+        self._post("restart")
+
+    def play_arrangement(self, arrangement):
+        """Plays a song from its first entry (a copy is taken, so the list can be edited meanwhile)."""
+        self._post("play_arrangement", arrangement.copy())
+
+    def stop_arrangement(self):
+        """Leaves song mode; the current pattern keeps looping."""
+        self._post("stop_arrangement")
+
+    # ---------------------------
+    # """Command handlers (engine thread only)"""
+    # ---------------------------
+    def _cmd_toggle_cell(self, instrument_index, step):
+        seq = self.sequencer
+        seq.toggle_cell(instrument_index, step)
+        self._grid_changed(rebuild_mix=False)
+        if self.step_mix is not None:
+            self.step_mix.update_cell(seq.grid, instrument_index, step)
+
+    def _cmd_toggle_mute(self, instrument_index):
+        seq = self.sequencer
+        seq.toggle_instrument_active(instrument_index)
+        if self.step_mix is not None:
+            self.step_mix.update_track(seq.active_list, instrument_index)
+
+    def _cmd_set_active_list(self, active_list):
+        seq = self.sequencer
+        seq.active_list = active_list
+        if self.step_mix is not None:
+            self.step_mix.rebuild(seq.grid, seq.active_list, seq.beats)
+
+    def _cmd_set_bpm(self, bpm):
+        self.sequencer.set_bpm(bpm)
+
+    def _cmd_set_beats(self, beats):
+        self.sequencer.set_beats(beats)
+        self._grid_changed()
+
+    def _cmd_clear(self):
+        self.sequencer.clear_grid()
+        self._grid_changed()
+
+    def _cmd_set_swing(self, swing):
+        self.sequencer.set_swing(swing)
+
+    def _cmd_set_step_offset(self, step, ticks):
+        seq = self.sequencer
+        seq.set_step_offset(step, ticks)
+        self._timing = seq.timeline.timing()
+
+    def _cmd_set_nudge(self, instrument_index, step, ticks):
+        seq = self.sequencer
+        seq.set_nudge(instrument_index, step, ticks)
+        self._timing = seq.timeline.timing()
+
+    def _cmd_load_pattern(self, beats, bpm, grid):
+        # """loading a beat by hand ends the song"""
+        self._cmd_stop_arrangement()
+        seq = self.sequencer
+        seq.grid = grid
+        seq.set_beats(beats)
+        seq.set_bpm(bpm)
+        self._grid_changed()
+
+    def _cmd_set_playing(self, playing):
+        self._playing = playing
+        if not playing:
+            self.sequencer.stop()
+
+    def _cmd_restart(self):
+        self._playing = True
+        self.sequencer.restart()
+        if self._song is not None:
+            self._begin_song()
+
+    def _cmd_play_arrangement(self, song):
+        if self.prefetcher is None:
+            raise RuntimeError("song mode needs a PatternPrefetcher")
+        self._cmd_stop_arrangement()
+        if len(song):
+            self._song = song
+            self._begin_song()
+
+    def _cmd_stop_arrangement(self):
+        self._song = None
+        self._song_start = None
+        self._next = None
+        self._prefetch_wanted = False
+
+    # ---------------------------
+    # """Song mode (engine thread only)"""
+    # ---------------------------
+    def _begin_song(self):
+        """Prepares the first entry; the song starts (from step 0) as soon as it is ready."""
+        self._song_index = 0
+        self._next = None
+        seq = self.sequencer
+        self._song_start = self.prefetcher.request(self._song, 0, seq.active_list, seq.timeline.swing)
+
+    def _start_song(self, prepared, now):
+        self._song_start = None
+        if prepared is None:
+            print("Warning: no entry of the song could be loaded; leaving song mode")
+            self._cmd_stop_arrangement()
+            return
+        seq = self.sequencer
+        self._apply(prepared, seq.scheduler.now() if now is None else now)
+        # """the restart re-anchors on step 0, which is then popped (and counted) like any bar line"""
+        seq.restart(now)
+
+    def _song_bar_line(self, when):
+        """
+        Called for every due step 0 in song mode: counts the finished pass and swaps in the
+        next prepared pattern after the last repeat.
+
+        :return: True if the pattern was switched (the new pattern's loop starts at when).
+        """
+        self._song_pass += 1
+        if self._song_pass < self._song[self._song_index].repeats:
+            return False
+        if self._next is None:
+            # """the song is over (no loop): the last pattern keeps looping"""
+            return False
+        if not self._next.done():
+            self.late_switches += 1
+            return False
+        prepared = self._next.result()
+        if prepared is None:
+            # """nothing after this entry could be loaded: keep looping it"""
+            self._next = None
+            return False
+        self._apply(prepared, when)
+        self.switches += 1
+        return True
+
+    def _apply(self, prepared, when):
+        """Swaps in a prepared pattern: a few assignments, no parsing, copying or mixing."""
+        seq = self.sequencer
+        # """a swing change made while the pattern was being prepared still applies to it"""
+        prepared.timeline.set_swing(seq.timeline.swing)
+        seq.switch_pattern(prepared.grid, prepared.beats, prepared.bpm, when, prepared.timeline)
+        self._grid_copy = prepared.view
+        self._timing = seq.timeline.timing()
+        if self.step_mix is not None:
+            if prepared.mix is not None:
+                self.step_mix.apply(prepared.mix, seq.active_list)
+            else:
+                self.step_mix.rebuild(seq.grid, seq.active_list, seq.beats)
+        self._song_index = prepared.index
+        # """the new pattern's step 0 is popped next and counted as its first bar line"""
+        self._song_pass = -1
+        self._next = None
+        self._prefetch_wanted = True
+
+    def _request_next(self):
+        """Starts preparing the entry after the current one: it has a whole pattern's time to finish."""
+        self._prefetch_wanted = False
+        if self._song is None:
+            return
+        index = self._song.next_index(self._song_index)
+        if index is not None:
+            seq = self.sequencer
+            self._next = self.prefetcher.request(self._song, index, seq.active_list, seq.timeline.swing)
@@ -0,0 +1,139 @@
+# -----------------------------------------------------------------------------
+# """SampleLoader: parallel sample decoding with a disk cache of mixer-ready PCM"""
+# -----------------------------------------------------------------------------
+import glob
+import hashlib
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from audio_samples import MIXER_FORMATS, convert, decode_wav, resolve_path, to_mixer_array
+
+DEFAULT_CACHE_DIR = ".sample_cache"
+# """bump when the decoding or conversion changes, so old cache files are not reused"""
+_CACHE_VERSION = 1
+
+
+class SampleLoader:
+    """
+    Loads drum samples straight into the format the mixer was opened with.
+
+    Paths are resolved case-insensitively (sounds/kick.wav finds sounds/kick.WAV). Every
+    file is decoded, resampled, channel-mixed and converted to the mixer's sample type once,
+    on a small thread pool (wave reads and the NumPy conversion release the GIL). The result
+    is stored as a raw .npy file in cache_dir under a key of the resolved path, its mtime and
+    size, and the mixer format; later startups with the same files and format only map the
+    cached PCM back in. Editing a sample changes its mtime, so it is decoded again and the
+    stale cache file is removed.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, workers=None):
+        """
+        :param cache_dir: Folder for the cached PCM (created on first write); None disables the cache.
+        :param workers: Decoder threads (defaults to the CPU count, at most 8).
+        """
+        self.cache_dir = cache_dir
+        self.workers = max(1, int(workers or min(8, os.cpu_count() or 1)))
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, paths, sample_rate=44100, size=32, channels=2):
+        """
+        Loads every path in the given mixer format. Missing or unreadable files become empty
+        (silent) buffers, so callers can keep instrument indexes aligned.
+
+        :param paths: A list of file paths, in instrument order.
+        :param sample_rate: Target sample rate in Hz.
+        :param size: pygame mixer sample size (-16 for signed 16 bit, 32 for float32, ...).
+        :param channels: Target channel count.
+        :return: A list of (frames, channels) arrays of the mixer's dtype (see MIXER_FORMATS).
+        """
+        fmt = (int(sample_rate), int(size), int(channels))
+        paths = list(paths)
+        if self.workers == 1 or len(paths) < 2:
+            return [self._load_one(p, fmt) for p in paths]
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(paths)), thread_name_prefix="PyDrumsSamples") as pool:
+            return list(pool.map(lambda p: self._load_one(p, fmt), paths))
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+    # ---------------------------
+    # """Internal helpers"""
+    # ---------------------------
+    @staticmethod
+    def _empty(fmt):
+        return np.zeros((0, fmt[2]), dtype=MIXER_FORMATS.get(fmt[1], (np.int16,))[0])
+
+    def _load_one(self, path, fmt):
+        resolved = resolve_path(path)
+        if resolved is None:
+            print(f"Warning: Sound file not found: {path}. Using silence.")
+            return self._empty(fmt)
+        try:
+            cache_file = self._cache_file(resolved, fmt)
+            pcm = self._read_cache(cache_file)
+            if pcm is not None:
+                with self._lock:
+                    self.hits += 1
+                return pcm
+            data, rate = decode_wav(resolved)
+            pcm = to_mixer_array(convert(data, rate, fmt[0], fmt[2]), fmt[1])
+            with self._lock:
+                self.misses += 1
+        except Exception as exc:
+            print(f"Warning: Failed to decode sound {path} -> {exc}. Using silence.")
+            return self._empty(fmt)
+        self._write_cache(cache_file, pcm)
+        return pcm
+
+    def _cache_file(self, resolved, fmt):
+        """<path hash>_<rate>_<size>_<channels>_<file stamp hash>.npy, or None without a cache folder."""
+        if self.cache_dir is None:
+            return None
+        st = os.stat(resolved)
+        source = hashlib.blake2b(os.path.abspath(resolved).encode('utf-8'), digest_size=8).hexdigest()
+        stamp = hashlib.blake2b(f"{_CACHE_VERSION}:{st.st_mtime_ns}:{st.st_size}".encode('ascii'),
+                                digest_size=8).hexdigest()
+        rate, size, channels = fmt
+        return os.path.join(self.cache_dir, f"{source}_{rate}_{size}_{channels}_{stamp}.npy")
+
+    @staticmethod
+    def _read_cache(cache_file):
+        if cache_file is None or not os.path.exists(cache_file):
+            return None
+        try:
+            return np.load(cache_file, allow_pickle=False)
+        except (OSError, ValueError) as exc:
+            print(f"Warning: ignoring damaged sample cache {cache_file} -> {exc}")
+            return None
+
+    def _write_cache(self, cache_file, pcm):
+        """Atomic write (temp file + rename); cache trouble never stops a sample from loading."""
+        if cache_file is None:
+            return
+        temp = None
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, temp = tempfile.mkstemp(suffix=".tmp", dir=self.cache_dir)
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, pcm, allow_pickle=False)
+            os.replace(temp, cache_file)
+            temp = None
+            # """the same sample in the same format with an older mtime/size is stale now"""
+            prefix = os.path.basename(cache_file).rsplit('_', 1)[0]
+            for stale in glob.glob(os.path.join(glob.escape(self.cache_dir), prefix + "_*.npy")):
+                if stale != cache_file:
+                    os.remove(stale)
+        except OSError as exc:
+            print(f"Warning: could not write the sample cache -> {exc}")
+        finally:
+            if temp is not None:
+                try:
+                    os.remove(temp)
+                except OSError:
+                    pass
@@ -0,0 +1,417 @@
+# -----------------------------------------------------------------------------
+# """StepScheduler: drift-free, look-ahead step timing driven by a monotonic clock"""
+# -----------------------------------------------------------------------------
+import time
+from collections import deque
+
+from pattern_grid import PatternGrid
+from timeline import MARKER, Timeline
+
+# """marks a played step marker in StepScheduler._played (above every instrument bit)"""
+_MARKER_BIT = 1 << 64
+
+
+class ScheduledStep:
+    """
+    A single timeline event queued by the StepScheduler.
+
+    :param step: The zero-based step (column) index inside the pattern.
+    :param target_time: The exact clock time (seconds) the event should sound at.
+    :param mask: Bitmask of the instruments it plays (before mutes).
+    :param marker: True for the step's marker event (it moves the playhead), False for nudged notes.
+    :param tick: Its tick inside the loop.
+    :param shift: How far (seconds) swing, the step offset and nudges moved it off the grid.
+    """
+    __slots__ = ("step", "target_time", "mask", "marker", "tick", "shift")
+
+    def __init__(self, step, target_time, mask=0, marker=True, tick=0, shift=0.0):
+        self.step = step
+        self.target_time = target_time
+        self.mask = mask
+        self.marker = marker
+        self.tick = tick
+        self.shift = shift
+
+    @property
+    def grid_time(self):
+        """When the step would sound without swing, offsets or nudges."""
+        return self.target_time - self.shift
+
+    def __repr__(self):
+        return f"ScheduledStep(step={self.step}, target_time={self.target_time:.6f}, mask={self.mask:#x})"
+
+
+class StepScheduler:
+    """
+    Computes the exact time of every event of a Timeline from a fixed anchor instead of
+    counting frames. The tick anchor_tick of the loop sounds at anchor_time and tick t of
+    loop n after it at anchor_time + (n * loop_ticks + t - anchor_tick) * tick_duration, so
+    rounding errors never accumulate and the tempo is independent of how fast the UI loop runs.
+
+    The timeline's events are already sorted: the scheduler keeps an index into them (and
+    a loop count) and pulls the next event by that index, so swing, offsets and nudges cost
+    nothing per tick and no grid is scanned. Events due within the look-ahead window are
+    queued in advance with their target times; the caller pops them once they are due and
+    the scheduler measures how late each step was.
+    """
+
+    def __init__(self, bpm, beats, lookahead=0.1, late_tolerance=0.25, clock=time.perf_counter, timeline=None):
+        """
+        Initializes the scheduler in the stopped state.
+
+        :param bpm: Steps per minute (the app's BPM value is one step per beat).
+        :param beats: Number of steps in the loop (when no timeline is given: an empty pattern).
+        :param lookahead: How far ahead (seconds) events are queued.
+        :param late_tolerance: Events popped later than this (seconds) are skipped instead of
+        played, so a long stall does not release a burst of stale notes.
+        :param clock: A monotonic high-resolution clock returning seconds.
+        :param timeline: The Timeline to play (see Sequencer.timeline).
+        """
+        self._clock = clock
+        self._bpm = max(1, int(bpm))
+        self._timeline = timeline if timeline is not None else Timeline(PatternGrid(1, beats))
+        self.lookahead = max(0.0, float(lookahead))
+        self.late_tolerance = max(0.0, float(late_tolerance))
+        self._queue = deque()
+        self._running = False
+        # """anchor: loop tick _anchor_tick sounds at _anchor_time; the cursor is the next event to
+        # queue (index and loop count) and _cursor its (tick, time); _consumed is the (tick, time)
+        # of the last event popped. Both stay valid when the timeline is edited under the index."""
+        self._anchor_time = 0.0
+        self._anchor_tick = 0
+        self._loop_ticks = self._timeline.loop_ticks
+        self._index = 0
+        self._loop = 0
+        self._cursor = (0, 0.0)
+        self._consumed = (-0.5, 0.0)
+        self._popped_at = 0.0
+        # """what was played around the playhead (absolute step -> instrument bits | _MARKER_BIT), so an
+        # edit that moves a played note later does not play it twice; checked until _guard_until"""
+        self._played = {}
+        self._guard_until = 0.0
+        self.position = 0
+        self.skipped_steps = 0
+        self._reset_stats()
+
+    # ---------------------------
+    # """Properties"""
+    # ---------------------------
+    @property
+    def running(self):
+        return self._running
+
+    @property
+    def bpm(self):
+        return self._bpm
+
+    @property
+    def beats(self):
+        return self._timeline.beats
+
+    @property
+    def timeline(self):
+        return self._timeline
+
+    @property
+    def step_duration(self):
+        """The exact length of one step in seconds (no integer quantization)."""
+        return 60.0 / self._bpm
+
+    @property
+    def tick_duration(self):
+        return 60.0 / (self._bpm * self._timeline.ppq)
+
+    def now(self):
+        return self._clock()
+
+    # ---------------------------
+    # """Transport"""
+    # ---------------------------
+    def start(self, first_step=0, now=None):
+        """
+        Starts (or restarts) the scheduler so that first_step sounds at time now (its earliest
+        note, when an offset or nudge pulls it ahead of the grid).
+
+        :param first_step: The step that should sound first.
+        :param now: Optional clock time to start at (defaults to the clock).
+        """
+        if now is None:
+            now = self._clock()
+        self._queue.clear()
+        self._running = True
+        first_step = int(first_step) % self.beats
+        lead = self._timeline.lead_in(first_step)
+        self._anchor(now + lead * self.tick_duration, first_step * self._timeline.ppq, lead)
+        self._played.clear()
+        self.position = first_step
+        self._reset_stats()
+
+    def stop(self):
+        """Stops scheduling and drops every queued step."""
+        self._running = False
+        self._queue.clear()
+
+    def set_bpm(self, bpm):
+        """
+        Changes the tempo without a jump: the first event that has not been played yet keeps
+        its target time and every later event is re-timed with the new tick duration.
+        """
+        bpm = max(1, int(bpm))
+        if bpm == self._bpm:
+            return
+        if self._running:
+            tick, when = self._first_pending()
+            self._bpm = bpm
+            self._queue.clear()
+            self._anchor(when, tick)
+            self._played.clear()
+            self._reset_stats()
+        else:
+            self._bpm = bpm
+
+    def resync(self):
+        """
+        Picks up a recompiled timeline (a cell toggle, an offset or nudge, swing or a length
+        change): the queued events are dropped and queued again from the last event played, so
+        an edit is heard even inside the look-ahead window and an event moved earlier is not
+        lost (unless it moved before the last pop_due: then it waits for the next loop). Notes
+        already played are not played again when they moved later. After a length change the
+        position is kept when it still exists, otherwise the loop starts over with the next event.
+        """
+        loop_ticks = self._timeline.loop_ticks
+        resized = loop_ticks != self._loop_ticks
+        if self._running:
+            tick, when = self._consumed
+            if tick >= loop_ticks:
+                when = self._first_pending()[1]
+            self._loop_ticks = loop_ticks
+            self._queue.clear()
+            if tick >= loop_ticks:
+                self._anchor(when, 0)
+            else:
+                # """the first event strictly after the one played last"""
+                self._anchor(when, tick, -0.5)
+                self._skip_until(self._popped_at)
+                # """swing, an offset and a nudge edit move a note by 2.5 steps at most"""
+                self._guard_until = when + 3.0 * self.step_duration
+            if resized:
+                self._reset_stats()
+        self._loop_ticks = loop_ticks
+        if self.position >= self.beats:
+            self.position = 0
+
+    def rebase(self, bpm, when, timeline=None):
+        """
+        Switches to another timeline and tempo at a bar line (a song moving to its next
+        pattern): tick 0 of the new loop sounds at when, every later event is timed with the
+        new values. Notes of step 0 pulled ahead of the grid are queued before when (they
+        may already be late). Events queued for the old pattern are dropped.
+        """
+        if timeline is not None:
+            self._timeline = timeline
+        self._bpm = max(1, int(bpm))
+        self._loop_ticks = self._timeline.loop_ticks
+        self._queue.clear()
+        self._anchor(when, 0, self._timeline.lead_in(0))
+        self._played.clear()
+        self.position = 0
+        self._reset_stats()
+
+    # ---------------------------
+    # """Scheduling"""
+    # ---------------------------
+    def schedule(self, now=None):
+        """
+        Queues every event whose target time falls inside [now, now + lookahead], pulling
+        them from the timeline by index.
+
+        :return: The list of ScheduledStep objects queued by this call.
+        """
+        if not self._running:
+            return []
+        if now is None:
+            now = self._clock()
+        horizon = now + self.lookahead
+        events = self._timeline.events
+        loop_ticks = self._loop_ticks
+        tick_duration = self.tick_duration
+        base = self._anchor_time - self._anchor_tick * tick_duration
+        added = []
+        while True:
+            if self._index >= len(events):
+                self._index = 0
+                self._loop += 1
+            tick, kind, step, mask, shift = events[self._index]
+            when = base + (self._loop * loop_ticks + tick) * tick_duration
+            if when > horizon:
+                self._cursor = (tick, when)
+                break
+            self._index += 1
+            marker = kind == MARKER
+            if when <= self._guard_until:
+                done = self._played.get(self._step_number(when - shift * tick_duration), 0)
+                mask &= ~done
+                if done & _MARKER_BIT:
+                    marker = False
+                if not mask and not marker:
+                    continue
+            item = ScheduledStep(step, when, mask, marker, tick, shift * tick_duration)
+            self._queue.append(item)
+            added.append(item)
+        return added
+
+    def pop_due(self, now=None):
+        """
+        Removes and returns the queued events whose target time has been reached.
+        Events that are later than late_tolerance are not returned (skipped steps are
+        counted in skipped_steps), but step markers still move the playhead (position).
+
+        :return: A list of ScheduledStep objects that should be played now.
+        """
+        if not self._running:
+            return []
+        if now is None:
+            now = self._clock()
+        self.schedule(now)
+        self._popped_at = now
+        due = []
+        queue = self._queue
+        while queue and queue[0].target_time <= now:
+            item = queue.popleft()
+            self._consumed = (item.tick, item.target_time)
+            self._mark_played(item)
+            if item.marker:
+                self.position = item.step
+            late = now - item.target_time
+            if late > self.late_tolerance:
+                if item.marker:
+                    self.skipped_steps += 1
+                continue
+            if item.marker:
+                self._record(item, now)
+            due.append(item)
+        return due
+
+    def pending(self):
+        """Returns a snapshot list of the queued (not yet due) events."""
+        return list(self._queue)
+
+    def time_until_next(self, now=None):
+        """Seconds until the next event is due (0.0 when one is already due, None when stopped)."""
+        if not self._running:
+            return None
+        if now is None:
+            now = self._clock()
+        return max(0.0, self._first_pending()[1] - now)
+
+    # ---------------------------
+    # """Measurement"""
+    # ---------------------------
+    def tempo_error(self):
+        """
+        Reports the measured long-run tempo against the nominal one, using the actual
+        trigger times of every step played since the last (re)anchor. Swing, offsets and
+        nudges are taken out, so only the clock is measured.
+
+        :return: A dict with nominal_bpm, measured_bpm, error_ppm, mean_late_ms,
+        max_late_ms and steps. measured_bpm and error_ppm are None until two steps played.
+        """
+        steps = self._stat_count
+        measured_bpm = None
+        error_ppm = None
+        if steps >= 2 and self._stat_last_n > self._stat_first_n:
+            span = self._stat_last_actual - self._stat_first_actual
+            intervals = self._stat_last_n - self._stat_first_n
+            if span > 0:
+                measured = span / intervals
+                measured_bpm = 60.0 / measured
+                error_ppm = (measured - self.step_duration) / self.step_duration * 1e6
+        return {
+            "nominal_bpm": self._bpm,
+            "measured_bpm": measured_bpm,
+            "error_ppm": error_ppm,
+            "mean_late_ms": (self._stat_late_sum / steps * 1000.0) if steps else 0.0,
+            "max_late_ms": self._stat_late_max * 1000.0,
+            "steps": steps,
+        }
+
+    # ---------------------------
+    # """Internal helpers"""
+    # ---------------------------
+    def _anchor(self, when, tick, lead=0):
+        """
+        Loop tick tick sounds at when; the cursor moves to the first event at or after tick - lead
+        (a lead past tick 0 starts in the loop before; a negative lead skips events).
+        """
+        self._anchor_time = when
+        self._anchor_tick = tick
+        start = tick - lead
+        loop, offset = divmod(start, self._loop_ticks)
+        self._loop = int(loop)
+        self._index = self._timeline.index_at(offset)
+        events = self._timeline.events
+        if self._index >= len(events):
+            self._index = 0
+            self._loop += 1
+        first = events[self._index][0]
+        self._cursor = (first, self._time_at(self._loop, first))
+        self._consumed = (start - 0.5, self._time_at(0, start - 0.5))
+        self._guard_until = 0.0
+
+    def _skip_until(self, now):
+        """Moves the cursor past the events that should have sounded before now."""
+        events = self._timeline.events
+        while self._cursor[1] < now:
+            self._index += 1
+            if self._index >= len(events):
+                self._index = 0
+                self._loop += 1
+            tick = events[self._index][0]
+            self._cursor = (tick, self._time_at(self._loop, tick))
+
+    def _step_number(self, grid_time):
+        return round(grid_time / self.step_duration)
+
+    def _mark_played(self, item):
+        played = self._played
+        number = self._step_number(item.grid_time)
+        played[number] = played.get(number, 0) | item.mask | (_MARKER_BIT if item.marker else 0)
+        if len(played) > 8:
+            for old in [n for n in played if n < number - 4]:
+                del played[old]
+
+    def _time_at(self, loop, tick):
+        return self._anchor_time + (loop * self._loop_ticks + tick - self._anchor_tick) * self.tick_duration
+
+    def _first_pending(self):
+        """(loop tick, target_time) of the earliest event that has not been popped yet."""
+        if self._queue:
+            item = self._queue[0]
+            return item.tick, item.target_time
+        return self._cursor
+
+    def _reset_stats(self):
+        # """grid time of loop tick 0 at the anchor: step n of the stats sounds n steps after it"""
+        self._stat_origin = self._anchor_time - self._anchor_tick * self.tick_duration
+        self._stat_count = 0
+        self._stat_first_n = 0
+        self._stat_first_actual = 0.0
+        self._stat_last_n = 0
+        self._stat_last_actual = 0.0
+        self._stat_late_sum = 0.0
+        self._stat_late_max = 0.0
+
+    def _record(self, item, actual):
+        # """n is recovered from the grid time so skipped steps and swing do not bias the tempo"""
+        n = round((item.grid_time - self._stat_origin) / self.step_duration)
+        late = actual - item.target_time
+        actual -= item.shift
+        if self._stat_count == 0:
+            self._stat_first_n = n
+            self._stat_first_actual = actual
+        self._stat_last_n = n
+        self._stat_last_actual = actual
+        self._stat_count += 1
+        self._stat_late_sum += late
+        if late > self._stat_late_max:
+            self._stat_late_max = late
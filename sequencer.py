@@ -1,31 +1,85 @@
 # -----------------------------------------------------------------------------
 # Sequencer: holds beats, timing, grid, and provides methods to step & mutate
 # -----------------------------------------------------------------------------
-import pygame
+from scheduler import StepScheduler
+from pattern_grid import PatternGrid, mask_bits
+from timeline import Timeline
 class Sequencer:
     """
 This module encapsulates all essential timing and pattern data,
 including the tempo (BPM), measure structure (beats), and the sequence of notes/events (grid, active beat). 
-It acts as the central state manager, utilizing different data structures like lists of lists (for the grid) and integers (for beats and BPM). 
+It acts as the central state manager, utilizing a bit-packed PatternGrid (one instrument bitmask per step) for the grid and integers (for beats and BPM). 
+The grid still reads and writes like the old list of lists of 1 / -1 values. 
 The logic within this module is responsible for accurately driving the timing and playback of the entire musical sequence.
     """
     def __init__(self, instruments_count=6, initial_beats=8, initial_bpm=240):
         self.instruments = int(instruments_count)
         self.beats = max(1, int(initial_beats))
         self.bpm = max(1, int(initial_bpm))
-        # grid: instruments x beats, default -1
-        self.grid = [[-1 for _ in range(self.beats)] for _ in range(self.instruments)]
-        self.active_list = [1 for _ in range(self.instruments)] 
+        # grid: instruments x beats, default -1 (off)
+        self._pattern = PatternGrid(self.instruments, self.beats)
+        self._active_list = [1 for _ in range(self.instruments)]
+        self._active_mask = self._pattern.full_mask
         # timing
         self.active_beat = 0
         self.active_length = 0
         self._fps = 60
         self._accumulator = 0
-        # Ensure mixer channels (defensive)
-        try:
-            pygame.mixer.set_num_channels(self.instruments * 3)
-        except Exception:
-            pass
+        # tick timeline (swing, step offsets, nudges) walked by the audio-clock scheduler
+        self.timeline = Timeline(self._pattern)
+        self.scheduler = StepScheduler(self.bpm, self.beats, timeline=self.timeline)
+
+    @property
+    def grid(self):
+        """The PatternGrid (grid[instr][step] is 1 or -1, like the old list of lists)."""
+        return self._pattern
+
+    @grid.setter
+    def grid(self, value):
+        """Accepts a PatternGrid or a list of lists of 1 / -1 values (menus, saved files)."""
+        if value is self._pattern:
+            return
+        if isinstance(value, PatternGrid) and value.instruments == self.instruments:
+            self._pattern = value
+        elif isinstance(value, PatternGrid):
+            # """a beat saved with a different track count: keep the rows we have"""
+            self._pattern = PatternGrid.from_lists(value.to_lists(), self.instruments, value.beats)
+        else:
+            self._pattern = PatternGrid.from_lists(value, self.instruments)
+        self.timeline.set_grid(self._pattern)
+        self.beats = self._pattern.beats
+        if self.active_beat >= self.beats:
+            self.active_beat = 0
+        self.scheduler.resync()
+
+    @property
+    def active_list(self):
+        return self._active_list
+
+    @active_list.setter
+    def active_list(self, value):
+        self._active_list = value
+        self._refresh_active_mask()
+
+    @property
+    def active_mask(self):
+        """Bitmask of the instruments that are not muted."""
+        return self._active_mask
+
+    def _refresh_active_mask(self):
+        mask = 0
+        for i, value in enumerate(self._active_list):
+            if value == 1:
+                mask |= 1 << i
+        self._active_mask = mask
+
+    def instruments_on_step(self, step):
+        """Tuple of the unmuted instruments that fire on step (one mask lookup)."""
+        return self._pattern.instruments_on(step, self._active_mask)
+
+    def instruments_in(self, mask):
+        """Tuple of the unmuted instruments of mask (a timeline event's notes)."""
+        return mask_bits(mask & self._active_mask)
 
     """Sets the target Frames Per Second (FPS) for the application's drawing/update loop. 
     fps_value (int/str): The desired FPS value. 
@@ -46,18 +100,32 @@ The logic within this module is responsible for accurately driving the timing an
 
     def toggle_cell(self, instrument_index, beat_index):
         if 0 <= instrument_index < self.instruments and 0 <= beat_index < self.beats:
-            self.grid[instrument_index][beat_index] *= -1
+            self._pattern.toggle(instrument_index, beat_index)
+            self.timeline.update_step(beat_index)
+            self.scheduler.resync()
 
 
             """Toggles the active/mute state of an entire instrument track 
                 by multiplying its value in self.active_list by -1."""
     def toggle_instrument_active(self, instrument_index):
         if 0 <= instrument_index < self.instruments:
-            self.active_list[instrument_index] *= -1
+            self._active_list[instrument_index] *= -1
+            self._refresh_active_mask()
 
     """Resets the entire sequencer grid, setting every cell back to the default inactive state (-1)."""
     def clear_grid(self):
-        self.grid = [[-1 for _ in range(self.beats)] for _ in range(self.instruments)]
+        self._pattern.clear()
+        self._recompile()
+
+    """Rotates the pattern right by steps (negative = left), wrapping around the loop."""
+    def rotate_grid(self, steps):
+        self._pattern.rotate(steps)
+        self._recompile()
+
+    """Shifts the pattern right by steps (negative = left); steps pushed off the end are dropped."""
+    def shift_grid(self, steps):
+        self._pattern.shift(steps)
+        self._recompile()
 
     def increase_beats(self):
         self.set_beats(self.beats + 1)
@@ -69,16 +137,11 @@ The logic within this module is responsible for accurately driving the timing an
     def set_beats(self, new_beats):
         # keep existing data where possible
         new_beats = max(1, int(new_beats))
-        for row in self.grid:
-            if len(row) < new_beats:
-                row.extend([-1] * (new_beats - len(row)))
-            elif len(row) > new_beats:
-                del row[new_beats:]
+        self._pattern.resize(new_beats)
         self.beats = new_beats
-        # normalize rows
-        self.grid = [row[:new_beats] if len(row) >= new_beats else row + [-1] * (new_beats - len(row)) for row in self.grid]
         if self.active_beat >= self.beats:
             self.active_beat = 0
+        self._recompile()
 
     def increase_bpm(self, step=5):
         self.set_bpm(self.bpm + int(step))
@@ -89,25 +152,76 @@ The logic within this module is responsible for accurately driving the timing an
     def set_bpm(self, new_bpm):
         new_bpm = max(1, int(new_bpm))
         self.bpm = new_bpm
+        self.scheduler.set_bpm(self.bpm)
+
+    """Swing in percent (50 straight .. 75); odd steps are delayed."""
+    def set_swing(self, swing):
+        self.timeline.set_swing(swing)
+        self.scheduler.resync()
+
+    """Moves every note of a step off the grid by ticks (Timeline.ppq ticks per step)."""
+    def set_step_offset(self, beat_index, ticks):
+        self.timeline.set_step_offset(beat_index, ticks)
+        self.scheduler.resync()
+
+    """Moves a single note off its step by ticks."""
+    def set_nudge(self, instrument_index, beat_index, ticks):
+        self.timeline.set_nudge(instrument_index, beat_index, ticks)
+        self.scheduler.resync()
 
-    def timing_advance(self, fps_clock_tick=1):
+    def switch_pattern(self, grid, beats, bpm, when, timeline=None):
         """
-        This is the timing logic from the  active_length / beat_length method.
+        Replaces the pattern on a bar line without restarting the clock: step 0 of the new
+        pattern sounds at when (the bar line), the next steps follow at the new bpm.
+
+        :param grid: A PatternGrid with this sequencer's instruments and beats steps (see PatternPrefetcher).
+        :param timeline: The Timeline already compiled for grid (built here when None).
+        """
+        self._pattern = grid
+        self.beats = max(1, int(beats))
+        self.bpm = max(1, int(bpm))
+        self.active_beat = 0
+        self.timeline = timeline if timeline is not None else Timeline(grid, swing=self.timeline.swing)
+        self.scheduler.rebase(self.bpm, when, self.timeline)
+
+    def start(self, now=None):
+        """Starts the scheduler so the current active_beat sounds immediately."""
+        self.active_length = 0
+        self.scheduler.start(self.active_beat, now)
+
+    def stop(self):
+        """Stops the scheduler (pause); queued steps are dropped."""
+        self.scheduler.stop()
+
+    def restart(self, now=None):
+        """Rewinds to the first step and starts playing from there."""
+        self.active_beat = 0
+        self.start(now)
+
+    def pop_due_steps(self, now=None):
+        """
+        Returns the ScheduledStep objects that are due at time now (queued in advance by
+        the look-ahead scheduler) and moves active_beat to the newest position.
+        Starts the scheduler on first use.
+        """
+        if not self.scheduler.running:
+            self.start(now)
+        due = self.scheduler.pop_due(now)
+        self.active_beat = self.scheduler.position
+        return due
+
+    def _recompile(self):
+        """Full timeline compile after an edit that touches every step."""
+        self.timeline.compile()
+        self.scheduler.resync()
+
+    def tempo_error(self):
+        """Measured long-run tempo error of the scheduler (see StepScheduler.tempo_error)."""
+        return self.scheduler.tempo_error()
+
+    def timing_advance(self, now=None):
+        """
+        Advances the playhead according to the monotonic clock instead of counting frames.
         Returns True when we've advanced to the next beat step (so audio should play).
         """
-    
-        try:
-            beat_length = 3600 // self.bpm if self.bpm > 0 else 1
-        except Exception:
-            beat_length = 1
-        # Use integer 
-        if self.active_length < beat_length:
-            self.active_length += 1
-            return False
-        else:
-            self.active_length = 0
-            if self.active_beat < self.beats - 1:
-                self.active_beat += 1
-            else:
-                self.active_beat = 0
-            return True
+        return bool(self.pop_due_steps(now))
@@ -1,7 +1,12 @@
-import os
 import pygame
 from pygame import mixer
 
+from sample_loader import SampleLoader
+from voice_pool import VoicePool
+
+# """mixer channels left unreserved for plain Sound.play() (e.g. the pre-mixed step sounds)"""
+_FREE_CHANNELS = 8
+
 
 # -----------------------------------------------------------------------------
 # """SoundManager: Encapsulate audio loading and playback"""
@@ -11,14 +16,26 @@ class SoundManager:
     Manages the loading and playback of sound samples using pygame.mixer.
     It is designed for stability: if sound files are missing or the mixer 
     fails to initialize, it uses silent placeholder objects to prevent crashes.
+    Notes are played on a fixed VoicePool of reserved channels (polyphony limits,
+    voice stealing and choke groups) instead of whatever channel Sound.play() finds.
     """
-    def __init__(self, sound_file_paths, channels_per_sound=3):
+    def __init__(self, sound_file_paths, channels_per_sound=3, telemetry=None, loader=None, voices=16,
+                 priorities=None, choke_groups=(), steal="quietest", gains=None):
         """
         Initializes the SoundManager and loads sounds.
 
         :param sound_file_paths: A list or tuple of file paths for the audio samples.
-        :param channels_per_sound: The number of dedicated mixer channels to reserve 
-        for simultaneous playback of each sound type.
+        :param channels_per_sound: Polyphony of each sound type: an int for all of them, or one
+        per sound (a new hit of a sound that already plays that many voices takes one over).
+        :param telemetry: Optional TriggerTelemetry; notes played with an intended_time
+        are recorded in it (intended vs actual trigger time).
+        :param loader: SampleLoader that decodes (or fetches from its disk cache) the samples
+        in the mixer's format; a default one is created when omitted.
+        :param voices: Size of the voice pool (mixer channels reserved for the instruments).
+        :param priorities: Optional per-sound priority; higher priority voices are stolen last.
+        :param choke_groups: Groups of sound indexes that cut each other off (e.g. closed and open hi-hat).
+        :param steal: Voice stealing policy, "quietest" or "oldest" (see VoicePool).
+        :param gains: Optional per-sound volume (0.0 to 1.0).
         :raises TypeError: If sound_file_paths is not a list or tuple.
         """
         # Validate path list
@@ -33,8 +50,17 @@ class SoundManager:
         except Exception as exc:
             print("Warning: pygame.mixer.init() failed:", exc)
             
+        self.telemetry = telemetry
+        self._loader = loader if loader is not None else SampleLoader()
         self._sounds = []
-        self._channels_per_sound = max(1, int(channels_per_sound))
+        self._lengths = []
+        self._channels_per_sound = channels_per_sound
+        self._voices = max(1, int(voices))
+        self._priorities = priorities
+        self._choke_groups = choke_groups
+        self._steal = steal
+        self._gains = list(gains) if gains is not None else []
+        self.pool = None
         self._load_sounds()
 
     def _create_silent(self):
@@ -49,34 +75,55 @@ class SoundManager:
     def _load_sounds(self):
         """
         Loads all sound files specified in self._sound_paths.
+        The samples are decoded in parallel (or read from the loader's cache) already in
+        the mixer's rate, sample type and channel count, so pygame only wraps the PCM.
         If loading fails for any sound, a silent placeholder is used instead.
-        Attempts to set the total number of mixer channels.
+        Then reserves the voice pool's channels.
         """
-        # Attempt to load each provided path; create silent fallback on errors
-        for p in self._sound_paths:
+        try:
+            init = mixer.get_init()
+        except Exception:
+            init = None
+        if init:
+            buffers = self._loader.load(self._sound_paths, *init)
+        else:
+            print("Warning: pygame.mixer is not available. Using silent placeholders.")
+            buffers = [None] * len(self._sound_paths)
+        # Wrap each decoded buffer; empty buffers (missing or unreadable files) become silent placeholders
+        for i, (p, pcm) in enumerate(zip(self._sound_paths, buffers)):
             try:
-                if os.path.exists(p):
-                    snd = mixer.Sound(p)
+                if pcm is not None and len(pcm):
+                    snd = mixer.Sound(buffer=pcm)
+                    if i < len(self._gains):
+                        snd.set_volume(self._gains[i])
                 else:
-                    print(f"Warning: Sound file not found: {p}. Using silent placeholder.")
                     snd = self._create_silent()
                 self._sounds.append(snd)
             except Exception as exc:
                 print(f"Warning: Failed to load sound {p} -> {exc}. Using silent placeholder.")
                 self._sounds.append(self._create_silent())
-                
-        # Try setting channels for simultaneous sound playback
-        try:
-            mixer.set_num_channels(len(self._sounds) * self._channels_per_sound)
-        except Exception:
-            # Not a fatal error
-            pass
+        self._lengths = [snd.get_length() if hasattr(snd, "get_length") else 0.0 for snd in self._sounds]
 
-    def play_instrument_index(self, instrument_index):
+        # Reserve the pool's channels, so Sound.play() elsewhere never lands on (and cuts) a drum voice
+        if init:
+            try:
+                mixer.set_num_channels(self._voices + _FREE_CHANNELS)
+                mixer.set_reserved(self._voices)
+                self.pool = VoicePool([mixer.Channel(i) for i in range(self._voices)], len(self._sounds),
+                                      polyphony=self._channels_per_sound, priorities=self._priorities,
+                                      choke_groups=self._choke_groups, steal=self._steal)
+            except Exception as exc:
+                # Not a fatal error: notes fall back to Sound.play()
+                print("Warning: voice pool disabled:", exc)
+                self.pool = None
+
+    def play_instrument_index(self, instrument_index, intended_time=None):
         """
         Plays the sound associated with the given index (instrument).
 
         :param instrument_index: The zero-based index of the sound sample to play.
+        :param intended_time: When the note should have sounded (scheduler clock, seconds);
+        if given and telemetry is set, the actual trigger time is recorded against it.
         :raises TypeError: If instrument_index is not an integer.
         """
         # Validate index
@@ -86,7 +133,17 @@ class SoundManager:
         if 0 <= instrument_index < len(self._sounds):
             try:
                 # The object at this index is either a real Sound or a _Silent object.
-                self._sounds[instrument_index].play()
+                sound = self._sounds[instrument_index]
+                if self.pool is not None and self._lengths[instrument_index] > 0.0:
+                    self.pool.play(instrument_index, sound, self._lengths[instrument_index])
+                else:
+                    sound.play()
+                if intended_time is not None and self.telemetry is not None:
+                    self.telemetry.record(instrument_index, intended_time)
             except Exception as exc:
                 # Playback should never crash the app
-                print(f"Warning: playback failed for instrument {instrument_index}: {exc}")
\ No newline at end of file
+                print(f"Warning: playback failed for instrument {instrument_index}: {exc}")
+
+    def voice_stats(self):
+        """Voice pool counters (voices, active, played, stolen, dropped, choked), or None without a pool."""
+        return self.pool.stats() if self.pool is not None else None
@@ -0,0 +1,206 @@
+# -----------------------------------------------------------------------------
+# """StepMixCache: pre-mix every step's hits into one buffer, played as a single voice"""
+# -----------------------------------------------------------------------------
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pygame
+from pygame import mixer
+
+from audio_samples import to_mixer_array
+from pattern_grid import PatternGrid
+
+
+class StepMixCache:
+    """
+    Keeps one pre-mixed pygame Sound per step so that a step is triggered as a single voice:
+    all of its hits start on exactly the same sample and use a single mixer channel.
+
+    Each step is keyed by its column of the grid combined with active_list (as an instrument
+    bitmask). Steps with the same key share one buffer. Toggling a cell re-keys only that
+    step and muting a track re-keys only the steps that use it; buffers themselves are
+    kept in a bounded LRU so patterns can switch back and forth without re-mixing.
+    A song's next pattern can be mixed on another thread with prepare() and swapped in
+    with apply(); the buffer LRU is shared and locked.
+    """
+
+    def __init__(self, sample_buffers, gain=1.0, max_entries=256):
+        """
+        :param sample_buffers: float32 (frames, channels) arrays in the mixer's rate and
+        channel count, one per instrument (see SampleLoader.load with size 32).
+        :param gain: Linear gain applied to each mixed step (hits are summed, then clipped).
+        :param max_entries: Maximum number of distinct mixed buffers kept in memory.
+        """
+        self._buffers = list(sample_buffers)
+        self.gain = float(gain)
+        self.max_entries = max(1, int(max_entries))
+        self._mixes = OrderedDict()  # """key bitmask -> pygame Sound (or None for silence)"""
+        self._columns = []           # """per-step instrument bitmask of the grid column"""
+        self._active_mask = 0
+        self._step_sounds = []       # """per-step resolved Sound, indexed by step"""
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        try:
+            init = mixer.get_init()
+        except Exception:
+            init = None
+        self._mixer_size = init[1] if init else None
+        self._mixer_channels = init[2] if init else None
+
+    @classmethod
+    def from_paths(cls, sample_paths, gain=1.0, max_entries=256, loader=None, gains=None):
+        """
+        Decodes sample_paths straight into the current mixer's rate and channel count.
+
+        :param loader: SampleLoader to decode with (and cache through); a default one when omitted.
+        :param gains: Optional per-sample volume, applied once to the decoded buffers.
+        """
+        from sample_loader import SampleLoader
+        init = mixer.get_init()
+        if not init:
+            raise RuntimeError("pygame.mixer must be initialized before building a StepMixCache")
+        freq, _size, channels = init
+        loader = loader if loader is not None else SampleLoader()
+        # """the mixes are summed in float32 and converted to the mixer's type per step"""
+        buffers = loader.load(sample_paths, freq, 32, channels)
+        if gains is not None:
+            buffers = [b * g if g != 1.0 else b for b, g in zip(buffers, gains)] + buffers[len(gains):]
+        return cls(buffers, gain, max_entries)
+
+    # ---------------------------
+    # """Keeping the cache in sync with the grid"""
+    # ---------------------------
+    def rebuild(self, grid, active_list, beats):
+        """Recomputes every step key (use after a load, preset, clear or a beats change)."""
+        beats = max(1, int(beats))
+        if not isinstance(grid, PatternGrid):
+            grid = PatternGrid.from_lists(grid, beats=beats)
+        columns = grid.masks[:beats].tolist()
+        columns += [0] * (beats - len(columns))
+        self._columns = columns
+        self._active_mask = self._mask_from_active(active_list)
+        self._step_sounds = [self._sound_for(mask & self._active_mask) for mask in columns]
+
+    def prepare(self, grid, active_list, beats):
+        """
+        Mixes every step of another pattern without touching the current one (safe to call
+        from a worker thread while this cache plays).
+
+        :return: An opaque prepared state for apply().
+        """
+        beats = max(1, int(beats))
+        columns = grid.masks[:beats].tolist()
+        columns += [0] * (beats - len(columns))
+        active_mask = self._mask_from_active(active_list)
+        return columns, active_mask, [self._sound_for(mask & active_mask) for mask in columns]
+
+    def apply(self, prepared, active_list):
+        """
+        Switches to a pattern mixed by prepare(). If a track was muted or unmuted since it was
+        prepared, the steps are re-keyed (their buffers are usually cached already).
+        """
+        columns, active_mask, step_sounds = prepared
+        self._columns = list(columns)
+        self._active_mask = self._mask_from_active(active_list)
+        if self._active_mask == active_mask:
+            self._step_sounds = list(step_sounds)
+        else:
+            self._step_sounds = [self._sound_for(mask & self._active_mask) for mask in self._columns]
+
+    def update_cell(self, grid, instrument_index, step):
+        """Re-keys a single step after grid[instrument_index][step] was toggled."""
+        if not 0 <= step < len(self._columns):
+            return
+        bit = 1 << instrument_index
+        if grid[instrument_index][step] == 1:
+            self._columns[step] |= bit
+        else:
+            self._columns[step] &= ~bit
+        self._step_sounds[step] = self._sound_for(self._columns[step] & self._active_mask)
+
+    def update_track(self, active_list, instrument_index):
+        """Re-keys only the steps that contain instrument_index after a mute/unmute."""
+        self._active_mask = self._mask_from_active(active_list)
+        bit = 1 << instrument_index
+        for step, mask in enumerate(self._columns):
+            if mask & bit:
+                self._step_sounds[step] = self._sound_for(mask & self._active_mask)
+
+    # ---------------------------
+    # """Playback"""
+    # ---------------------------
+    def play_step(self, step):
+        """Plays the pre-mixed step as one voice. Returns the Channel used (or None)."""
+        if 0 <= step < len(self._step_sounds):
+            sound = self._step_sounds[step]
+            if sound is not None:
+                return sound.play()
+        return None
+
+    def play_mask(self, mask):
+        """
+        Plays the unmuted instruments of mask as one voice (part of a step whose notes were
+        nudged apart). Returns the Channel used (or None).
+        """
+        sound = self._sound_for(mask & self._active_mask)
+        return sound.play() if sound is not None else None
+
+    def step_mask(self, step):
+        """The effective (column & active) instrument bitmask of a step."""
+        if 0 <= step < len(self._columns):
+            return self._columns[step] & self._active_mask
+        return 0
+
+    def stats(self):
+        return {"entries": len(self._mixes), "hits": self.hits, "misses": self.misses}
+
+    # ---------------------------
+    # """Internal helpers"""
+    # ---------------------------
+    @staticmethod
+    def _mask_from_active(active_list):
+        mask = 0
+        for i, value in enumerate(active_list):
+            if value == 1:
+                mask |= 1 << i
+        return mask
+
+    def _sound_for(self, key):
+        if key == 0:
+            return None
+        with self._lock:
+            return self._sound_for_locked(key)
+
+    def _sound_for_locked(self, key):
+        cached = self._mixes.get(key)
+        if cached is not None or key in self._mixes:
+            self._mixes.move_to_end(key)
+            self.hits += 1
+            return cached
+        self.misses += 1
+        sound = self._mix(key)
+        self._mixes[key] = sound
+        if len(self._mixes) > self.max_entries:
+            self._mixes.popitem(last=False)
+        return sound
+
+    def _mix(self, key):
+        parts = [self._buffers[i] for i in range(len(self._buffers)) if (key >> i) & 1 and len(self._buffers[i])]
+        if not parts or self._mixer_size is None:
+            return None
+        frames = max(len(p) for p in parts)
+        mix = np.zeros((frames, parts[0].shape[1]), dtype=np.float32)
+        for p in parts:
+            mix[:len(p)] += p
+        if self.gain != 1.0:
+            mix *= self.gain
+        if self._mixer_channels == 1:
+            # """a mono mixer only takes 1-D arrays"""
+            mix = mix[:, 0]
+        try:
+            return pygame.sndarray.make_sound(to_mixer_array(mix, self._mixer_size))
+        except Exception as exc:
+            print(f"Warning: could not build pre-mixed step sound -> {exc}")
+            return None
@@ -1,65 +1,822 @@
 import os
+import sqlite3
+import sys
+import threading
+
+import numpy as np
+
+from beat_index import BeatIndex
+from persistence_worker import FSYNC_POLICIES, PersistenceWorker, append_lines, atomic_write_lines
+from beat_record import (FORMAT_VERSION, BeatFormatError, BeatRecord, header_line, line_pattern, parse_header,
+                         pattern_id, pattern_summary, record_name, ref_summary)
+
+
+def parse_saved_name(raw_line):
+    """
+    Extracts the beat name from a saved line, or returns the raw line if it has no name field.
+    """
+    try:
+        name_index_start = raw_line.index('name: ') + 6
+        name_index_end = raw_line.index(', beats:')
+        return raw_line[name_index_start:name_index_end]
+    except Exception:
+        return raw_line
+
+
+def parse_saved_line(raw_line):
+    """
+    Tries to extract beats (int), bpm (int), and the clicked grid (list of lists)
+    from the saved string format.
+
+    :return: A tuple (beats, bpm, grid) or None if the line cannot be parsed.
+    """
+    try:
+        # """Find and parse integer values (beats and bpm)."""
+        name_index_end = raw_line.index(', beats:')
+        beats_index_end = raw_line.index(', bpm:')
+        bpm_index_end = raw_line.index(', selected:')
+        loaded_beats = int(raw_line[name_index_end + 8:beats_index_end])
+        loaded_bpm = int(raw_line[beats_index_end + 6:bpm_index_end])
+
+        # """Extract and parse the 2D list string for the grid."""
+        loaded_clicks_string = raw_line[bpm_index_end + 14: -1]
+        rows = []
+        s = loaded_clicks_string.strip()
+
+        # """Strip outer brackets if present."""
+        if s.startswith('[') and s.endswith(']'):
+            s = s[1:-1]
+
+        # """Split the string into individual instrument rows."""
+        if '], [' in s:
+            row_strs = s.split('], [')
+        else:
+            row_strs = s.split('],')
+
+        for r in row_strs:
+            r = r.strip().lstrip('[').rstrip(']').strip()
+            if not r:
+                continue
+            # """Split row into individual step values and convert to int (1 or -1)."""
+            items = [it.strip() for it in r.split(',')]
+            row = []
+            for it in items:
+                if it in ('1', '-1'):
+                    row.append(int(it))
+            if row:
+                rows.append(row)
+
+        return loaded_beats, loaded_bpm, rows
+
+    except Exception:
+        # """Return None if parsing fails due to bad file format."""
+        return None
+
+
+def free_backup_name(path):
+    """
+    A backup file name next to path that does not exist yet: path itself, else path.1, path.2, ...
+    (an older backup is never overwritten).
+    """
+    candidate, n = path, 0
+    while os.path.exists(candidate):
+        n += 1
+        candidate = f"{path}.{n}"
+    return candidate
+
+
+def legacy_record(raw_line, instruments=None):
+    """
+    Converts one line of the old text format (name: ..., beats: ..., bpm: ..., selected: [[...]])
+    to a BeatRecord.
+
+    :return: The BeatRecord, or None if the line cannot be parsed.
+    """
+    parsed = parse_saved_line(raw_line)
+    if not parsed:
+        return None
+    beats, bpm, grid = parsed
+    try:
+        return BeatRecord.from_grid(parse_saved_name(raw_line), max(1, beats), max(1, bpm), grid, instruments)
+    except (BeatFormatError, ValueError):
+        return None
+
 
 # -----------------------------------------------------------------------------
-# """StorageManager: handles reading/writing saved beats (text format kept for compat)"""
+# """Library backends: JSON Lines file (default) and indexed SQLite database"""
 # -----------------------------------------------------------------------------
-class StorageManager:
-    """
-    Manages reading from and writing to the saved beats file (saved_beats.txt).
-    It is designed to handle file I/O operations, ensuring the file exists 
-    and providing error-safe methods for loading and saving line-oriented data.
+class _JsonLinesLibrary:
     """
+    The JSON Lines file (format 2), held in memory as key -> raw beat line plus
+    pattern id -> raw pattern line (keys are stable ids for this session). Each distinct
+    pattern is stored once however many beats use it, and is dropped with its last beat.
+    Lines are parsed lazily: listing a page only extracts the names of the visible rows
+    (memoized), and a beat is fully decoded when it is loaded.
 
-    def __init__(self, filename="saved_beats.txt"):
-        """
-        Initializes the StorageManager with a specified filename.
-        Attempts to create an empty file if it does not already exist.
+    Adds and deletes change the memory copy at once and are written by a PersistenceWorker
+    off the UI thread: a batch of adds is appended in one write, and a batch containing a
+    delete replaces the file atomically (temp file + rename). The file on disk is therefore
+    always a complete library, at most one batch behind.
+    """
 
-        :param filename: The name of the text file used for persistent storage.
-        """
+    def __init__(self, filename, fsync="always"):
         self._filename = filename
+        self._fsync = fsync
+        self.read_only = False
+        self.skipped = 0
+        self._lines = {}
+        self._pattern_of = {}
+        self._patterns = {}
+        self._users = {}
+        self._pattern_beats = {}
+        self._names = {}
+        self._keys = None
+        self._next_key = 0
+        # """unsaved changes: lines to append, or a full rewrite (set by deletes and failed writes)"""
+        self._pending = []
+        self._rewrite = False
+        # """_state_lock guards the memory copy (held briefly); _io_lock orders the file writes"""
+        self._state_lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._worker = PersistenceWorker(self._flush_pending)
         # Ensure file exists
         try:
             if not os.path.exists(self._filename):
-                with open(self._filename, 'w') as f:
-                    f.write('')
+                atomic_write_lines(self._filename, [header_line()], fsync)
         except Exception as exc:
             print("Warning: Could not ensure save file exists:", exc)
+        self._read()
+        if self._rewrite:
+            self._worker.mark_dirty()
 
-    def load_all_lines(self):
-        """
-        Reads all non-empty lines from the file, stripping whitespace and 
-        newline characters.
+    def _clear(self):
+        self._lines = {}
+        self._pattern_of = {}
+        self._patterns = {}
+        self._users = {}
+        self._pattern_beats = {}
+        self._names = {}
+        self._next_key = 0
+        self._keys = None
 
-        :return: A list of strings, where each string is a stripped line 
-        from the saved beats file. Returns an empty list on errors 
-        or if the file is not found.
-        """
-        lines = []
+    def _set_lines(self, lines):
+        """Indexes format 2 lines; lines that are neither a pattern nor a beat with a known pattern are skipped."""
+        self._clear()
+        beats = []
+        for line in lines:
+            kind = line_pattern(line)
+            if kind is None:
+                self.skipped += 1
+            elif kind[0] == "pattern":
+                self._patterns[kind[1]] = line
+            else:
+                beats.append((kind[1], line))
+        for pid, line in beats:
+            if pid not in self._patterns:
+                self.skipped += 1
+                continue
+            self._lines[self._next_key] = line
+            self._pattern_of[self._next_key] = pid
+            self._users[pid] = self._users.get(pid, 0) + 1
+            self._next_key += 1
+        # """patterns no beat refers to any more are not kept"""
+        for pid in [pid for pid in self._patterns if pid not in self._users]:
+            del self._patterns[pid]
+
+    def _set_records(self, records):
+        """Replaces the memory copy with records (patterns shared by content hash)."""
+        self._clear()
+        for record in records:
+            self._insert(record)
+
+    def _insert(self, record):
+        """Adds a record to the memory copy. :return: (key, lines that are new on disk)."""
+        pid = record.pattern_id
+        new_lines = []
+        if pid not in self._patterns:
+            self._patterns[pid] = record.pattern_line(pid)
+            new_lines.append(self._patterns[pid])
+        line = record.ref_line(pid)
+        key = self._next_key
+        self._next_key += 1
+        self._lines[key] = line
+        self._pattern_of[key] = pid
+        self._users[pid] = self._users.get(pid, 0) + 1
+        new_lines.append(line)
+        return key, new_lines
+
+    def _file_lines(self):
+        return list(self._patterns.values()) + list(self._lines.values())
+
+    def _key_list(self):
+        if self._keys is None:
+            self._keys = list(self._lines)
+        return self._keys
+
+    def _read(self):
+        """Loads the file into memory, upgrading a legacy or format 1 file."""
+        self.skipped = 0
         try:
             with open(self._filename, 'r', encoding='utf-8') as f:
-                for line in f:
-                    if line.strip():
-                        lines.append(line.rstrip('\n'))
+                lines = [line.rstrip('\n') for line in f if line.strip()]
         except FileNotFoundError:
-            # Return empty list if file not present
-            lines = []
+            return
         except Exception as exc:
             print("Warning: Error loading saved beats:", exc)
-        return lines
+            return
+        if not lines:
+            return
 
-    def write_all_lines(self, lines):
-        """
-        Overwrites the entire file content with the provided list of lines.
+        version = parse_header(lines[0])
+        if version is None:
+            self._migrate(lines, legacy_record, ".legacy")
+            return
+        if version < FORMAT_VERSION:
+            self._migrate(lines[1:], self._format1_record, f".v{version}")
+            return
+        if version > FORMAT_VERSION:
+            print(f"Warning: {self._filename} was written by a newer PyDrums (format version {version}); "
+                  f"it will not be overwritten.")
+            self.read_only = True
+        elif len(lines) > 1 and line_pattern(lines[-1]) is None:
+            # """a crash in the middle of an append leaves a cut-off last line: drop it"""
+            print("Warning: the last saved beat was incomplete (interrupted save) and was dropped.")
+            lines.pop()
+            self._rewrite = True
+        self._set_lines(lines[1:])
+        if self.skipped:
+            print(f"Warning: {self.skipped} saved lines could not be read and were skipped.")
 
-        :param lines: A list of strings (beat entries) to write to the file.
-        :return: True if the write operation was successful, False otherwise.
+    @staticmethod
+    def _format1_record(line):
+        try:
+            return BeatRecord.from_line(line)
+        except BeatFormatError:
+            return None
+
+    def _migrate(self, lines, convert, backup_suffix):
         """
+        Converts an older file with convert(line) -> BeatRecord or None, keeping the original as a
+        backup. Without a backup the file is not rewritten: the library opens read-only instead.
+        """
+        records = []
+        for line in lines:
+            record = convert(line)
+            if record is None:
+                self.skipped += 1
+            else:
+                records.append(record)
+        self._set_records(records)
+        backup = free_backup_name(self._filename + backup_suffix)
+        try:
+            os.replace(self._filename, backup)
+        except OSError as exc:
+            print("Warning: Could not back up the old saved beats file; opening it read-only:", exc)
+            self.read_only = True
+            return
+        if self._write(self._file_lines()):
+            print(f"Migrated {len(records)} saved beats to the new format (old file kept as {backup}).")
+        if self.skipped:
+            print(f"Warning: {self.skipped} old saved lines could not be parsed (they are still in {backup}).")
+
+    def _write(self, lines):
+        """Atomically replaces the file with a header and lines (caller holds _io_lock, or is __init__)."""
+        if self.read_only:
+            print("Warning: saved beats file is read-only (newer version, or no backup could be made); not writing.")
+            return False
         try:
-            with open(self._filename, 'w', encoding='utf-8') as f:
-                for line in lines:
-                    f.write(str(line) + '\n')
+            atomic_write_lines(self._filename, [header_line()] + lines, self._fsync)
             return True
         except Exception as exc:
             print("Error writing saved beats:", exc)
-            return False
\ No newline at end of file
+            return False
+
+    def _flush_pending(self):
+        """Writes the unsaved changes (worker thread, or close())."""
+        with self._io_lock:
+            with self._state_lock:
+                rewrite, appends = self._rewrite, self._pending
+                self._rewrite, self._pending = False, []
+                lines = self._file_lines() if rewrite else None
+            if rewrite:
+                written = self._write(lines)
+            elif appends:
+                try:
+                    append_lines(self._filename, appends, self._fsync)
+                    written = True
+                except OSError as exc:
+                    print("Error saving beats:", exc)
+                    written = False
+            else:
+                return
+            if not written:
+                # """the file still holds the previous library; write everything with the next change"""
+                with self._state_lock:
+                    self._rewrite = True
+
+    def _parse(self, key):
+        try:
+            return BeatRecord.from_lines(self._lines[key], self._patterns[self._pattern_of[key]])
+        except BeatFormatError:
+            self.skipped += 1
+            return None
+
+    def _name(self, key):
+        name = self._names.get(key)
+        if name is None:
+            name = record_name(self._lines[key])
+            self._names[key] = name
+        return name
+
+    def _beats(self, pid):
+        beats = self._pattern_beats.get(pid)
+        if beats is None:
+            summary = pattern_summary(self._patterns[pid])
+            beats = self._pattern_beats[pid] = summary[1] if summary else 0
+        return beats
+
+    def count(self):
+        return len(self._lines)
+
+    def pattern_count(self):
+        return len(self._patterns)
+
+    def names(self, offset, limit):
+        keys = self._key_list()[max(0, offset):max(0, offset) + limit]
+        return [(key, self._name(key)) for key in keys]
+
+    def summaries(self):
+        for key, line in list(self._lines.items()):
+            summary = ref_summary(line)
+            if summary is not None:
+                name, bpm, pid = summary
+                self._names[key] = name
+                yield key, name, self._beats(pid), bpm
+
+    def page(self, offset, limit):
+        keys = self._key_list()[max(0, offset):max(0, offset) + limit]
+        return [(key, record) for key in keys for record in (self._parse(key),) if record is not None]
+
+    def get(self, key):
+        return self._parse(key) if key in self._lines else None
+
+    def find(self, name):
+        for key in self._lines:
+            if self._name(key) == name:
+                record = self._parse(key)
+                if record is not None:
+                    return key, record
+        return None
+
+    def find_pattern(self, pid):
+        if pid not in self._users:
+            return None
+        for key, key_pid in self._pattern_of.items():
+            if key_pid == pid:
+                return key, self._name(key)
+        return None
+
+    def add(self, record):
+        if self.read_only:
+            return None
+        with self._state_lock:
+            key, new_lines = self._insert(record)
+            self._pending.extend(new_lines)
+        self._names[key] = record.name
+        if self._keys is not None:
+            self._keys.append(key)
+        self._worker.mark_dirty()
+        return key
+
+    def delete(self, key):
+        if key not in self._lines or self.read_only:
+            return False
+        with self._state_lock:
+            del self._lines[key]
+            pid = self._pattern_of.pop(key)
+            self._users[pid] -= 1
+            if not self._users[pid]:
+                del self._users[pid]
+                del self._patterns[pid]
+                self._pattern_beats.pop(pid, None)
+            self._rewrite = True
+        self._names.pop(key, None)
+        self._keys = None
+        self._worker.mark_dirty()
+        return True
+
+    def load_records(self):
+        self.skipped = 0
+        records = [self._parse(key) for key in self._lines]
+        if self.skipped:
+            print(f"Warning: {self.skipped} saved beats could not be read and were skipped.")
+        return [record for record in records if record is not None]
+
+    def write_records(self, records):
+        if self.read_only:
+            return self._write([])
+        records = list(records)
+        with self._io_lock:
+            with self._state_lock:
+                self._set_records(records)
+                self._pending = []
+                lines = self._file_lines()
+            written = self._write(lines)
+            with self._state_lock:
+                # """on failure the memory copy is still the new library: retry with the next write"""
+                self._rewrite = not written
+            return written
+
+    def flush(self):
+        self._worker.flush()
+
+    def close(self):
+        self._worker.stop()
+        # """the worker already wrote everything unless it never ran or its last write failed"""
+        self._flush_pending()
+
+
+class _SqliteLibrary:
+    """
+    SQLite database: a patterns table keyed by content hash (masks as little-endian uint64
+    blobs) and a beats table with name, bpm, beats and the pattern id, indexed on name,
+    bpm, beats and pattern. Nothing is held in memory: rows are read a page at a time and
+    every add or delete is its own transaction; a pattern is deleted with its last beat.
+
+    SQLite already commits atomically; the database runs in WAL mode, where a commit is
+    one sequential append, and the fsync policy picks its synchronous level (always: FULL,
+    rename: NORMAL, never: OFF).
+    """
+    _SYNCHRONOUS = {"always": "FULL", "rename": "NORMAL", "never": "OFF"}
+    _SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS patterns (id TEXT PRIMARY KEY, beats INTEGER NOT NULL, "
+        "instruments INTEGER NOT NULL, masks BLOB NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS beats (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, "
+        "beats INTEGER NOT NULL, bpm INTEGER NOT NULL, pattern TEXT NOT NULL REFERENCES patterns (id))",
+        "CREATE INDEX IF NOT EXISTS beats_name ON beats (name)",
+        "CREATE INDEX IF NOT EXISTS beats_bpm ON beats (bpm)",
+        "CREATE INDEX IF NOT EXISTS beats_beats ON beats (beats)",
+        "CREATE INDEX IF NOT EXISTS beats_pattern ON beats (pattern)",
+    )
+    _SELECT = ("SELECT b.id, b.name, p.beats, b.bpm, p.instruments, p.masks "
+               "FROM beats b JOIN patterns p ON p.id = b.pattern ")
+
+    def __init__(self, filename, fsync="always"):
+        self._filename = filename
+        self.read_only = False
+        self.skipped = 0
+        # """the playback thread never touches storage, but a background writer or the song prefetcher may
+        # (check_same_thread off)"""
+        self._conn = sqlite3.connect(filename, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"PRAGMA synchronous={self._SYNCHRONOUS[fsync]}")
+        with self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            if self._conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone() is None:
+                for statement in self._SCHEMA:
+                    self._conn.execute(statement)
+                self._conn.execute("INSERT INTO meta (key, value) VALUES ('version', ?)", (str(FORMAT_VERSION),))
+        version = int(self._conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0])
+        if version > FORMAT_VERSION:
+            print(f"Warning: {filename} was written by a newer PyDrums (format version {version}); "
+                  f"it will not be modified.")
+            self.read_only = True
+        elif version < FORMAT_VERSION:
+            self._migrate(version)
+
+    def _migrate(self, version):
+        """
+        Format 1 (masks stored in every beat row) -> format 2, in one transaction; the old database
+        is kept. Without a backup it is not upgraded: the library opens read-only instead.
+        """
+        backup = free_backup_name(f"{self._filename}.v{version}")
+        try:
+            self._conn.execute("VACUUM INTO ?", (backup,))
+        except sqlite3.Error as exc:
+            print("Warning: Could not back up the old saved beats database; opening it read-only:", exc)
+            self.read_only = True
+            return
+        conn = self._conn
+        try:
+            conn.execute("BEGIN")
+            rows = conn.execute("SELECT id, name, beats, bpm, instruments, masks FROM beats ORDER BY id").fetchall()
+            conn.execute("DROP TABLE beats")
+            for statement in self._SCHEMA:
+                conn.execute(statement)
+            pids = [pattern_id(row[4], np.frombuffer(row[5], dtype='<u8')) for row in rows]
+            conn.executemany("INSERT OR IGNORE INTO patterns (id, beats, instruments, masks) VALUES (?, ?, ?, ?)",
+                             ((pid, row[2], row[4], row[5]) for pid, row in zip(pids, rows)))
+            conn.executemany("INSERT INTO beats (id, name, beats, bpm, pattern) VALUES (?, ?, ?, ?, ?)",
+                             ((row[0], row[1], row[2], row[3], pid) for pid, row in zip(pids, rows)))
+            conn.execute("UPDATE meta SET value = ? WHERE key = 'version'", (str(FORMAT_VERSION),))
+            conn.commit()
+            print(f"Migrated {len(rows)} saved beats to the new format (old database kept as {backup}).")
+        except sqlite3.Error as exc:
+            conn.rollback()
+            print("Warning: Could not upgrade the saved beats database; opening it read-only:", exc)
+            self.read_only = True
+
+    @staticmethod
+    def _pattern_values(record, pid):
+        return pid, record.beats, record.instruments, np.asarray(record.masks, dtype='<u8').tobytes()
+
+    @staticmethod
+    def _beat_values(record, pid):
+        return record.name, record.beats, record.bpm, pid
+
+    def _insert(self, record):
+        pid = record.pattern_id
+        self._conn.execute("INSERT OR IGNORE INTO patterns (id, beats, instruments, masks) VALUES (?, ?, ?, ?)",
+                           self._pattern_values(record, pid))
+        return self._conn.execute("INSERT INTO beats (name, beats, bpm, pattern) VALUES (?, ?, ?, ?)",
+                                  self._beat_values(record, pid)).lastrowid
+
+    def _record(self, row):
+        name, beats, bpm, instruments, blob = row
+        try:
+            return BeatRecord(name, beats, bpm, instruments, np.frombuffer(blob, dtype='<u8').tolist())
+        except (BeatFormatError, ValueError):
+            self.skipped += 1
+            return None
+
+    def count(self):
+        return self._conn.execute("SELECT COUNT(*) FROM beats").fetchone()[0]
+
+    def pattern_count(self):
+        return self._conn.execute("SELECT COUNT(*) FROM patterns").fetchone()[0]
+
+    def page(self, offset, limit):
+        rows = self._conn.execute(self._SELECT + "ORDER BY b.id LIMIT ? OFFSET ?",
+                                  (int(limit), max(0, int(offset)))).fetchall()
+        return [(row[0], record) for row in rows for record in (self._record(row[1:]),) if record is not None]
+
+    def names(self, offset, limit):
+        return self._conn.execute("SELECT id, name FROM beats ORDER BY id LIMIT ? OFFSET ?",
+                                  (int(limit), max(0, int(offset)))).fetchall()
+
+    def summaries(self):
+        return self._conn.execute("SELECT id, name, beats, bpm FROM beats ORDER BY id")
+
+    def get(self, key):
+        row = self._conn.execute(self._SELECT + "WHERE b.id = ?", (key,)).fetchone()
+        return self._record(row[1:]) if row else None
+
+    def find(self, name):
+        row = self._conn.execute(self._SELECT + "WHERE b.name = ? ORDER BY b.id LIMIT 1", (name,)).fetchone()
+        return (row[0], self._record(row[1:])) if row else None
+
+    def find_pattern(self, pid):
+        return self._conn.execute("SELECT id, name FROM beats WHERE pattern = ? ORDER BY id LIMIT 1",
+                                  (pid,)).fetchone()
+
+    def add(self, record):
+        if self.read_only:
+            return None
+        try:
+            with self._conn:
+                return self._insert(record)
+        except sqlite3.Error as exc:
+            print("Error saving beat:", exc)
+            return None
+
+    def delete(self, key):
+        if self.read_only:
+            return False
+        try:
+            with self._conn:
+                row = self._conn.execute("SELECT pattern FROM beats WHERE id = ?", (key,)).fetchone()
+                if row is None:
+                    return False
+                self._conn.execute("DELETE FROM beats WHERE id = ?", (key,))
+                self._conn.execute("DELETE FROM patterns WHERE id = ? AND NOT EXISTS "
+                                   "(SELECT 1 FROM beats WHERE pattern = ?)", (row[0], row[0]))
+                return True
+        except sqlite3.Error as exc:
+            print("Error deleting beat:", exc)
+            return False
+
+    def load_records(self):
+        self.skipped = 0
+        rows = self._conn.execute(self._SELECT + "ORDER BY b.id")
+        return [record for record in (self._record(row[1:]) for row in rows) if record is not None]
+
+    def write_records(self, records):
+        if self.read_only:
+            return False
+        try:
+            with self._conn:
+                self._conn.execute("DELETE FROM beats")
+                self._conn.execute("DELETE FROM patterns")
+                records = list(records)
+                pids = [record.pattern_id for record in records]
+                self._conn.executemany("INSERT OR IGNORE INTO patterns (id, beats, instruments, masks) "
+                                       "VALUES (?, ?, ?, ?)", map(self._pattern_values, records, pids))
+                self._conn.executemany("INSERT INTO beats (name, beats, bpm, pattern) VALUES (?, ?, ?, ?)",
+                                       map(self._beat_values, records, pids))
+            return True
+        except sqlite3.Error as exc:
+            print("Error writing saved beats:", exc)
+            return False
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self._conn.close()
+
+
+SQLITE_EXTENSIONS = (".db", ".sqlite", ".sqlite3")
+
+
+# -----------------------------------------------------------------------------
+# """StorageManager: the only way the app reads or writes the saved beats library"""
+# -----------------------------------------------------------------------------
+class StorageManager:
+    """
+    Manages the saved beats library. Two backends share one interface:
+    - JSON Lines (saved_beats.txt, see beat_record.py): a header line, then pattern lines and
+      beat lines. A file in the old text format or an older JSON format is migrated the first
+      time it is loaded; the original is kept next to it as <filename>.legacy / .v1.
+    - SQLite (a .db / .sqlite file): indexed on name, bpm and beats, paged from disk, so a
+      library of 100k beats opens instantly and a save is one transactional insert.
+    Both store each distinct pattern once, keyed by its content hash (BeatRecord.pattern_id),
+    so saving the same grid under another name only adds a name, tempo and reference.
+
+    Beats are addressed by a key returned from page()/add(); keys stay valid across deletes.
+    add() and delete() never wait for the disk on the JSON Lines backend: a background worker
+    writes them in batches (see persistence_worker.py). Call flush() to wait for the disk, and
+    close() on exit.
+    """
+
+    def __init__(self, filename="saved_beats.txt", backend=None, fsync="always"):
+        """
+        Initializes the StorageManager with a specified filename.
+        Attempts to create an empty library if the file does not already exist.
+
+        :param filename: The file used for persistent storage.
+        :param backend: "jsonl" or "sqlite"; by default SQLite is used for .db/.sqlite/.sqlite3 files.
+        :param fsync: When writes are forced to disk: "always", "rename" (only what atomic
+        replacement needs) or "never".
+        :raises ValueError: If backend or fsync is not one of the above.
+        """
+        self._filename = filename
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {', '.join(FSYNC_POLICIES)}")
+        if backend is None:
+            backend = "sqlite" if os.path.splitext(filename)[1].lower() in SQLITE_EXTENSIONS else "jsonl"
+        if backend == "sqlite":
+            self._library = _SqliteLibrary(filename, fsync)
+        elif backend == "jsonl":
+            self._library = _JsonLinesLibrary(filename, fsync)
+        else:
+            raise ValueError("backend must be 'jsonl' or 'sqlite'")
+        self.backend = backend
+        # """bumped on every add/delete so views can cache pages"""
+        self.version = 0
+        # """search index, built on the first search and then kept up to date by add/delete"""
+        self._index = None
+
+    @property
+    def filename(self):
+        return self._filename
+
+    @property
+    def read_only(self):
+        """True when the library is from a newer version or could not be backed up (it is never modified then)."""
+        return self._library.read_only
+
+    @property
+    def skipped(self):
+        """Records that could not be parsed by the last load."""
+        return self._library.skipped
+
+    # ---------------------------
+    # """Paged access (used by the menus)"""
+    # ---------------------------
+    def count(self):
+        """Number of saved beats."""
+        return self._library.count()
+
+    def pattern_count(self):
+        """Number of distinct patterns stored (beats with identical grids share one)."""
+        return self._library.pattern_count()
+
+    def page(self, offset, limit):
+        """
+        :return: Up to limit (key, BeatRecord) pairs starting at position offset.
+        """
+        return self._library.page(offset, limit)
+
+    def names(self, offset, limit):
+        """
+        Cheap listing for views: only the names are extracted, the patterns are not decoded.
+
+        :return: Up to limit (key, name) pairs starting at position offset.
+        """
+        return self._library.names(offset, limit)
+
+    def get(self, key):
+        """:return: The BeatRecord for key, or None."""
+        return self._library.get(key)
+
+    def find(self, name):
+        """:return: (key, BeatRecord) of the first beat with this exact name, or None."""
+        return self._library.find(name)
+
+    def find_pattern(self, pid):
+        """
+        The "already saved?" check: an O(1) hash lookup on the JSON Lines backend, an
+        indexed query on SQLite.
+
+        :param pid: A pattern id (BeatRecord.pattern_id).
+        :return: (key, name) of the first saved beat with this exact grid, or None.
+        """
+        return self._library.find_pattern(pid)
+
+    def search(self, query):
+        """
+        Search-as-you-type over the library: every word of query must start a word of the
+        name, and bpm:N / beats:N (or N-M ranges) filter on tempo and length.
+        The first call builds the in-memory index (see beat_index.py); later calls only
+        run the vectorized lookup.
+
+        :return: A SearchResult with the same count()/names() listing as this class.
+        """
+        if self._index is None:
+            self._index = BeatIndex(self._library.summaries())
+        return self._index.query(query)
+
+    def add(self, record):
+        """
+        Saves one beat without rewriting the library.
+
+        :return: The new key, or None if the beat could not be saved.
+        """
+        key = self._library.add(record)
+        if key is not None:
+            self.version += 1
+            if self._index is not None:
+                self._index.add(key, record.name, record.beats, record.bpm)
+        return key
+
+    def delete(self, key):
+        """:return: True if the beat was deleted."""
+        deleted = self._library.delete(key)
+        if deleted:
+            self.version += 1
+            if self._index is not None:
+                self._index.remove(key)
+        return deleted
+
+    # ---------------------------
+    # """Whole-library access (batch tools, import/export)"""
+    # ---------------------------
+    def load_records(self):
+        """
+        :return: Every saved beat as a list of BeatRecord objects (empty on errors).
+        """
+        return self._library.load_records()
+
+    def write_records(self, records):
+        """
+        Replaces the whole library with the provided records.
+
+        :param records: An iterable of BeatRecord objects.
+        :return: True if the write operation was successful, False otherwise.
+        """
+        written = self._library.write_records(records)
+        if written:
+            self.version += 1
+            self._index = None
+        return written
+
+    def flush(self):
+        """Waits until every add and delete so far is written to disk."""
+        self._library.flush()
+
+    def close(self):
+        """Writes anything still pending and releases the library."""
+        self._library.close()
+
+
+# -----------------------------------------------------------------------------
+# """Command line: python storage_manager.py saved_beats.txt library.db (copy a library)"""
+# -----------------------------------------------------------------------------
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        print("usage: python storage_manager.py SOURCE DESTINATION  (.txt = JSON Lines, .db = SQLite)")
+        return 2
+    source, destination = StorageManager(argv[0]), StorageManager(argv[1])
+    records = source.load_records()
+    if not destination.write_records(records):
+        return 1
+    print(f"Copied {len(records)} saved beats ({destination.pattern_count()} distinct patterns) "
+          f"from {argv[0]} to {argv[1]}.")
+    source.close()
+    destination.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,79 @@
+# -----------------------------------------------------------------------------
+# """TextCache: shared LRU cache of rendered text surfaces"""
+# -----------------------------------------------------------------------------
+from collections import OrderedDict
+
+
+class TextCache:
+    """
+    Caches the surfaces produced by pygame.font.Font.render so that text which does not
+    change between frames (labels, button captions, numbers, saved beat names) is
+    rasterized only once. Entries are keyed by (font, text, color, antialias) and evicted
+    least-recently-used once max_entries is reached.
+    The returned surfaces are shared: blit them, but do not draw on them.
+    """
+
+    def __init__(self, max_entries=512):
+        """
+        :param max_entries: Maximum number of surfaces kept in the cache.
+        :raises ValueError: If max_entries is smaller than 1.
+        """
+        if int(max_entries) < 1:
+            raise ValueError("max_entries must be at least 1")
+        self.max_entries = int(max_entries)
+        self._surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def render(self, font, text, antialias, color):
+        """
+        Same arguments as font.render(text, antialias, color), served from the cache.
+
+        :return: The rendered pygame.Surface.
+        """
+        key = (font, text, tuple(color), bool(antialias))
+        surface = self._surfaces.get(key)
+        if surface is not None:
+            self._surfaces.move_to_end(key)
+            self.hits += 1
+            return surface
+        self.misses += 1
+        surface = font.render(text, antialias, color)
+        self._surfaces[key] = surface
+        if len(self._surfaces) > self.max_entries:
+            self._surfaces.popitem(last=False)
+            self.evictions += 1
+        return surface
+
+    def clear(self):
+        """Drops every cached surface (counters are kept)."""
+        self._surfaces.clear()
+
+    def stats(self):
+        """Returns a dict with entries, hits, misses, evictions and hit_rate."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._surfaces),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def __len__(self):
+        return len(self._surfaces)
+
+
+# """One cache shared by the UIManager and every menu."""
+_shared_cache = TextCache()
+
+
+def get_text_cache():
+    """Returns the shared TextCache used by all UI code."""
+    return _shared_cache
+
+
+def render_text(font, text, antialias, color):
+    """Renders text through the shared cache (drop-in for font.render(text, antialias, color))."""
+    return _shared_cache.render(font, text, antialias, color)
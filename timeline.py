@@ -0,0 +1,221 @@
+# -----------------------------------------------------------------------------
+# """Timeline: the pattern compiled to a sorted, tick-accurate event list (PPQ 960)"""
+# -----------------------------------------------------------------------------
+from bisect import bisect_left, insort
+
+import numpy as np
+
+from pattern_grid import mask_bits
+
+# """ticks per step (the app's bpm counts steps, so one step is one beat)"""
+PPQ = 960
+# """swing in percent of a step pair: 50 is straight, 66 a triplet feel, 75 the hardest shuffle"""
+SWING_MIN = 50
+SWING_MAX = 75
+# """event kinds; markers sort first at a tick, so the playhead moves before nudged notes of other steps"""
+MARKER = 0
+NOTE = 1
+
+
+class Timeline:
+    """
+    Compiles a PatternGrid into one list of events sorted by tick, so the scheduler walks it
+    with an index: finding the next notes never scans the grid, whatever the timing details.
+
+    Step s sits at tick s * ppq and is moved by:
+    - its step offset (ticks, moves every note of the step),
+    - swing: odd steps are delayed by (swing - 50) / 50 * ppq ticks,
+    - the nudge of a single note (ticks, one instrument on one step).
+    Every step compiles to one marker event (it moves the playhead and carries the notes that
+    are not nudged) plus one note event per distinct nudge of its notes. Events are tuples
+    (tick, kind, step, mask, shift): tick inside the loop (wrapped), MARKER or NOTE, the
+    step, the instruments it plays and how far (ticks) it was moved from the step's grid
+    position. Offsets and nudges are limited to half a step either way.
+
+    A full compile is vectorized (length changes, swing, a new grid). Toggling a cell,
+    offsetting a step or nudging a note recompiles only that step: its old events are found
+    by bisection and replaced in place.
+    """
+
+    def __init__(self, grid, ppq=PPQ, swing=SWING_MIN):
+        """
+        :param grid: The PatternGrid to follow (edited in place by the Sequencer).
+        :param ppq: Ticks per step.
+        :param swing: Swing in percent (SWING_MIN..SWING_MAX).
+        """
+        self.ppq = max(2, int(ppq))
+        self.swing = max(SWING_MIN, min(SWING_MAX, float(swing)))
+        self._grid = grid
+        # """step -> offset ticks; step -> {instrument: nudge ticks} (only the non-zero ones)"""
+        self._offsets = {}
+        self._nudges = {}
+        # """step -> the events it compiled to, so a recompile can find and remove them"""
+        self._step_events = {}
+        self.events = []
+        self.version = 0
+        self.compile()
+
+    # ---------------------------
+    # """Properties"""
+    # ---------------------------
+    @property
+    def grid(self):
+        return self._grid
+
+    @property
+    def beats(self):
+        return self._grid.beats
+
+    @property
+    def loop_ticks(self):
+        return self._grid.beats * self.ppq
+
+    @property
+    def limit(self):
+        """Largest offset or nudge, in ticks, either way."""
+        return self.ppq // 2
+
+    def __len__(self):
+        return len(self.events)
+
+    def index_at(self, tick):
+        """Index of the first event at or after tick (len(self) if there is none)."""
+        return bisect_left(self.events, (tick,))
+
+    def swing_ticks(self, step):
+        """How far swing delays step (odd steps only)."""
+        if step % 2 == 0:
+            return 0
+        return int(round((self.swing - 50.0) / 50.0 * self.ppq))
+
+    def step_offset(self, step):
+        return self._offsets.get(step, 0)
+
+    def nudge(self, instrument, step):
+        return self._nudges.get(step, {}).get(instrument, 0)
+
+    def lead_in(self, step):
+        """How many ticks the earliest note of step sounds before the step's grid position (0 if none does)."""
+        return max([0] + [-event[4] for event in self._step_events.get(step, ())])
+
+    def timing(self):
+        """Copies of the step offsets and nudges ({step: ticks}, {step: {instrument: ticks}}) for the UI."""
+        return dict(self._offsets), {step: dict(n) for step, n in self._nudges.items()}
+
+    # ---------------------------
+    # """Timing edits"""
+    # ---------------------------
+    def set_grid(self, grid):
+        """Follows another grid; offsets and nudges belong to the old pattern and are dropped."""
+        self._grid = grid
+        self._offsets.clear()
+        self._nudges.clear()
+        self.compile()
+
+    def set_swing(self, swing):
+        swing = max(SWING_MIN, min(SWING_MAX, float(swing)))
+        if swing != self.swing:
+            self.swing = swing
+            self.compile()
+
+    def set_step_offset(self, step, ticks):
+        """Moves every note of step by ticks (0 puts it back on the grid)."""
+        if not 0 <= step < self.beats:
+            return
+        ticks = max(-self.limit, min(self.limit, int(ticks)))
+        if ticks:
+            self._offsets[step] = ticks
+        else:
+            self._offsets.pop(step, None)
+        self.update_step(step)
+
+    def set_nudge(self, instrument, step, ticks):
+        """Moves one note by ticks (0 puts it back with the rest of its step)."""
+        if not 0 <= step < self.beats or not 0 <= instrument < self._grid.instruments:
+            return
+        ticks = max(-self.limit, min(self.limit, int(ticks)))
+        nudges = self._nudges.setdefault(step, {})
+        if ticks:
+            nudges[instrument] = ticks
+        else:
+            nudges.pop(instrument, None)
+            if not nudges:
+                del self._nudges[step]
+        self.update_step(step)
+
+    # ---------------------------
+    # """Compiling"""
+    # ---------------------------
+    def compile(self):
+        """Rebuilds the whole event list (after a length change, swing, or a new/rotated/cleared grid)."""
+        beats = self.beats
+        ppq = self.ppq
+        loop = beats * ppq
+        # """offsets and nudges past the end of a shortened pattern are gone"""
+        for table in (self._offsets, self._nudges):
+            for step in [s for s in table if s >= beats]:
+                del table[step]
+        steps = np.arange(beats, dtype=np.int64)
+        shift = np.zeros(beats, dtype=np.int64)
+        shift[1::2] = self.swing_ticks(1)
+        for step, ticks in self._offsets.items():
+            shift[step] += ticks
+        masks = self._grid.masks[:beats].astype(np.uint64)
+        ticks = steps * ppq + shift
+        kinds = np.full(beats, MARKER, dtype=np.int64)
+        extra = []
+        for step, nudges in self._nudges.items():
+            for tick, mask in self._nudged(step, int(masks[step]), nudges):
+                masks[step] &= np.uint64(~mask & 0xFFFFFFFFFFFFFFFF)
+                extra.append((int(ticks[step]) + tick, step, mask, int(shift[step]) + tick))
+        all_ticks = np.concatenate([ticks, np.array([e[0] for e in extra], dtype=np.int64)]) % loop
+        all_kinds = np.concatenate([kinds, np.full(len(extra), NOTE, dtype=np.int64)])
+        all_steps = np.concatenate([steps, np.array([e[1] for e in extra], dtype=np.int64)])
+        all_shift = np.concatenate([shift, np.array([e[3] for e in extra], dtype=np.int64)])
+        all_masks = masks.tolist() + [e[2] for e in extra]
+        order = np.lexsort((all_steps, all_kinds, all_ticks))
+        self.events = [(t, k, s, all_masks[i], sh) for t, k, s, i, sh in
+                       zip(all_ticks[order].tolist(), all_kinds[order].tolist(), all_steps[order].tolist(),
+                           order.tolist(), all_shift[order].tolist())]
+        self._step_events = {}
+        for event in self.events:
+            self._step_events.setdefault(event[2], []).append(event)
+        self.version += 1
+
+    def update_step(self, step):
+        """Recompiles one step (after a cell toggle, offset or nudge) without touching the others."""
+        if not 0 <= step < self.beats:
+            return
+        events = self.events
+        for event in self._step_events.get(step, ()):
+            i = bisect_left(events, event[:3])
+            while events[i] != event:
+                i += 1
+            del events[i]
+        new = self._compile_step(step)
+        for event in new:
+            insort(events, event)
+        self._step_events[step] = new
+        self.version += 1
+
+    def _compile_step(self, step):
+        loop = self.loop_ticks
+        shift = self.swing_ticks(step) + self._offsets.get(step, 0)
+        base = step * self.ppq + shift
+        mask = self._grid.step_mask(step)
+        events = []
+        for tick, nudged in self._nudged(step, mask, self._nudges.get(step, {})):
+            mask &= ~nudged
+            events.append(((base + tick) % loop, NOTE, step, nudged, shift + tick))
+        events.insert(0, (base % loop, MARKER, step, mask, shift))
+        return events
+
+    @staticmethod
+    def _nudged(step, mask, nudges):
+        """(nudge ticks, instrument mask) for the notes of a step that are on and nudged."""
+        by_tick = {}
+        for instrument in mask_bits(mask):
+            ticks = nudges.get(instrument)
+            if ticks:
+                by_tick[ticks] = by_tick.get(ticks, 0) | (1 << instrument)
+        return sorted(by_tick.items())
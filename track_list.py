@@ -0,0 +1,141 @@
+# -----------------------------------------------------------------------------
+# """TrackList: the instrument tracks (name, sample, color, gain) the app is built from"""
+# -----------------------------------------------------------------------------
+import json
+
+from pattern_grid import MAX_INSTRUMENTS
+
+
+class Track:
+    """One instrument row: what the label says, which sample it plays and how loud."""
+    __slots__ = ("name", "sample", "color", "gain", "priority", "choke")
+
+    def __init__(self, name, sample, color=(255, 255, 255), gain=1.0, priority=0, choke=None):
+        """
+        :param name: Label shown next to the row.
+        :param sample: Path of the WAV file (matched case-insensitively).
+        :param color: RGB color of the row's label and its 'on' cells while unmuted.
+        :param gain: Linear volume of the sample (0.0 to 1.0).
+        :param priority: Voice stealing priority; higher priority voices are stolen last (see VoicePool).
+        :param choke: Optional choke group name; a hit of one track of the group cuts the others
+        (e.g. a closed hi-hat and an open one both in "hat").
+        :raises ValueError: If color or gain is out of range.
+        """
+        self.name = str(name)
+        self.sample = str(sample)
+        self.color = tuple(int(c) for c in color)
+        self.gain = float(gain)
+        self.priority = int(priority)
+        self.choke = str(choke) if choke is not None else None
+        if len(self.color) != 3 or not all(0 <= c <= 255 for c in self.color):
+            raise ValueError(f"color of track {self.name!r} must be three values between 0 and 255")
+        if not 0.0 <= self.gain <= 1.0:
+            raise ValueError(f"gain of track {self.name!r} must be between 0.0 and 1.0")
+
+    def to_dict(self):
+        data = {"name": self.name, "sample": self.sample, "color": list(self.color),
+                "gain": self.gain, "priority": self.priority}
+        if self.choke is not None:
+            data["choke"] = self.choke
+        return data
+
+    def __repr__(self):
+        return f"Track(name={self.name!r}, sample={self.sample!r})"
+
+
+# """The built-in kit, in instrument order (saved beats and presets use this row order)."""
+DEFAULT_TRACKS = (
+    Track('Hi Hat', 'sounds/hi hat.wav', priority=0),
+    Track('Snare', 'sounds/snare.wav', priority=2),
+    Track('Bass Drum', 'sounds/kick.wav', priority=2),
+    Track('Crash', 'sounds/crash.wav', priority=1),
+    Track('Clap', 'sounds/clap.wav', priority=1),
+    Track('Floor Tom', 'sounds/tom.wav', priority=1),
+)
+
+
+class TrackList:
+    """
+    Ordered list of tracks; track i is instrument i everywhere (grid row, bit i of a step
+    mask, sound index). Everything that used to assume six instruments reads its
+    per-track values from here, so a kit can have anywhere from 1 to 64 tracks.
+
+    A kit file is a JSON list of track objects:
+    [{"name": "Hi Hat", "sample": "sounds/hi hat.wav", "color": [255, 255, 255], "gain": 1.0}, ...]
+    "priority" and "choke" (a group name shared by tracks that cut each other off) are optional.
+    """
+
+    def __init__(self, tracks=DEFAULT_TRACKS):
+        """
+        :param tracks: Iterable of Track objects.
+        :raises ValueError: If there are no tracks or more than MAX_INSTRUMENTS.
+        """
+        self._tracks = list(tracks)
+        if not 1 <= len(self._tracks) <= MAX_INSTRUMENTS:
+            raise ValueError(f"a track list needs between 1 and {MAX_INSTRUMENTS} tracks")
+
+    @classmethod
+    def from_file(cls, path):
+        """
+        Reads a kit file.
+
+        :raises ValueError: If the file is not a list of valid track objects.
+        :raises OSError: If the file cannot be read.
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if not isinstance(data, list):
+            raise ValueError("a kit file must hold a JSON list of tracks")
+        tracks = []
+        for item in data:
+            if not isinstance(item, dict) or not isinstance(item.get("name"), str) \
+                    or not isinstance(item.get("sample"), str):
+                raise ValueError("every track needs a name and a sample")
+            tracks.append(Track(item["name"], item["sample"], item.get("color", (255, 255, 255)),
+                                item.get("gain", 1.0), item.get("priority", 0), item.get("choke")))
+        return cls(tracks)
+
+    def to_file(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump([t.to_dict() for t in self._tracks], f, indent=2)
+
+    def __len__(self):
+        return len(self._tracks)
+
+    def __getitem__(self, index):
+        return self._tracks[index]
+
+    def __iter__(self):
+        return iter(self._tracks)
+
+    # ---------------------------
+    # """Per-track columns, in instrument order"""
+    # ---------------------------
+    @property
+    def names(self):
+        return [t.name for t in self._tracks]
+
+    @property
+    def samples(self):
+        return [t.sample for t in self._tracks]
+
+    @property
+    def colors(self):
+        return [t.color for t in self._tracks]
+
+    @property
+    def gains(self):
+        return [t.gain for t in self._tracks]
+
+    @property
+    def priorities(self):
+        return [t.priority for t in self._tracks]
+
+    @property
+    def choke_groups(self):
+        """Instrument index tuples of the tracks sharing a choke group name (see VoicePool)."""
+        groups = {}
+        for i, t in enumerate(self._tracks):
+            if t.choke is not None:
+                groups.setdefault(t.choke, []).append(i)
+        return [tuple(group) for group in groups.values() if len(group) > 1]
@@ -0,0 +1,171 @@
+# -----------------------------------------------------------------------------
+# """TriggerTelemetry: intended vs actual note trigger times, per instrument"""
+# -----------------------------------------------------------------------------
+import csv
+import json
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+class TriggerTelemetry:
+    """
+    Records, for every note, when it should have played (the scheduler's target time,
+    derived from bpm and step index) and when it actually did, and keeps a live lateness
+    histogram per instrument.
+
+    The histogram has fixed bucket_ms wide bins up to max_ms plus one overflow bin, so
+    recording is O(1) and percentiles stay cheap however long the app runs. The most
+    recent raw samples are kept as well for dumps. record() may be called from any thread.
+    """
+
+    def __init__(self, instruments, names=None, bucket_ms=0.1, max_ms=50.0, keep_samples=20000,
+                 clock=time.perf_counter):
+        """
+        :param instruments: Number of instruments (histogram rows).
+        :param names: Optional instrument names used in dumps.
+        :param bucket_ms: Width of one histogram bin in milliseconds.
+        :param max_ms: Lateness covered by the regular bins; anything later goes to the overflow bin.
+        :param keep_samples: How many raw (instrument, intended, actual) samples to keep for dumps.
+        :param clock: The clock the intended times come from (must be the scheduler's clock).
+        :raises ValueError: If bucket_ms or max_ms is not positive.
+        """
+        if bucket_ms <= 0 or max_ms <= 0:
+            raise ValueError("bucket_ms and max_ms must be positive")
+        self.instruments = int(instruments)
+        self.names = list(names) if names else [f"instrument {i}" for i in range(self.instruments)]
+        self.bucket_ms = float(bucket_ms)
+        self.max_ms = float(max_ms)
+        self.clock = clock
+        self._bins = int(np.ceil(self.max_ms / self.bucket_ms))
+        self._histogram = np.zeros((self.instruments, self._bins + 1), dtype=np.int64)
+        self._sum_ms = np.zeros(self.instruments, dtype=np.float64)
+        self._max_ms = np.zeros(self.instruments, dtype=np.float64)
+        self._early = np.zeros(self.instruments, dtype=np.int64)
+        self._samples = deque(maxlen=int(keep_samples))
+        self._lock = threading.Lock()
+
+    # ---------------------------
+    # """Recording"""
+    # ---------------------------
+    def record(self, instrument_index, intended_time, actual_time=None):
+        """
+        Adds one trigger. Times are in seconds on self.clock; actual_time defaults to now.
+        Early triggers (negative lateness) are counted and filed in the first bin.
+        """
+        if actual_time is None:
+            actual_time = self.clock()
+        if not 0 <= instrument_index < self.instruments:
+            return
+        late_ms = (actual_time - intended_time) * 1000.0
+        index = min(int(late_ms / self.bucket_ms), self._bins) if late_ms > 0 else 0
+        with self._lock:
+            self._histogram[instrument_index, index] += 1
+            self._sum_ms[instrument_index] += late_ms
+            if late_ms > self._max_ms[instrument_index]:
+                self._max_ms[instrument_index] = late_ms
+            if late_ms < 0:
+                self._early[instrument_index] += 1
+            self._samples.append((instrument_index, intended_time, actual_time))
+
+    def record_many(self, instrument_indices, intended_time, actual_time=None):
+        """Records several instruments that were triggered together (e.g. one pre-mixed step)."""
+        if actual_time is None:
+            actual_time = self.clock()
+        for i in instrument_indices:
+            self.record(i, intended_time, actual_time)
+
+    def reset(self):
+        with self._lock:
+            self._histogram[:] = 0
+            self._sum_ms[:] = 0.0
+            self._max_ms[:] = 0.0
+            self._early[:] = 0
+            self._samples.clear()
+
+    # ---------------------------
+    # """Statistics"""
+    # ---------------------------
+    def histogram(self, instrument_index=None):
+        """
+        Bin counts (a copy): one row per instrument, or the total over all instruments.
+        Bin i covers [i * bucket_ms, (i + 1) * bucket_ms) ms; the last bin is everything beyond max_ms.
+        """
+        with self._lock:
+            if instrument_index is None:
+                return self._histogram.sum(axis=0)
+            return self._histogram[instrument_index].copy()
+
+    def _percentile_ms(self, counts, q, max_ms):
+        total = int(counts.sum())
+        if total == 0:
+            return 0.0
+        index = int(np.searchsorted(np.cumsum(counts), q / 100.0 * total))
+        if index >= self._bins:
+            return float(max_ms)
+        # """upper edge of the bin: a conservative (never optimistic) estimate"""
+        return min((index + 1) * self.bucket_ms, float(max_ms))
+
+    def stats(self, instrument_index=None, percentiles=(50, 95, 99)):
+        """
+        Lateness statistics for one instrument or all of them.
+
+        :return: dict with count, early, mean_ms, max_ms and p<q>_ms for each requested percentile
+        (read from the histogram, so accurate to bucket_ms).
+        """
+        with self._lock:
+            if instrument_index is None:
+                counts = self._histogram.sum(axis=0)
+                total_ms = float(self._sum_ms.sum())
+                max_ms = float(self._max_ms.max()) if self.instruments else 0.0
+                early = int(self._early.sum())
+            else:
+                counts = self._histogram[instrument_index].copy()
+                total_ms = float(self._sum_ms[instrument_index])
+                max_ms = float(self._max_ms[instrument_index])
+                early = int(self._early[instrument_index])
+        count = int(counts.sum())
+        result = {"count": count, "early": early,
+                  "mean_ms": total_ms / count if count else 0.0, "max_ms": max_ms}
+        for q in percentiles:
+            result[f"p{q}_ms"] = self._percentile_ms(counts, q, max_ms)
+        return result
+
+    def summary(self):
+        """Stats for every instrument (by name) plus an 'all' entry."""
+        result = {"all": self.stats()}
+        for i, name in enumerate(self.names[:self.instruments]):
+            result[name] = self.stats(i)
+        return result
+
+    # ---------------------------
+    # """Dump"""
+    # ---------------------------
+    def dump(self, path):
+        """
+        Writes the telemetry: raw samples as CSV, or summary, histograms and samples as JSON (.json).
+        """
+        with self._lock:
+            samples = list(self._samples)
+            histogram = self._histogram.copy()
+        try:
+            with open(path, 'w', encoding='utf-8', newline='') as f:
+                if path.lower().endswith(".json"):
+                    json.dump({
+                        "bucket_ms": self.bucket_ms,
+                        "max_ms": self.max_ms,
+                        "summary": self.summary(),
+                        "histograms": {name: histogram[i].tolist()
+                                       for i, name in enumerate(self.names[:self.instruments])},
+                        "samples": [[i, intended, actual] for i, intended, actual in samples],
+                    }, f)
+                else:
+                    writer = csv.writer(f)
+                    writer.writerow(["instrument", "name", "intended_s", "actual_s", "late_ms"])
+                    for i, intended, actual in samples:
+                        writer.writerow([i, self.names[i], f"{intended:.6f}", f"{actual:.6f}",
+                                         f"{(actual - intended) * 1000.0:.3f}"])
+        except OSError as exc:
+            print("Error writing trigger telemetry:", exc)
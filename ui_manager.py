@@ -1,5 +1,11 @@
+import numpy as np
 import pygame
 
+from grid_layout import GridLayout
+from pattern_grid import PatternGrid
+from text_cache import render_text
+from track_list import TrackList
+
 
 # -------------------------
 # """Color and Size Variables"""
@@ -17,145 +23,400 @@ WIDTH = 1400
 HEIGHT = 800
 
 
+# """Color key for the transparent parts of pre-rendered sprites (never used by the UI itself)."""
+_SPRITE_KEY = (255, 0, 255)
+
+
+class CellSprites:
+    """
+    Pre-rendered grid cell sprites: off, on-active and on-muted cells, plus the playhead
+    column outline. Each sprite is drawn once with exactly the same rect calls the grid
+    used to issue per cell, on a color-keyed background so that anything underneath the
+    rounded corners still shows through. Sprites are rebuilt only when the cell size
+    (or, for the playhead, the number of visible rows) changes. On-active cells take the
+    color of their track and are built the first time a color is used.
+    """
+    OFF = 0
+    ON = 1
+    MUTED = 2
+
+    def __init__(self):
+        self.step_width = None
+        self.row_height = None
+        self.instruments_count = None
+        self.cells = []
+        self._on_cells = {}
+        self.playhead = None
+        self.builds = 0
+
+    def ensure(self, step_width, instruments_count, row_height=100):
+        """Rebuilds the sprites if the cell size or the visible row count changed."""
+        if (step_width, row_height, instruments_count) == (self.step_width, self.row_height, self.instruments_count):
+            return
+        if (step_width, row_height) != (self.step_width, self.row_height):
+            self.cells = [self._build_cell(color, step_width, row_height) for color in (gray, white, dark_gray)]
+            self._on_cells = {white: self.cells[CellSprites.ON]}
+        self.playhead = self._build_playhead(step_width, instruments_count * row_height)
+        self.step_width = step_width
+        self.row_height = row_height
+        self.instruments_count = instruments_count
+        self.builds += 1
+
+    def on_cell(self, color):
+        """The on-active cell sprite in a track color."""
+        sprite = self._on_cells.get(color)
+        if sprite is None:
+            sprite = self._on_cells[color] = self._build_cell(color, self.step_width, self.row_height)
+        return sprite
+
+    @staticmethod
+    def _keyed_surface(width, height):
+        surface = pygame.Surface((max(1, width), max(1, height)))
+        surface.fill(_SPRITE_KEY)
+        return surface
+
+    @staticmethod
+    def _finish(surface):
+        surface.set_colorkey(_SPRITE_KEY, pygame.RLEACCEL)
+        return surface
+
+    def _build_cell(self, color, step_width, row_height):
+        surface = self._keyed_surface(step_width, row_height)
+        # """Inner colored rectangle, gold border, black inner border (same calls as the live grid)."""
+        if step_width > 10:
+            pygame.draw.rect(surface, color, [5, 5, step_width - 10, row_height - 10], 0, 3)
+        pygame.draw.rect(surface, gold, [0, 0, step_width, row_height], 5, 5)
+        pygame.draw.rect(surface, black, [0, 0, step_width, row_height], 2, 5)
+        return self._finish(surface)
+
+    def _build_playhead(self, step_width, height):
+        surface = self._keyed_surface(step_width, height)
+        pygame.draw.rect(surface, blue, [0, 0, step_width, height], 5, 3)
+        return self._finish(surface)
+
+
 class UIManager:
     """
     Handles drawing the entire user interface for the digital beat workstation, 
     including the step sequencer grid and all control buttons.
     """
     
-    def __init__(self, screen, label_font, medium_font):
-        """Initializes the UIManager with the Pygame screen object and required fonts."""
+    def __init__(self, screen, label_font, medium_font, tracks=None):
+        """
+        Initializes the UIManager with the Pygame screen object and required fonts.
+
+        :param tracks: TrackList giving each row its label and color (defaults to the built-in kit).
+        """
         self.screen = screen
         self.label_font = label_font
         self.medium_font = medium_font
+        self.tracks = tracks if tracks is not None else TrackList()
+
+        # """Retained-mode state: what is currently on screen (see render_frame)."""
+        self.controls = {}
+        self.layout = GridLayout(left=200, grid_width=WIDTH - 200, grid_height=HEIGHT - 200, row_height=100,
+                                 cell_margin=5)
+        self._needs_full_redraw = True
+        self._shown_layout = None
+        self._shown_masks = None
+        self._shown_beat = None
+        self._shown_actives = None
+        self._shown_bottom = None
+        self.sprites = CellSprites()
+        # """optional FrameProfiler (set by the app); laps draw_grid / draw_bottom_menu when enabled"""
+        self.profiler = None
+
+    # ---------------------------
+    # """Retained-mode rendering"""
+    # ---------------------------
+    def invalidate(self):
+        """Forces the next render_frame to repaint the whole screen (e.g. after a menu closed)."""
+        self._needs_full_redraw = True
+
+    def scroll_rows(self, delta):
+        """Scrolls the track rows by delta (positive = down) when there are more than fit on screen."""
+        if self.layout.scroll_to(self.layout.first_row + int(delta)):
+            self._needs_full_redraw = True
+
+    def scroll_steps(self, delta):
+        """Scrolls the visible steps by delta (positive = later) when the pattern is wider than the screen."""
+        if self.layout.scroll_steps_to(self.layout.first_step + int(delta)):
+            self._needs_full_redraw = True
 
+    def zoom(self, factor):
+        """Shows factor times as many steps (0.5 zooms in, 2 zooms out)."""
+        if self.layout.zoom(factor):
+            self._needs_full_redraw = True
+
+    def render_frame(self, clicks, beat_index, actives, instruments_count, beats_count, bpm_value, playing,
+                     swing=50, timing_text=''):
+        """
+        Repaints only what changed since the previous call and returns the dirty rectangles,
+        ready for pygame.display.update(rects). A grid column is repainted when one of its
+        visible cells changed or the playhead entered/left it; the side panel and grid are
+        repainted when a track is muted; the bottom menu when bpm, beats, play state, swing or
+        the timing text changed.
+        Layout changes (beats or instrument count, scrolling, zoom) repaint everything.
+        Only the steps and rows on screen are compared and drawn, so the cost of a frame does
+        not grow with the pattern length. When the playhead runs off the right edge of the
+        visible steps, the view pages along with it (unless it was scrolled away from it).
+
+        :return: A list of pygame.Rect areas that were repainted (empty if nothing changed).
+        """
+        if beats_count <= 0:
+            beats_count = 1
+        view = self.layout
+        view.update(instruments_count, beats_count)
+        if (beat_index != self._shown_beat and self._shown_beat is not None
+                and view.step_visible(self._shown_beat) and not view.step_visible(beat_index)):
+            # """follow the playhead to its page"""
+            view.scroll_steps_to(beat_index)
+        layout = (instruments_count, beats_count, view.first_row, view.first_step, view.visible_steps)
+        masks = self._masks_of(clicks, beats_count)[view.first_step:view.first_step + view.visible_steps]
+        actives_now = tuple(actives)
+        bottom_now = (beats_count, bpm_value, bool(playing), swing, timing_text)
+
+        prof = self.profiler if self.profiler is not None and self.profiler.enabled else None
+
+        if (self._needs_full_redraw or layout != self._shown_layout
+                or self._shown_masks is None or masks.shape != self._shown_masks.shape):
+            self.screen.fill(red)
+            self.draw_grid(clicks, beat_index, actives, instruments_count, beats_count)
+            if prof:
+                prof.lap("draw_grid")
+            self.controls = self.draw_bottom_menu(beats_count, bpm_value, playing, swing, timing_text)
+            self.layout.set_controls(self.controls)
+            if prof:
+                prof.lap("draw_bottom_menu")
+            dirty = [self.screen.get_rect()]
+        else:
+            dirty = []
+            step_width = self.layout.step_width
+            if actives_now != self._shown_actives:
+                # """Mute changes recolor labels and every 'on' cell of the track: repaint the grid area."""
+                area = pygame.Rect(0, 0, WIDTH, HEIGHT - 200)
+                self.screen.fill(red, area)
+                self.draw_grid(clicks, beat_index, actives, instruments_count, beats_count)
+                dirty.append(area)
+            else:
+                # """only edits in the rows on screen need a repaint"""
+                changed = (masks ^ self._shown_masks) & np.uint64(self._visible_mask())
+                columns = set((np.flatnonzero(changed) + view.first_step).tolist())
+                if beat_index != self._shown_beat:
+                    columns.add(self._shown_beat)
+                    columns.add(beat_index)
+                for step in sorted(columns):
+                    if view.step_visible(step):
+                        dirty.append(self._redraw_column(clicks, step, beat_index, actives, step_width))
+            if prof:
+                prof.lap("draw_grid")
+            if bottom_now != self._shown_bottom:
+                area = pygame.Rect(0, HEIGHT - 200, WIDTH, 200)
+                self.screen.fill(red, area)
+                pygame.draw.rect(self.screen, gray, [0, HEIGHT - 200, WIDTH, 200], 5)
+                self.controls = self.draw_bottom_menu(beats_count, bpm_value, playing, swing, timing_text)
+                self.layout.set_controls(self.controls)
+                dirty.append(area)
+                if prof:
+                    prof.lap("draw_bottom_menu")
+
+        self._needs_full_redraw = False
+        self._shown_layout = layout
+        self._shown_masks = masks.copy()
+        self._shown_beat = beat_index
+        self._shown_actives = actives_now
+        self._shown_bottom = bottom_now
+        return dirty
+
+    def _visible_mask(self):
+        """Instrument bitmask of the rows on screen."""
+        return ((1 << self.layout.visible_rows) - 1) << self.layout.first_row
+
+    @staticmethod
+    def _masks_of(clicks, beats_count):
+        """Per-step instrument bitmasks of the grid (PatternGrid or list of lists)."""
+        if isinstance(clicks, PatternGrid):
+            return clicks.masks
+        return PatternGrid.from_lists(clicks, beats=beats_count).masks
+
+    def _redraw_column(self, clicks, step, beat_index, actives, step_width):
+        """Repaints one grid column (cells, plus the playhead if it is on this column)."""
+        layout = self.layout
+        area = pygame.Rect(layout.column_left(step), 0, step_width, layout.visible_rows * layout.row_height)
+        self.screen.fill(red, area)
+        if step == 0:
+            # """the side panel row lines reach x=200 and show through the first column's rounded corners"""
+            self._draw_row_lines()
+        self.sprites.ensure(step_width, layout.visible_rows, layout.row_height)
+        mask = int(self._masks_of(clicks, step + 1)[step])
+        self.screen.blits(self._column_blits(mask, actives, step, step_width), False)
+        if step == beat_index:
+            self._draw_playhead(beat_index, step_width)
+        return area
+
+    def _column_blits(self, mask, actives, step, step_width):
+        """(sprite, position) pairs for every visible cell of one column."""
+        sprites = self.sprites
+        off, muted = sprites.cells[CellSprites.OFF], sprites.cells[CellSprites.MUTED]
+        colors = self.tracks.colors
+        x = self.layout.column_left(step)
+        row_height = self.layout.row_height
+        first = self.layout.first_row
+        blits = []
+        for j in self.layout.visible_range():
+            if not (mask >> j) & 1: # Note is OFF
+                sprite = off
+            elif actives[j] == 1: # Instrument is active
+                sprite = sprites.on_cell(colors[j]) if j < len(colors) else sprites.cells[CellSprites.ON]
+            else: # Instrument is muted
+                sprite = muted
+            blits.append((sprite, (x, (j - first) * row_height)))
+        return blits
+
+    def _draw_row_lines(self):
+        """Horizontal lines that separate the visible instrument rows on the side panel."""
+        row_height = self.layout.row_height
+        for i in range(self.layout.visible_rows + 1):
+            pygame.draw.line(self.screen, gray, (0, i * row_height), (200, i * row_height), 3)
+
+    # ---------------------------
+    # """Full drawing"""
+    # ---------------------------
     def draw_grid(self, clicks, beat_index, actives, instruments_count, beats_count):
         """
         Draws the main drum pattern grid, including instrument names and the active beat marker.
+        Only the rows and steps in the layout's visible ranges are drawn (see GridLayout).
 
         :param clicks: 2D array representing note placements (1=on, -1=off).
         :param beat_index: Index of the current step in the sequence.
         :param actives: 1D array indicating which instruments are muted (1=active, -1=muted).
-        :param instruments_count: Total number of instrument rows (fixed at 6 in the app).
+        :param instruments_count: Total number of instrument rows (one per track).
         :param beats_count: Total number of beat columns (measure length).
-        :return: A list of (pygame.Rect, (step_i, instr_j)) for clickable grid cells.
+        Click positions are resolved by self.layout (see GridLayout), so no per-cell
+        rectangles are allocated here.
         """
-        boxes = []
-        
+        # """Calculate grid cell properties."""
+        if beats_count <= 0:
+            beats_count = 1
+        layout = self.layout
+        layout.update(instruments_count, beats_count)
+        step_width = layout.step_width
+        row_height = layout.row_height
+
         # """Draw the side panel for instrument names and the bottom control panel."""
         pygame.draw.rect(self.screen, gray, [0, 0, 200, HEIGHT - 200], 5) 
         pygame.draw.rect(self.screen, gray, [0, HEIGHT - 200, WIDTH, 200], 5) 
         
         # """Draw horizontal lines to separate instrument rows on the side panel."""
-        for i in range(instruments_count + 1):
-            pygame.draw.line(self.screen, gray, (0, i * 100), (200, i * 100), 3) 
+        self._draw_row_lines()
 
+        # """Draw instrument names in their track color, gray while muted; small rows use the smaller font."""
+        font = self.label_font if row_height >= 70 else self.medium_font
+        for j in layout.visible_range():
+            track = self.tracks[j] if j < len(self.tracks) else None
+            name = track.name if track is not None else f'Track {j + 1}'
+            color = (track.color if track is not None else white) if actives[j] == 1 else gray
+            text = render_text(font, name, True, color)
+            self.screen.blit(text, (30, layout.row_top(j) + (row_height - text.get_height()) // 2))
 
-        # """Define colors for instrument text based on their active/muted state."""
-        colors = [gray, white, gray]
-        
-        # """Draw instrument names and reflect mute status in text color."""
-        hi_hat_text = self.label_font.render('Hi Hat', True, colors[actives[0]])
-        self.screen.blit(hi_hat_text, (30, 30)) 
-        snare_text = self.label_font.render('Snare', True, colors[actives[1]])
-        self.screen.blit(snare_text, (30, 130))
-        kick_text = self.label_font.render('Bass Drum', True, colors[actives[2]])
-        self.screen.blit(kick_text, (30, 230))
-        crash_text = self.label_font.render('Crash', True, colors[actives[3]])
-        self.screen.blit(crash_text, (30, 330))
-        clap_text = self.label_font.render('Clap', True, colors[actives[4]])
-        self.screen.blit(clap_text, (30, 430))
-        tom_text = self.label_font.render('Floor Tom', True, colors[actives[5]])
-        self.screen.blit(tom_text, (30, 530))
-        
+        # """Scroll bar on the side panel when not every row fits."""
+        if layout.visible_rows < instruments_count:
+            track_height = layout.visible_rows * row_height
+            top = track_height * layout.first_row // instruments_count
+            height = max(10, track_height * layout.visible_rows // instruments_count)
+            pygame.draw.rect(self.screen, light_gray, [188, top, 6, height], 0, 3)
         
-        # """Calculate grid cell properties."""
-        if beats_count <= 0:
-            beats_count = 1
-        step_width = (WIDTH - 200) // beats_count 
-        
-        # """Draw individual grid cells."""
-        for i in range(beats_count):
-            for j in range(instruments_count):
-                if clicks[j][i] == -1: # Note is OFF
-                    color = gray
-                else: # Note is ON
-                    if actives[j] == 1: # Instrument is active
-                        color = white
-                    else: # Instrument is muted
-                        color = dark_gray
-                        
-                # """Draw the inner colored rectangle (the note indicator)."""
-                rect = pygame.draw.rect(self.screen, color, 
-                                        [i * step_width + 205, (j * 100) + 5, step_width - 10, 90], 0, 3)
-                # """Draw the gold border around the cell."""
-                pygame.draw.rect(self.screen, gold, [i * step_width + 200, j * 100, step_width, 100], 5, 5)
-                # """Draw the black inner border."""
-                pygame.draw.rect(self.screen, black,
-                                 [i * step_width + 200, j * 100, step_width, 100],2, 5)
-                boxes.append((rect, (i, j)))
-
-        # """Draw the active beat column marker (the moving blue rectangle)."""
-        active_rect = pygame.draw.rect(self.screen, blue, 
-                                       [beat_index * ((WIDTH - 200) // beats_count) + 200, 0,
-                                        ((WIDTH - 200) // beats_count), instruments_count * 100], 5, 3)
-        return boxes
-
-    def draw_bottom_menu(self, beats_count, bpm_value, playing):
+        # """Draw individual grid cells: pre-rendered sprites, blitted in one batch call."""
+        self.sprites.ensure(step_width, layout.visible_rows, row_height)
+        first = layout.first_step
+        masks = self._masks_of(clicks, beats_count)[first:first + layout.visible_steps].tolist()
+        blits = []
+        for i, mask in enumerate(masks):
+            blits.extend(self._column_blits(mask, actives, first + i, step_width))
+        self.screen.blits(blits, False)
+
+        # """Draw the active beat column marker (the moving blue rectangle) if it is on screen."""
+        if layout.step_visible(beat_index):
+            self._draw_playhead(beat_index, step_width)
+
+    def _draw_playhead(self, beat_index, step_width):
+        """Draws the active beat column marker (the moving blue rectangle) from its sprite."""
+        self.sprites.ensure(step_width, self.layout.visible_rows, self.layout.row_height)
+        return self.screen.blit(self.sprites.playhead, (self.layout.column_left(beat_index), 0))
+
+    def draw_bottom_menu(self, beats_count, bpm_value, playing, swing=50, timing_text=''):
         """
         Draws the interactive controls located at the bottom of the screen.
 
         :param beats_count: The current number of beats in the loop.
         :param bpm_value: The current beats per minute value.
         :param playing: Boolean state of playback (True if running).
+        :param swing: Swing in percent (50 is straight).
+        :param timing_text: The last step offset or note nudge, shown on the right.
         :return: A dictionary of control names mapped to their pygame.Rect objects for click handling.
         """
         # """Play/Pause button area."""
         play_pause = pygame.draw.rect(self.screen, gray, [50, HEIGHT - 150, 200, 100], 0, 5)
-        play_text = self.label_font.render('Play/Pause', True, white)
+        play_text = render_text(self.label_font, 'Play/Pause', True, white)
         self.screen.blit(play_text, (70, HEIGHT - 130))
         if playing:
-            play_text2 = self.medium_font.render('Playing', True, dark_gray)
+            play_text2 = render_text(self.medium_font, 'Playing', True, dark_gray)
         else:
-            play_text2 = self.medium_font.render('Paused', True, dark_gray)
+            play_text2 = render_text(self.medium_font, 'Paused', True, dark_gray)
         self.screen.blit(play_text2, (70, HEIGHT - 100))
         
         # """BPM (Beats Per Minute) display and adjustment buttons."""
         bpm_rect = pygame.draw.rect(self.screen, gray, [300, HEIGHT - 150, 200, 100], 5, 5)
-        bpm_text = self.medium_font.render('Beats Per Minute', True, white)
+        bpm_text = render_text(self.medium_font, 'Beats Per Minute', True, white)
         self.screen.blit(bpm_text, (308, HEIGHT - 130))
-        bpm_text2 = self.label_font.render(f'{bpm_value}', True, white)
+        bpm_text2 = render_text(self.label_font, f'{bpm_value}', True, white)
         self.screen.blit(bpm_text2, (370, HEIGHT - 100))
         
         bpm_add_rect = pygame.draw.rect(self.screen, gray, [510, HEIGHT - 150, 48, 48], 0, 5)
         bpm_sub_rect = pygame.draw.rect(self.screen, gray, [510, HEIGHT - 100, 48, 48], 0, 5)
-        self.screen.blit(self.medium_font.render('+5', True, white), (520, HEIGHT - 140))
-        self.screen.blit(self.medium_font.render('-5', True, white), (520, HEIGHT - 90))
+        self.screen.blit(render_text(self.medium_font, '+5', True, white), (520, HEIGHT - 140))
+        self.screen.blit(render_text(self.medium_font, '-5', True, white), (520, HEIGHT - 90))
         
         # """Beats in Loop display and adjustment buttons."""
         beats_rect = pygame.draw.rect(self.screen, gray, [600, HEIGHT - 150, 200, 100], 5, 5)
-        beats_text = self.medium_font.render('Beats In Loop', True, white)
+        beats_text = render_text(self.medium_font, 'Beats In Loop', True, white)
         self.screen.blit(beats_text, (612, HEIGHT - 130))
-        beats_text2 = self.label_font.render(f'{beats_count}', True, white)
+        beats_text2 = render_text(self.label_font, f'{beats_count}', True, white)
         self.screen.blit(beats_text2, (670, HEIGHT - 100))
         
         beats_add_rect = pygame.draw.rect(self.screen, gray, [810, HEIGHT - 150, 48, 48], 0, 5)
         beats_sub_rect = pygame.draw.rect(self.screen, gray, [810, HEIGHT - 100, 48, 48], 0, 5)
-        self.screen.blit(self.medium_font.render('+1', True, white), (820, HEIGHT - 140))
-        self.screen.blit(self.medium_font.render('-1', True, white), (820, HEIGHT - 90))
+        self.screen.blit(render_text(self.medium_font, '+1', True, white), (820, HEIGHT - 140))
+        self.screen.blit(render_text(self.medium_font, '-1', True, white), (820, HEIGHT - 90))
         
         # """Clear Board button."""
         clear = pygame.draw.rect(self.screen, gray, [1150, HEIGHT - 150, 200, 100], 0, 5)
-        self.screen.blit(self.label_font.render('Clear Board', True, white), (1160, HEIGHT - 130))
+        self.screen.blit(render_text(self.label_font, 'Clear Board', True, white), (1160, HEIGHT - 130))
         
         # """Save / Load / Presets buttons."""
         save_button = pygame.draw.rect(self.screen, gray, [900, HEIGHT - 150, 200, 48], 0, 5)
-        self.screen.blit(self.label_font.render('Save Beat', True, white), (920, HEIGHT - 140))
+        self.screen.blit(render_text(self.label_font, 'Save Beat', True, white), (920, HEIGHT - 140))
         load_button = pygame.draw.rect(self.screen, gray, [900, HEIGHT - 98, 200, 48], 0, 5)
-        self.screen.blit(self.label_font.render('Load Beat', True, white), (920, HEIGHT - 90))
+        self.screen.blit(render_text(self.label_font, 'Load Beat', True, white), (920, HEIGHT - 90))
         preset_button = pygame.draw.rect(self.screen, gray, [900, HEIGHT - 200, 200, 48], 0, 5)
-        self.screen.blit(self.label_font.render('Presets', True, white), (920, HEIGHT - 190))
+        self.screen.blit(render_text(self.label_font, 'Presets', True, white), (920, HEIGHT - 190))
+        song_button = pygame.draw.rect(self.screen, gray, [1150, HEIGHT - 200, 200, 48], 0, 5)
+        self.screen.blit(render_text(self.label_font, 'Song', True, white), (1170, HEIGHT - 190))
         
+        # """Which steps are on screen when the pattern is wider than the grid."""
+        layout = self.layout
+        if layout.visible_steps < beats_count:
+            view_text = render_text(self.medium_font, f'Steps {layout.first_step + 1}-'
+                                    f'{layout.first_step + layout.visible_steps} of {beats_count}   '
+                                    f'(+/- zoom, Shift + wheel scrolls)', True, white)
+            self.screen.blit(view_text, (300, HEIGHT - 42))
+
+        # """Swing ([ and ]) and the last offset / nudge (Alt + wheel over a cell)."""
+        swing_text = render_text(self.medium_font, f'Swing {swing:g}%', True, white)
+        self.screen.blit(swing_text, (50, HEIGHT - 42))
+        if timing_text:
+            self.screen.blit(render_text(self.medium_font, timing_text, True, white), (1150, HEIGHT - 42))
+
         # """Return all clickable rectangles."""
         return {
             "play_pause": play_pause,
@@ -166,5 +427,6 @@ class UIManager:
             "clear": clear,
             "save_button": save_button,
             "load_button": load_button,
-            "preset_button": preset_button
+            "preset_button": preset_button,
+            "song_button": song_button
         }
\ No newline at end of file
@@ -0,0 +1,147 @@
+# -----------------------------------------------------------------------------
+# """VoicePool: a fixed set of mixer channels shared by all instruments, with voice stealing"""
+# -----------------------------------------------------------------------------
+import threading
+import time
+
+# """oldest: steal the voice that started first; quietest: the one with the least of its sample left"""
+STEAL_POLICIES = ("oldest", "quietest")
+# """a choked voice is faded out this fast instead of cut, so it does not click"""
+_RELEASE_MS = 8
+
+
+class VoicePool:
+    """
+    Decides which mixer channel plays each note, so dense patterns stay predictable without
+    raising the channel count.
+
+    Every voice (channel) remembers which instrument it plays, when it started and when its
+    sample ends. A new note first cuts the ringing voices of its choke group (e.g. a closed
+    hi-hat cuts the open one), then:
+    - if its instrument already plays polyphony[i] voices, it takes over one of those;
+    - otherwise it takes a free voice;
+    - otherwise it steals a voice of an instrument with the same or a lower priority
+      (lowest priority first, then by the steal policy), or is dropped when every voice
+      belongs to a higher priority instrument.
+    Stolen, dropped and choked notes are counted. play() may be called from any thread.
+    """
+
+    def __init__(self, channels, instruments, polyphony=3, priorities=None, choke_groups=(), steal="quietest",
+                 clock=time.perf_counter):
+        """
+        :param channels: The channels to manage (pygame.mixer.Channel, or anything with play(sound) and fadeout(ms)).
+        :param instruments: Number of instruments.
+        :param polyphony: Most voices one instrument may hold at once: an int for all, or one per instrument.
+        :param priorities: One number per instrument; higher priority voices are stolen last (default all 0).
+        :param choke_groups: Iterable of instrument index groups; a hit of one member fades out the others.
+        :param steal: One of STEAL_POLICIES.
+        :param clock: Clock in seconds used to age the voices.
+        :raises ValueError: If steal is not a known policy or there are no channels.
+        """
+        if steal not in STEAL_POLICIES:
+            raise ValueError(f"steal must be one of {STEAL_POLICIES}")
+        self._channels = list(channels)
+        if not self._channels:
+            raise ValueError("a voice pool needs at least one channel")
+        self.instruments = int(instruments)
+        self.steal = steal
+        self._clock = clock
+        if isinstance(polyphony, int):
+            polyphony = [polyphony] * self.instruments
+        self.polyphony = [max(1, int(p)) for p in polyphony] + [1] * (self.instruments - len(polyphony))
+        priorities = list(priorities) if priorities is not None else []
+        self.priorities = priorities + [0] * (self.instruments - len(priorities))
+        self._chokes = [set() for _ in range(self.instruments)]
+        for group in choke_groups:
+            group = {i for i in group if 0 <= i < self.instruments}
+            for i in group:
+                self._chokes[i] |= group - {i}
+        voices = len(self._channels)
+        self._owner = [-1] * voices
+        self._start = [0.0] * voices
+        self._end = [0.0] * voices
+        self._lock = threading.Lock()
+        self.played = 0
+        self.stolen = 0
+        self.dropped = 0
+        self.choked = 0
+
+    def __len__(self):
+        return len(self._channels)
+
+    def play(self, instrument, sound, length):
+        """
+        Plays sound for instrument on a pooled voice.
+
+        :param length: Duration of the sound in seconds (how long the voice stays busy).
+        :return: The channel used, or None if the note was dropped.
+        """
+        with self._lock:
+            now = self._clock()
+            for other in self._chokes[instrument]:
+                self._release(other, now)
+            own = [v for v in range(len(self._channels)) if self._owner[v] == instrument and self._end[v] > now]
+            if len(own) >= self.polyphony[instrument]:
+                voice = self._pick(own, now)
+                self.stolen += 1
+            else:
+                voice = self._free_voice(now)
+                if voice is None:
+                    priority = self.priorities[instrument]
+                    candidates = [v for v in range(len(self._channels))
+                                  if self.priorities[self._owner[v]] <= priority]
+                    if not candidates:
+                        self.dropped += 1
+                        return None
+                    voice = self._pick(candidates, now)
+                    self.stolen += 1
+            channel = self._channels[voice]
+            # """Channel.play() replaces whatever the channel was playing"""
+            channel.play(sound)
+            self._owner[voice] = instrument
+            self._start[voice] = now
+            self._end[voice] = now + max(0.0, float(length))
+            self.played += 1
+            return channel
+
+    def active(self, instrument=None):
+        """Number of voices still sounding (of one instrument, or in total)."""
+        now = self._clock()
+        return sum(1 for v in range(len(self._channels))
+                   if self._end[v] > now and (instrument is None or self._owner[v] == instrument))
+
+    def stats(self):
+        return {"voices": len(self._channels), "active": self.active(), "played": self.played,
+                "stolen": self.stolen, "dropped": self.dropped, "choked": self.choked}
+
+    def reset_stats(self):
+        self.played = self.stolen = self.dropped = self.choked = 0
+
+    # ---------------------------
+    # """Internal helpers"""
+    # ---------------------------
+    def _free_voice(self, now):
+        for v in range(len(self._channels)):
+            if self._end[v] <= now:
+                return v
+        return None
+
+    def _level(self, voice, now):
+        """Rough loudness left in a voice: drum samples decay, so the share of the sample still to play."""
+        length = self._end[voice] - self._start[voice]
+        if length <= 0.0:
+            return 0.0
+        return max(0.0, (self._end[voice] - now) / length)
+
+    def _pick(self, voices, now):
+        """The voice to steal: lowest priority first, then the oldest or the quietest."""
+        if self.steal == "oldest":
+            return min(voices, key=lambda v: (self.priorities[self._owner[v]], self._start[v]))
+        return min(voices, key=lambda v: (self.priorities[self._owner[v]], self._level(v, now)))
+
+    def _release(self, instrument, now):
+        for v in range(len(self._channels)):
+            if self._owner[v] == instrument and self._end[v] > now:
+                self._channels[v].fadeout(_RELEASE_MS)
+                self._end[v] = now
+                self.choked += 1